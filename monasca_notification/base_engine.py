@@ -1,15 +1,38 @@
+import threading
+import time
+
 from monasca_common.kafka import consumer, producer
-from monasca_common.kafka_lib.common import KafkaError
+from monasca_common.kafka_lib.common import KafkaError, OffsetCommitRequest
 from oslo_log import log as logging
 
-from monasca_notification.monitoring.metrics import KAFKA_CONSUMER_ERRORS, KAFKA_PRODUCER_ERRORS
+from monasca_notification.common import spool
+from monasca_notification.common.memory_budget import MemoryBudget
+from monasca_notification.common.memory_budget import message_size
+from monasca_notification.monitoring.lag_monitor import LagMonitor
+from monasca_notification.monitoring.metrics import DRAIN_ABANDONED_COUNT, DRAIN_TIMER
+from monasca_notification.monitoring.metrics import KAFKA_CONSUMER_ERRORS, KAFKA_PRODUCER_ERRORS, STAGE_TIMER
 from monitoring import client
 
 log = logging.getLogger(__name__)
 
+DRAIN_TIMEOUT = 10
+# seconds between two calls of the commit callback while reading
+IDLE_INTERVAL = 1
+
+
+def drain_timeout(config):
+    """Seconds an engine gets to finish its in-flight messages after SIGTERM
+    """
+    return (config.get('shutdown') or {}).get('drain_timeout', DRAIN_TIMEOUT)
+
+
+class _Stopped(Exception):
+    """Raised from the consumer's commit callback to leave the consumer loop while no messages arrive
+    """
+
 
 class BaseEngine(object):
-    def __init__(self, config, topic, path):
+    def __init__(self, config, topic, path, commit_callback=None):
         self._topic_name = topic
         self._config = config
         self._statsd = client.get_client()
@@ -18,21 +41,140 @@ class BaseEngine(object):
             config['zookeeper']['url'],
             path,
             config['kafka']['group'],
-            topic)
+            topic,
+            repartition_callback=self._repartitioned,
+            commit_callback=self._between_messages,
+            commit_timeout=1)
+        self._commit_callback = commit_callback
+        self._idle_at = 0
+        # seconds spent in _between_messages since the last message, not part of the Kafka wait
+        self._between_time = 0
         self._consumer_errors = self._statsd.get_counter(name=KAFKA_CONSUMER_ERRORS,
                                                          dimensions={'topic': topic})
         self._producer = producer.KafkaProducer(config['kafka']['url'])
+        # the producer is shared with the priority lane dispatchers and its client is not thread safe
+        self._producer_lock = threading.Lock()
 
         self._producer_errors = self._statsd.get_counter(name=KAFKA_PRODUCER_ERRORS)
+        # absorbs publishes while Kafka is unavailable, instead of failing the engine
+        self._spool = spool.load(config.get('spool'), topic, self._publish_spooled)
+        self._stage_timer = self._statsd.get_timer()
+        self._lag = LagMonitor(config['kafka']['url'], topic, config['kafka'].get('lag_interval', 30))
+        self._budget = MemoryBudget((config.get('memory') or {}).get('in_flight_bytes'), topic)
+        # set by engines finishing messages after do_message returned, they call _budget.done themselves
+        self._finishes_later = False
+
+        self._drain_timeout = drain_timeout(config)
+        self._stopped_at = None
+        self._drain_timer = self._statsd.get_timer()
+        self._abandoned_count = self._statsd.get_counter(name=DRAIN_ABANDONED_COUNT, dimensions={'topic': topic})
+
+    def stop(self):
+        """Stop reading from Kafka and drain, called by the SIGTERM handler of the engine process
+        """
+        if self._stopped_at is None:
+            self._stopped_at = time.time()
+            log.info('Stopping, finishing in-flight messages of topic %s within %ss', self._topic_name,
+                     self._drain_timeout)
+
+    def _stopping(self):
+        return self._stopped_at is not None
+
+    def _drain_overdue(self):
+        """Return True once stopping took longer than the drain timeout
+        """
+        return self._stopped_at is not None and time.time() - self._stopped_at > self._drain_timeout
+
+    def _sleep(self, seconds):
+        """Sleep unless asked to stop meanwhile, return False if stopping
+        """
+        end = time.time() + seconds
+        while not self._stopping():
+            left = end - time.time()
+            if left <= 0:
+                return True
+            time.sleep(min(left, 0.1))
+        return False
+
+    def _repartitioned(self):
+        """Called by the consumer before its partitions are assigned anew, they may move to another engine
+        """
+
+    @property
+    def threaded(self):
+        """True if messages are handled by worker threads besides the one reading from Kafka
+        """
+        return False
+
+    def reload(self, config):
+        """Apply the notification_types of a re-read configuration while consuming, see notifiers.reconfigure
+        """
+        return self._notifier.reconfigure(config['notification_types'])
+
+    def _between_messages(self):
+        """Called by the consumer after each message and while waiting, runs the commit callback about once a second
+
+           The consumer only throttles this by its own last commit, which commits through its
+           client (see commit) don't update.
+        """
+        now = time.time()
+        if self._commit_callback and now - self._idle_at >= IDLE_INTERVAL:
+            self._idle_at = now
+            try:
+                self._commit_callback()
+            finally:
+                self._between_time += time.time() - now
+        if self._stopping():
+            raise _Stopped()
 
     def publish_messages(self, messages, topic):
+        messages = [i.to_json() for i in messages]
+        if self._spool and self._spool.pending():
+            # keep the order and don't wait for Kafka timeouts until the spool is replayed
+            if messages:
+                self._spool.append(topic, messages)
+            return
         try:
-            self._producer.publish(topic,
-                                   [i.to_json() for i in messages])
+            with self._stage_timer.time(STAGE_TIMER, dimensions={'stage': 'kafka_publish'}), self._producer_lock:
+                self._producer.publish(topic, messages)
         except KafkaError:
             log.exception("Notification encountered Kafka errors while publishing to topic %s", topic)
             self._producer_errors.increment(1, sample_rate=1.0, dimensions={'topic': topic})
-            raise
+            if not self._spool:
+                raise
+            self._spool.append(topic, messages)
+
+    def _publish_spooled(self, topic, messages):
+        """Publish messages replayed from the spool, return False if Kafka is still unavailable
+        """
+        try:
+            with self._producer_lock:
+                self._producer.publish(topic, messages)
+            return True
+        except KafkaError:
+            log.warn("Kafka is still unavailable, keeping spooled messages for topic %s", topic)
+            self._producer_errors.increment(1, sample_rate=1.0, dimensions={'topic': topic})
+            return False
+
+    def commit(self, offsets=None):
+        """Commit the messages read so far, or up to the given {partition: offset of the next message}
+        """
+        with self._stage_timer.time(STAGE_TIMER, dimensions={'stage': 'kafka_commit'}):
+            if offsets is None:
+                self._consumer.commit()
+                return True
+            # The consumer always commits everything it handed out, so messages finishing out of
+            # order are committed through its client
+            try:
+                self._consumer._kafka.send_offset_commit_request(
+                    self._consumer._kafka_group,
+                    [OffsetCommitRequest(self._topic_name, partition, offset, None)
+                     for partition, offset in sorted(offsets.items())])
+            except KafkaError:
+                log.exception("Notification encountered Kafka errors while committing offsets %s", offsets)
+                self._consumer_errors.increment(1)
+                return False
+            return True
 
     def do_message(self, message):
         """
@@ -41,12 +183,74 @@ class BaseEngine(object):
         """
         raise NotImplemented
 
+    def _wait_for_budget(self):
+        """Stop pulling from the consumer while the in-flight memory budget is exceeded
+        """
+        if not self._budget.exceeded():
+            return
+        with self._stage_timer.time(STAGE_TIMER, dimensions={'stage': 'memory_backpressure'}):
+            while self._budget.exceeded() and not self._stopping():
+                self._over_budget()
+
+    def _over_budget(self):
+        """Called about every 100ms while the budget is exceeded, until enough messages are done
+        """
+        self._budget.wait(0.1)
+
     def run(self):
+        self._lag.start()
+        if self._spool:
+            self._spool.start()
+        self._consume()
+        abandoned = self._drain()
+        if self._stopping():
+            self._drained(abandoned)
+
+    def _consume(self):
+        """Read and handle messages until stopped, or until the topic ends
+        """
         try:
+            waiting = time.time()
             for message in self._consumer:
+                # the commit callback runs within the consumer loop and reports its own stages
+                self._stage_timer.timing(STAGE_TIMER, time.time() - waiting - self._between_time,
+                                         dimensions={'stage': 'kafka_wait'})
+                self._lag.received(message[0], message[1].offset)
+                self._budget.add(message[0], message[1].offset, message_size(message))
                 self.do_message(message)
+                if not self._finishes_later:
+                    self._budget.done(message[0], message[1].offset)
+                self._lag.processed()
+                self._wait_for_budget()
+                if self._stopping():
+                    break
+                waiting = time.time()
+                self._between_time = 0
 
+        except _Stopped:
+            pass
         except KafkaError:
             log.exception("Notification encountered Kafka errors while reading alarms")
             self._consumer_errors.increment(1)
             raise
+
+    def _drain(self):
+        """Finish the messages still in flight once consuming ended, return how many were abandoned
+
+           Engines handling one message at a time have nothing in flight. Engines finishing messages
+           later give up on the remaining ones once _drain_overdue() and commit what finished.
+        """
+        return 0
+
+    def _drained(self, abandoned):
+        if self._spool and self._spool.pending() and not self._drain_overdue():
+            # otherwise the spool is replayed by the next engine on this host
+            self._spool.drain()
+        duration = time.time() - self._stopped_at
+        self._drain_timer.timing(DRAIN_TIMER, duration, dimensions={'topic': self._topic_name})
+        if abandoned:
+            self._abandoned_count.increment(abandoned)
+            log.warn('Drained topic %s in %.1fs, abandoned %d in-flight messages, they are read again after '
+                     'the restart', self._topic_name, duration, abandoned)
+        else:
+            log.info('Drained topic %s in %.1fs', self._topic_name, duration)
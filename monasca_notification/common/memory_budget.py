@@ -0,0 +1,92 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import IN_FLIGHT_BYTES, IN_FLIGHT_BYTES_HIGH_WATER
+
+STATSD_CLIENT = client.get_client()
+
+# A decoded alarm takes about ten times the size of its JSON payload, which is kept as well
+PAYLOAD_FACTOR = 11
+# Approximate size of one Notification apart from the alarm it shares with its siblings
+NOTIFICATION_BYTES = 1024
+
+
+def message_size(message):
+    """Return the approximate memory a Kafka message takes until it is finished
+    """
+    return len(message[1].message.value) * PAYLOAD_FACTOR
+
+
+class MemoryBudget(object):
+    """Approximate bytes held by the messages an engine read from Kafka and has not finished
+
+       Every message is accounted under its (partition, offset) from when it is read until it is
+       done, including the notifications built for it. The engine stops reading while the total
+       exceeds `limit`; a single message larger than the limit is still let through once nothing
+       else is in flight. The current total and the highest total since the last report are sent
+       as gauges every `interval` seconds.
+    """
+
+    def __init__(self, limit, topic, interval=1):
+        self._limit = limit
+        self._interval = interval
+        self._lock = threading.Condition()
+        self._sizes = {}  # (partition, offset) -> bytes
+        self._total = 0
+        self._high_water = 0
+        self._reported = time.time()
+        self._gauge = STATSD_CLIENT.get_gauge(dimensions={'topic': topic})
+
+    def add(self, partition, offset, size):
+        with self._lock:
+            key = (partition, offset)
+            self._sizes[key] = self._sizes.get(key, 0) + size
+            self._total += size
+            self._high_water = max(self._high_water, self._total)
+        self._report()
+
+    def done(self, partition, offset):
+        with self._lock:
+            self._total -= self._sizes.pop((partition, offset), 0)
+            self._lock.notify_all()
+        self._report()
+
+    def total(self):
+        return self._total
+
+    def exceeded(self):
+        return bool(self._limit) and self._total > self._limit and len(self._sizes) > 1
+
+    def wait(self, timeout):
+        """Wait up to `timeout` seconds for a message to be done while the budget is exceeded
+        """
+        with self._lock:
+            if self.exceeded():
+                self._lock.wait(timeout)
+
+    def _report(self):
+        now = time.time()
+        if now - self._reported < self._interval:
+            return
+        with self._lock:
+            total, high_water = self._total, self._high_water
+            self._high_water = total
+            self._reported = now
+        self._gauge.send(IN_FLIGHT_BYTES, total)
+        self._gauge.send(IN_FLIGHT_BYTES_HIGH_WATER, high_water)
@@ -0,0 +1,58 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+
+class OffsetTracker(object):
+    """Tracks which Kafka messages read are finished when they finish out of order
+
+       Per partition the committable offset is the offset of the oldest unfinished message, or the
+       one after the last message read when all are finished, so a commit never skips a message
+       still in progress.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # partition -> set of unfinished offsets
+        self._next = {}  # partition -> offset after the last message read
+
+    def add(self, partition, offset):
+        with self._lock:
+            self._pending.setdefault(partition, set()).add(offset)
+            self._next[partition] = offset + 1
+
+    def done(self, partition, offset):
+        with self._lock:
+            # unknown if reset while the message was in flight
+            self._pending.get(partition, set()).discard(offset)
+
+    def reset(self):
+        """Forget all messages read, the offsets to commit start over with the next message read
+        """
+        with self._lock:
+            self._pending.clear()
+            self._next.clear()
+
+    def pending(self):
+        with self._lock:
+            return sum(len(offsets) for offsets in self._pending.values())
+
+    def committable(self):
+        """Return {partition: offset of the next message to consume after a restart}
+        """
+        with self._lock:
+            return {partition: min(self._pending[partition]) if self._pending[partition] else next_offset
+                    for partition, next_offset in self._next.items()}
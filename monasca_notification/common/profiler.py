@@ -0,0 +1,184 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in profiling of engine processes
+
+   With a `profiler` section in the configuration every engine process profiles itself for
+   `duration` seconds when it receives SIGUSR2, and every `interval` seconds if one is set ::
+
+       kill -USR2 <pid>
+
+   The mode `cprofile` writes pstats files (<engine>-<pid>-<time>.prof), the mode `sample` takes
+   stack samples of every thread every `sample_interval` seconds and writes them in the folded
+   format of flamegraph.pl (<engine>-<pid>-<time>.folded), each stack starting with the name of
+   its thread. Without the section no signal handler is installed and nothing is added to the
+   engine loop.
+
+   Windows are started and stopped from signal handlers, which run on the engine thread, because
+   cProfile only profiles the thread that enables it. Engines handling alarms in worker threads
+   (queues.staged or priority lanes) should therefore be profiled with `sample`.
+"""
+
+import cProfile
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+from oslo_log import log as logging
+
+log = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+
+_DEFAULTS = {'duration': 30,
+             'interval': 0,
+             'mode': 'cprofile',
+             'sample_interval': 0.01}
+
+
+class Profiler(object):
+    def __init__(self, config, engine, threaded=False):
+        config = dict(_DEFAULTS, **config)
+        if config['mode'] not in MODES:
+            raise ValueError('Unknown profiler mode %s, expected one of %s' % (config['mode'], ', '.join(MODES)))
+        self._directory = config['directory']
+        self._duration = config['duration']
+        self._interval = config['interval']
+        self._mode = config['mode']
+        self._sample_interval = config['sample_interval']
+        self._engine = engine
+        self._threaded = threaded
+        self._profile = None
+        self._sampler = None
+        self._started = None
+
+    @property
+    def active(self):
+        return self._started is not None
+
+    def install(self):
+        """Register the signal handlers, must be called from the engine thread
+        """
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        for signum, handler in ((signal.SIGUSR2, self._on_request), (signal.SIGALRM, self._on_alarm)):
+            signal.signal(signum, handler)
+            # restart interrupted system calls, Kafka and notifier sockets must not see EINTR
+            signal.siginterrupt(signum, False)
+        if self._interval:
+            signal.setitimer(signal.ITIMER_REAL, self._interval)
+        log.info('Profiler installed for %s, send SIGUSR2 to pid %d to profile %ds',
+                 self._engine, os.getpid(), self._duration)
+        if self._threaded and self._mode == 'cprofile':
+            log.warn('Profiler mode cprofile only profiles the Kafka thread of %s, its alarms are handled '
+                     'by worker threads. Use mode sample to profile all threads.', self._engine)
+
+    def _on_request(self, signum, frame):
+        if not self.active:
+            self.start()
+            signal.setitimer(signal.ITIMER_REAL, self._duration)
+
+    def _on_alarm(self, signum, frame):
+        if self.active:
+            self.stop()
+            if self._interval:
+                signal.setitimer(signal.ITIMER_REAL, max(self._interval - self._duration, 1))
+        else:
+            self.start()
+            signal.setitimer(signal.ITIMER_REAL, self._duration)
+
+    def start(self):
+        self._started = time.time()
+        if self._mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = _Sampler(self._sample_interval)
+            self._sampler.start()
+
+    def stop(self):
+        """End the window and write its profile, returns the file name
+        """
+        path = os.path.join(self._directory, '%s-%d-%s.%s' % (
+            self._engine, os.getpid(), time.strftime('%Y%m%dT%H%M%S', time.localtime(self._started)),
+            'prof' if self._mode == 'cprofile' else 'folded'))
+        self._started = None
+        try:
+            if self._mode == 'cprofile':
+                self._profile.disable()
+                self._profile.dump_stats(path)
+                self._profile = None
+            else:
+                self._sampler.stop()
+                self._sampler.dump(path)
+                self._sampler = None
+        except (IOError, OSError):
+            log.exception('Failed to write profile %s', path)
+            return None
+        log.info('Wrote profile %s', path)
+        return path
+
+
+class _Sampler(threading.Thread):
+    """Counts the distinct stacks of all threads but itself, e.g. the engine, its stages and dispatchers
+    """
+
+    def __init__(self, interval):
+        super(_Sampler, self).__init__(name='profiler-sampler')
+        self.daemon = True
+        self.stacks = collections.Counter()
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.ident:
+                    name = names.get(thread_id, 'thread-%d' % thread_id)
+                    self.stacks['%s;%s' % (name, _folded(frame))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join(1)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write('%s %d\n' % (stack, count))
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('%s:%s:%d' % (os.path.basename(code.co_filename), code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def install(config, engine, threaded=False):
+    """Install a Profiler for `engine` when the profiler section is configured, else return None
+
+       threaded - True if the engine handles messages in worker threads, see BaseEngine.threaded
+    """
+    if not config or not config.get('directory'):
+        return None
+    profiler = Profiler(config, engine, threaded)
+    profiler.install()
+    return profiler
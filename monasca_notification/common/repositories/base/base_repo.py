@@ -13,6 +13,31 @@
 from monasca_notification.monitoring import client
 from monasca_notification.monitoring.metrics import CONFIGDB_ERRORS
 
+# Keeps the placeholders of one batch query below SQLite's historical limit of 999
+BATCH_KEYS = 400
+
+
+def batches(keys, size=BATCH_KEYS):
+    """Split `keys` into lists of at most `size`
+    """
+    keys = list(keys)
+    for i in range(0, len(keys), size):
+        yield keys[i:i + size]
+
+
+def group_alarm_actions(keys, rows):
+    """Map every (alarm_definition_id, alarm_state) in `keys` to its notification methods
+
+       rows - (alarm_definition_id, alarm_state, id, type, name, address, period) as returned by
+              the batch query
+    """
+    actions = dict((key, []) for key in keys)
+    for row in rows:
+        methods = actions.get((row[0], row[1]))
+        if methods is not None:
+            methods.append((row[2], row[3].lower(), row[4], row[5], row[6]))
+    return actions
+
 
 class BaseRepo(object):
     def __init__(self, config):
@@ -20,6 +45,11 @@ class BaseRepo(object):
                                          FROM alarm_action as aa
                                          JOIN notification_method as nm ON aa.action_id = nm.id
                                          WHERE aa.alarm_definition_id = %s and aa.alarm_state = %s"""
+        self._find_alarm_actions_batch_sql = """SELECT aa.alarm_definition_id, aa.alarm_state,
+                                                       id, type, name, address, period
+                                                FROM alarm_action as aa
+                                                JOIN notification_method as nm ON aa.action_id = nm.id
+                                                WHERE (aa.alarm_definition_id, aa.alarm_state) IN ({})"""
         self._find_alarm_state_sql = """SELECT state
                                          FROM alarm
                                          WHERE alarm.id = %s"""
@@ -30,3 +60,7 @@ class BaseRepo(object):
                                         WHERE id = %s"""
         self._statsd_configdb_error_count = client.get_client().get_counter(CONFIGDB_ERRORS)
 
+    def _alarm_actions_batch_sql(self, count):
+        """Return the query for the notification methods of `count` (alarm_definition_id, alarm_state) pairs
+        """
+        return self._find_alarm_actions_batch_sql.format(', '.join(['(%s, %s)'] * count))
@@ -0,0 +1,160 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations under
+# the License.
+
+import contextlib
+import logging
+import threading
+import time
+
+from monasca_notification.common.repositories import exceptions as exc
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import CONFIGDB_POOL_ACTIVE, CONFIGDB_POOL_IDLE, \
+    CONFIGDB_POOL_WAIT_TIME
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_BACKOFF_INITIAL = 0.5
+DEFAULT_BACKOFF_MAX = 30
+
+
+class ConnectionPool(object):
+    """Small thread-safe pool of native DB-API connections
+
+       Connections are opened lazily up to `size`. A connection that has been idle for longer than
+       `health_check_interval` seconds is pinged before it is handed out again, and a connection
+       that raised during use is discarded instead of being returned to the pool. Failed connects
+       delay the next attempt with exponential backoff so an unavailable database is not hammered
+       by every engine at once. Checkouts needing a new connection meanwhile fail right away with a
+       DatabaseException instead of blocking the calling thread.
+    """
+
+    def __init__(self, connect, ping, config=None, name='configdb'):
+        """Setup the pool
+             connect - callable returning a new connection, raising on failure
+             ping - callable raising if the given connection is no longer usable
+             config - optional dict with size, health_check_interval, backoff_initial, backoff_max
+             name - value of the 'pool' dimension of the pool metrics
+        """
+        config = config or {}
+        self._connect = connect
+        self._ping = ping
+        self._size = config.get('size', DEFAULT_POOL_SIZE)
+        self._health_check_interval = config.get('health_check_interval', DEFAULT_HEALTH_CHECK_INTERVAL)
+        self._backoff_initial = config.get('backoff_initial', DEFAULT_BACKOFF_INITIAL)
+        self._backoff_max = config.get('backoff_max', DEFAULT_BACKOFF_MAX)
+
+        self._lock = threading.Condition()
+        self._idle = []  # (connection, last used) pairs, most recently used last
+        self._active = 0
+        self._backoff = 0
+        self._next_connect = 0
+
+        statsd = client.get_client()
+        self._dimensions = {'pool': name}
+        self._wait_timer = statsd.get_timer(dimensions=self._dimensions)
+        self._gauge = statsd.get_gauge(dimensions=self._dimensions)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the with-block
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        except Exception:
+            self._release(conn, discard=True)
+            raise
+        self._release(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+        self._report()
+
+    def _checkout(self):
+        start = time.time()
+        with self._lock:
+            while not self._idle and self._active >= self._size:
+                self._lock.wait()
+            self._active += 1
+            idle = self._idle.pop() if self._idle else None
+
+        try:
+            conn = self._healthy(idle) if idle else None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self._active -= 1
+                self._lock.notify()
+            raise
+
+        self._wait_timer.timing(CONFIGDB_POOL_WAIT_TIME, time.time() - start)
+        self._report()
+        return conn
+
+    def _release(self, conn, discard=False):
+        if discard:
+            self._close(conn)
+        with self._lock:
+            self._active -= 1
+            if not discard:
+                self._idle.append((conn, time.time()))
+            self._lock.notify()
+        self._report()
+
+    def _healthy(self, idle):
+        conn, last_used = idle
+        if time.time() - last_used < self._health_check_interval:
+            return conn
+        try:
+            self._ping(conn)
+            return conn
+        except Exception:
+            log.info('Discarding stale database connection')
+            self._close(conn)
+            return None
+
+    def _open(self):
+        with self._lock:
+            wait = self._next_connect - time.time()
+        if wait > 0:
+            raise exc.DatabaseException('Not reconnecting to the database for another %.2f seconds' % wait)
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._backoff = min(self._backoff * 2 or self._backoff_initial, self._backoff_max)
+                self._next_connect = time.time() + self._backoff
+            raise
+
+        with self._lock:
+            self._backoff = 0
+            self._next_connect = 0
+        return conn
+
+    def _report(self):
+        self._gauge.send(CONFIGDB_POOL_ACTIVE, self._active)
+        self._gauge.send(CONFIGDB_POOL_IDLE, len(self._idle))
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:  # nosec
+            # The connection is being thrown away anyway
+            pass
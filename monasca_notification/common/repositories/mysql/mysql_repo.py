@@ -17,6 +17,7 @@ import pymysql
 
 from monasca_notification.common.repositories import exceptions as exc
 from monasca_notification.common.repositories.base import base_repo
+from monasca_notification.common.repositories.base import connection_pool
 
 log = logging.getLogger(__name__)
 
@@ -42,106 +43,120 @@ class MysqlRepo(base_repo.BaseRepo):
         self._mysql_user = config['mysql']['user']
         self._mysql_passwd = config['mysql']['passwd']
         self._mysql_dbname = config['mysql']['db']
-        self._mysql = None
+        # PyMySQL only implements the text protocol, so statements are interpolated client-side
+        # on pooled connections rather than prepared on the server.
+        self._pool = connection_pool.ConnectionPool(self._connect_to_mysql,
+                                                    self._ping_mysql,
+                                                    config.get('database', {}).get('pool'),
+                                                    name='mysql')
 
     def _connect_to_mysql(self):
-        self._mysql = None
         try:
-            self._mysql = pymysql.connect(host=self._mysql_host,
-                                          port=self._mysql_port,
-                                          user=self._mysql_user,
-                                          passwd=unicode(self._mysql_passwd).encode('utf-8'),
-                                          db=self._mysql_dbname,
-                                          ssl=self._mysql_ssl,
-                                          use_unicode=True,
-                                          charset="utf8")
-            self._mysql.autocommit(True)
+            mysql = pymysql.connect(host=self._mysql_host,
+                                    port=self._mysql_port,
+                                    user=self._mysql_user,
+                                    passwd=unicode(self._mysql_passwd).encode('utf-8'),
+                                    db=self._mysql_dbname,
+                                    ssl=self._mysql_ssl,
+                                    use_unicode=True,
+                                    charset="utf8")
+            mysql.autocommit(True)
+            return mysql
         except pymysql.Error as e:
             log.exception('MySQL connect failed %s', e)
             self._statsd_configdb_error_count.increment()
             raise
 
+    @staticmethod
+    def _ping_mysql(mysql):
+        mysql.ping(False)
+
     def fetch_notifications(self, alarm):
         try:
-            if self._mysql is None:
-                self._connect_to_mysql()
-            cur = self._mysql.cursor()
-            cur.execute(self._find_alarm_action_sql, (alarm['alarmDefinitionId'], alarm['newState']))
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                cur.execute(self._find_alarm_action_sql, (alarm['alarmDefinitionId'], alarm['newState']))
 
-            for row in cur:
-                yield (row[0], row[1].lower(), row[2], row[3], row[4])
+                return [(row[0], row[1].lower(), row[2], row[3], row[4]) for row in cur]
+        except pymysql.Error as e:
+            log.exception("Couldn't fetch alarms actions %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def fetch_notifications_batch(self, keys):
+        """Return {(alarm_definition_id, alarm_state): notification methods} with one query per batch
+        """
+        try:
+            rows = []
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                for batch in base_repo.batches(keys):
+                    cur.execute(self._alarm_actions_batch_sql(len(batch)),
+                                [value for key in batch for value in key])
+                    rows.extend(cur)
+            return base_repo.group_alarm_actions(keys, rows)
         except pymysql.Error as e:
-            self._mysql = None
             log.exception("Couldn't fetch alarms actions %s", e)
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
 
     def get_alarm_current_state(self, alarm_id):
         try:
-            if self._mysql is None:
-                self._connect_to_mysql()
-            cur = self._mysql.cursor()
-            cur.execute(self._find_alarm_state_sql, alarm_id)
-            row = cur.fetchone()
-            state = row[0] if row is not None else None
-            return state
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                cur.execute(self._find_alarm_state_sql, alarm_id)
+                row = cur.fetchone()
+                state = row[0] if row is not None else None
+                return state
         except pymysql.Error as e:
-            self._mysql = None
             log.exception("Couldn't fetch the current alarm state %s", e)
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
 
     def fetch_notification_method_types(self):
         try:
-            if self._mysql is None:
-                self._connect_to_mysql()
-            cur = self._mysql.cursor()
-            cur.execute(self._find_all_notification_types_sql)
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                cur.execute(self._find_all_notification_types_sql)
 
-            for row in cur:
-                yield (row[0])
+                return [row[0] for row in cur]
         except pymysql.Error as e:
-            self._mysql = None
             log.exception("Couldn't fetch notification types %s", e)
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
 
     def insert_notification_method_types(self, notification_types):
         try:
-            if self._mysql is None:
-                self._connect_to_mysql()
-            cur = self._mysql.cursor()
-            cur.executemany(self._insert_notification_types_sql, notification_types)
-
-        except pymysql.IntegrityError as ignoredException:
-            # If multiple instances of the notification engine tries to write the
-            # same content at the same time, only one of them will succeed and others will
-            # get duplicate primary key, integrity error. We can safely ignore this error.
-            # This may happen only during the first start when the tables are empty.
-            code, mesg = ignoredException.args
-            if code == pymysql.constants.ER.DUP_ENTRY:
-                log.debug("Notification type exists in DB. Ignoring the exception  {}".format(mesg))
-            else:
-                raise exc.DatabaseException(ignoredException)
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                try:
+                    cur.executemany(self._insert_notification_types_sql, notification_types)
+                except pymysql.IntegrityError as ignoredException:
+                    # If multiple instances of the notification engine tries to write the
+                    # same content at the same time, only one of them will succeed and others will
+                    # get duplicate primary key, integrity error. We can safely ignore this error.
+                    # This may happen only during the first start when the tables are empty.
+                    # Handled within the with-block, the pool keeps the connection.
+                    code, mesg = ignoredException.args
+                    if code != pymysql.constants.ER.DUP_ENTRY:
+                        raise exc.DatabaseException(ignoredException)
+                    log.debug("Notification type exists in DB. Ignoring the exception  {}".format(mesg))
         except pymysql.Error as e:
-            self._mysql = None
             log.exception("Couldn't insert notification types %s", e)
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
 
     def get_notification(self, notification_id):
         try:
-            if self._mysql is None:
-                self._connect_to_mysql()
-            cur = self._mysql.cursor()
-            cur.execute(self._get_notification_sql, notification_id)
-            row = cur.fetchone()
-            if row is None:
-                return None
-            else:
-                return [row[0], row[1].lower(), row[2], row[3]]
+            with self._pool.connection() as mysql:
+                cur = mysql.cursor()
+                cur.execute(self._get_notification_sql, notification_id)
+                row = cur.fetchone()
+                if row is None:
+                    return None
+                else:
+                    return [row[0], row[1].lower(), row[2], row[3]]
         except pymysql.Error as e:
-            self._mysql = None
             log.exception("Couldn't fetch the notification method %s", e)
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
@@ -15,9 +15,10 @@ import logging
 
 from sqlalchemy import engine_from_config, MetaData
 from sqlalchemy.exc import DatabaseError
-from sqlalchemy.sql import select, bindparam, and_
+from sqlalchemy.sql import select, bindparam, and_, tuple_
 
 from monasca_notification.common.repositories import exceptions as exc
+from monasca_notification.common.repositories.base import base_repo
 from monasca_notification.common.repositories.orm import models
 from monasca_notification.monitoring import client
 from monasca_notification.monitoring.metrics import CONFIGDB_ERRORS
@@ -42,6 +43,11 @@ class OrmRepo(object):
                 and_(aa.c.alarm_definition_id == bindparam('alarm_definition_id'),
                      aa.c.alarm_state == bindparam('alarm_state')))
 
+        self._aa = aa
+        self._orm_batch_query = select([aa.c.alarm_definition_id, aa.c.alarm_state,
+                                        nm.c.id, nm.c.type, nm.c.name, nm.c.address, nm.c.period])\
+            .select_from(aa.join(nm, aa.c.action_id == nm.c.id))
+
         self._orm_get_alarm_state = select([a.c.state]).where(a.c.id == bindparam('alarm_id'))
 
         self._orm_nmt_query = select([nmt.c.name])
@@ -66,6 +72,22 @@ class OrmRepo(object):
             self._statsd_configdb_error_count.increment()
             raise exc.DatabaseException(e)
 
+    def fetch_notifications_batch(self, keys):
+        """Return {(alarm_definition_id, alarm_state): notification methods} with one query per batch
+        """
+        try:
+            rows = []
+            with self._orm_engine.connect() as conn:
+                for batch in base_repo.batches(keys):
+                    query = self._orm_batch_query.where(
+                        tuple_(self._aa.c.alarm_definition_id, self._aa.c.alarm_state).in_(batch))
+                    rows.extend(conn.execute(query))
+            return base_repo.group_alarm_actions(keys, rows)
+        except DatabaseError as e:
+            log.exception("Couldn't fetch alarms actions %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
     def get_alarm_current_state(self, alarm_id):
         try:
             with self._orm_engine.connect() as conn:
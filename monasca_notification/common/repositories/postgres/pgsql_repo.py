@@ -17,6 +17,7 @@ import psycopg2
 
 from monasca_notification.common.repositories import exceptions as exc
 from monasca_notification.common.repositories.base import base_repo
+from monasca_notification.common.repositories.base import connection_pool
 
 log = logging.getLogger(__name__)
 
@@ -25,26 +26,84 @@ class PostgresqlRepo(base_repo.BaseRepo):
     def __init__(self, config):
         super(PostgresqlRepo, self).__init__(config)
         self._pgsql_params = config['postgresql']
-        self._pgsql = None
+        database = config.get('database', {})
+        self._prepared = database.get('prepared_statements', True)
+        self._statements = {
+            'find_alarm_action': self._find_alarm_action_sql,
+            'find_alarm_state': self._find_alarm_state_sql,
+            'insert_notification_types': self._insert_notification_types_sql,
+            'find_all_notification_types': self._find_all_notification_types_sql,
+            'get_notification': self._get_notification_sql
+        }
+        self._pool = connection_pool.ConnectionPool(self._connect_to_pgsql,
+                                                    self._ping_pgsql,
+                                                    database.get('pool'),
+                                                    name='postgresql')
 
     def _connect_to_pgsql(self):
-        self._pgsql = None
         try:
-            self._pgsql = psycopg2.connect(**self._pgsql_params)
-            self._pgsql.autocommit = True
+            pgsql = psycopg2.connect(**self._pgsql_params)
+            pgsql.autocommit = True
+            if self._prepared:
+                self._prepare_statements(pgsql)
+            return pgsql
         except psycopg2.Error as e:
             log.exception('Pgsql connect failed %s', e)
             self._statsd_configdb_error_count.increment()
             raise
 
+    def _prepare_statements(self, pgsql):
+        """Prepare all queries once per connection, so later calls skip parsing and planning
+        """
+        cur = pgsql.cursor()
+        for name, sql in self._statements.items():
+            parts = sql.split('%s')
+            numbered = parts[0] + ''.join('${}{}'.format(i, part) for i, part in enumerate(parts[1:], 1))
+            cur.execute('PREPARE {} AS {}'.format(name, numbered))
+
+    def _execute(self, cur, name, params=None, many=False):
+        """Run one of the known statements, through its prepared form if enabled
+        """
+        sql = self._statements[name]
+        if self._prepared:
+            placeholders = sql.count('%s')
+            sql = 'EXECUTE {}'.format(name)
+            if placeholders:
+                sql += ' ({})'.format(', '.join(['%s'] * placeholders))
+        if many:
+            cur.executemany(sql, params)
+        else:
+            cur.execute(sql, params)
+
+    @staticmethod
+    def _ping_pgsql(pgsql):
+        pgsql.cursor().execute('SELECT 1')
+
     def fetch_notifications(self, alarm):
         try:
-            if self._pgsql is None:
-                self._connect_to_pgsql()
-            cur = self._pgsql.cursor()
-            cur.execute(self._find_alarm_action_sql, (alarm['alarmDefinitionId'], alarm['newState']))
-            for row in cur:
-                yield (row[0], row[1].lower(), row[2], row[3], row[4])
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                self._execute(cur, 'find_alarm_action', (alarm['alarmDefinitionId'], alarm['newState']))
+                return [(row[0], row[1].lower(), row[2], row[3], row[4]) for row in cur]
+        except psycopg2.Error as e:
+            log.exception("Couldn't fetch alarms actions %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def fetch_notifications_batch(self, keys):
+        """Return {(alarm_definition_id, alarm_state): notification methods} with one query per batch
+
+           The number of parameters varies with the batch, so this query is never prepared.
+        """
+        try:
+            rows = []
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                for batch in base_repo.batches(keys):
+                    cur.execute(self._alarm_actions_batch_sql(len(batch)),
+                                [value for key in batch for value in key])
+                    rows.extend(cur)
+            return base_repo.group_alarm_actions(keys, rows)
         except psycopg2.Error as e:
             log.exception("Couldn't fetch alarms actions %s", e)
             self._statsd_configdb_error_count.increment()
@@ -52,13 +111,12 @@ class PostgresqlRepo(base_repo.BaseRepo):
 
     def get_alarm_current_state(self, alarm_id):
         try:
-            if self._pgsql is None:
-                self._connect_to_pgsql()
-            cur = self._pgsql.cursor()
-            cur.execute(self._find_alarm_state_sql, alarm_id)
-            row = cur.fetchone()
-            state = row[0] if row is not None else None
-            return state
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                self._execute(cur, 'find_alarm_state', (alarm_id,))
+                row = cur.fetchone()
+                state = row[0] if row is not None else None
+                return state
         except psycopg2.Error as e:
             log.exception("Couldn't fetch current alarm state %s", e)
             self._statsd_configdb_error_count.increment()
@@ -66,12 +124,10 @@ class PostgresqlRepo(base_repo.BaseRepo):
 
     def fetch_notification_method_types(self):
         try:
-            if self._pgsql is None:
-                self._connect_to_pgsql()
-            cur = self._pgsql.cursor()
-            cur.execute(self._find_all_notification_types_sql)
-            for row in cur:
-                yield (row[0])
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                self._execute(cur, 'find_all_notification_types')
+                return [row[0] for row in cur]
         except psycopg2.Error as e:
             log.exception("Couldn't fetch notification types %s", e)
             self._statsd_configdb_error_count.increment()
@@ -79,10 +135,10 @@ class PostgresqlRepo(base_repo.BaseRepo):
 
     def insert_notification_method_types(self, notification_types):
         try:
-            if self._pgsql is None:
-                self._connect_to_pgsql()
-            cur = self._pgsql.cursor()
-            cur.executemany(self._insert_notification_types_sql, notification_types)
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                self._execute(cur, 'insert_notification_types',
+                              [(notification_type,) for notification_type in notification_types], many=True)
         except psycopg2.Error as e:
             log.exception("Couldn't insert notification types %s", e)
             self._statsd_configdb_error_count.increment()
@@ -90,15 +146,14 @@ class PostgresqlRepo(base_repo.BaseRepo):
 
     def get_notification(self, notification_id):
         try:
-            if self._pgsql is None:
-                self._connect_to_pgsql()
-            cur = self._pgsql.cursor()
-            cur.execute(self._get_notification_sql, notification_id)
-            row = cur.fetchone()
-            if row is None:
-                return None
-            else:
-                return [row[0], row[1].lower(), row[2], row[3]]
+            with self._pool.connection() as pgsql:
+                cur = pgsql.cursor()
+                self._execute(cur, 'get_notification', (notification_id,))
+                row = cur.fetchone()
+                if row is None:
+                    return None
+                else:
+                    return [row[0], row[1].lower(), row[2], row[3]]
         except psycopg2.Error as e:
             log.exception("Couldn't fetch the notification method %s", e)
             self._statsd_configdb_error_count.increment()
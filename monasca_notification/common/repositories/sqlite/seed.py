@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations under
+# the License.
+
+"""Bulk-seed a SQLite configuration DB with synthetic alarm definitions, notification methods and alarms.
+
+   Usage: python -m monasca_notification.common.repositories.sqlite.seed --database /tmp/mon.db \\
+              --definitions 1000 --methods 200 --alarms 50000
+"""
+
+import argparse
+import collections
+import random
+import sys
+import uuid
+
+from monasca_notification.common.repositories.orm.models import ALARM_STATES
+from monasca_notification.common.repositories.sqlite import sqlite_repo
+
+DEFAULT_ADDRESSES = {
+    'email': 'bench@localhost',
+    'webhook': 'http://127.0.0.1:8080/webhook',
+    'pagerduty': 'bench-service-key',
+    'slack': 'http://127.0.0.1:8080/slack?channel=#bench'
+}
+
+SeedResult = collections.namedtuple('SeedResult', ['alarm_definitions', 'notification_methods', 'alarms'])
+""" alarm_definitions: {definition id: tenant id}, notification_methods: [(id, type)],
+    alarms: [(alarm id, definition id, state)] """
+
+
+def seed(conn, definitions, methods, alarms, actions_per_definition=2, tenants=10,
+         addresses=None, periodic_ratio=0.0, random_seed=0):
+    """Insert the requested number of rows and return the generated identifiers
+
+       Every alarm definition gets up to `actions_per_definition` notification methods for each alarm
+       state, picked from methods of the same tenant where possible. `periodic_ratio` is the share of
+       notification methods with a 60 second period.
+    """
+    addresses = addresses or DEFAULT_ADDRESSES
+    # The # nosec keeps bandit from reporting this, the numbers only shape synthetic seed data
+    rng = random.Random(random_seed)  # nosec
+    types = sorted(addresses)
+
+    def new_id(length=36):
+        return str(uuid.UUID(int=rng.getrandbits(128)))[:length]
+
+    tenant_ids = [new_id() for _ in range(tenants)]
+
+    notification_methods = []
+    methods_by_tenant = collections.defaultdict(list)
+    method_rows = []
+    for i in range(methods):
+        method_id = new_id()
+        tenant_id = tenant_ids[i % tenants]
+        method_type = types[i % len(types)]
+        period = 60 if rng.random() < periodic_ratio else 0
+        method_rows.append((method_id, addresses[method_type], 'method-%d' % i, tenant_id, method_type.upper(),
+                            period))
+        notification_methods.append((method_id, method_type))
+        methods_by_tenant[tenant_id].append(method_id)
+
+    alarm_definitions = {}
+    action_rows = set()
+    for _ in range(definitions):
+        definition_id = new_id()
+        tenant_id = rng.choice(tenant_ids)
+        alarm_definitions[definition_id] = tenant_id
+        candidates = methods_by_tenant[tenant_id] or [m[0] for m in notification_methods]
+        for state in ALARM_STATES:
+            for method_id in rng.sample(candidates, min(actions_per_definition, len(candidates))):
+                action_rows.add((method_id, definition_id, state))
+
+    definition_ids = sorted(alarm_definitions)
+    alarm_rows = []
+    for _ in range(alarms):
+        alarm_rows.append((new_id(20), rng.choice(definition_ids), rng.choice(ALARM_STATES), 'OPEN', ''))
+
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO notification_method (id, address, name, tenant_id, type, period) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", method_rows)
+    conn.executemany("INSERT OR IGNORE INTO notification_method_type (name) VALUES (?)",
+                     [(t.upper(),) for t in types])
+    conn.executemany("INSERT INTO alarm_action (action_id, alarm_definition_id, alarm_state) VALUES (?, ?, ?)",
+                     sorted(action_rows))
+    conn.executemany("INSERT INTO alarm (id, alarm_definition_id, state, lifecycle_state, link) "
+                     "VALUES (?, ?, ?, ?, ?)", alarm_rows)
+    conn.execute("COMMIT")
+
+    return SeedResult(alarm_definitions, notification_methods, [row[:3] for row in alarm_rows])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed a SQLite configuration DB for benchmarking')
+    parser.add_argument('--database', required=True, help='SQLite database file')
+    parser.add_argument('--definitions', type=int, default=1000, help='Number of alarm definitions')
+    parser.add_argument('--methods', type=int, default=200, help='Number of notification methods')
+    parser.add_argument('--alarms', type=int, default=10000, help='Number of alarms')
+    parser.add_argument('--actions-per-definition', type=int, default=2,
+                        help='Notification methods per alarm definition and state')
+    parser.add_argument('--tenants', type=int, default=10, help='Number of tenants')
+    parser.add_argument('--periodic-ratio', type=float, default=0.0,
+                        help='Share of notification methods with a 60 second period')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args(argv)
+
+    conn, lock = sqlite_repo.get_connection(args.database)
+    with lock:
+        result = seed(conn, args.definitions, args.methods, args.alarms,
+                      actions_per_definition=args.actions_per_definition,
+                      tenants=args.tenants,
+                      periodic_ratio=args.periodic_ratio,
+                      random_seed=args.seed)
+    print('Seeded {} alarm definitions, {} notification methods and {} alarms into {}'.format(
+        len(result.alarm_definitions), len(result.notification_methods), len(result.alarms), args.database))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
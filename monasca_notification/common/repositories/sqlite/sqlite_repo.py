@@ -0,0 +1,150 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations under
+# the License.
+
+"""Self-contained configuration DB driver backed by SQLite
+
+   Meant for benchmarks and local load tests, where no MySQL is available. Enable it with ::
+
+       database:
+         repo_driver: monasca_notification.common.repositories.sqlite.sqlite_repo:SqliteRepo
+       sqlite:
+         database: ':memory:'  # or a file path
+
+   All repositories of one process pointing at the same database share a single connection, so
+   an in-memory database seeded before the engines start is visible to every engine in that
+   process. Use a file when the engines run in separate processes.
+"""
+
+import logging
+import sqlite3
+import threading
+
+from sqlalchemy import MetaData
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+
+from monasca_notification.common.repositories import exceptions as exc
+from monasca_notification.common.repositories.base import base_repo
+from monasca_notification.common.repositories.orm import models
+
+log = logging.getLogger(__name__)
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(database):
+    """Return the connection shared by all repositories of this process for `database`
+    """
+    with _connections_lock:
+        if database not in _connections:
+            conn = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+            _create_schema(conn)
+            _connections[database] = (conn, threading.Lock())
+        return _connections[database]
+
+
+def _create_schema(conn):
+    existing = set(row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    metadata = MetaData()
+    for create_model in (models.create_notification_method_model,
+                         models.create_alarm_action_model,
+                         models.create_notification_method_type_model,
+                         models.create_alarm_model):
+        table = create_model(metadata)
+        if table.name not in existing:
+            conn.execute(str(CreateTable(table).compile(dialect=sqlite.dialect())))
+    conn.execute("CREATE INDEX IF NOT EXISTS alarm_action_definition_state "
+                 "ON alarm_action (alarm_definition_id, alarm_state)")
+
+
+class SqliteRepo(base_repo.BaseRepo):
+    def __init__(self, config):
+        super(SqliteRepo, self).__init__(config)
+        self._database = config.get('sqlite', {}).get('database', ':memory:')
+        self._conn, self._lock = get_connection(self._database)
+
+        self._find_alarm_action_sql = self._find_alarm_action_sql.replace('%s', '?')
+        self._find_alarm_state_sql = self._find_alarm_state_sql.replace('%s', '?')
+        self._insert_notification_types_sql = self._insert_notification_types_sql.replace(
+            'INSERT INTO', 'INSERT OR IGNORE INTO').replace('%s', '?')
+        self._get_notification_sql = self._get_notification_sql.replace('%s', '?')
+
+    @property
+    def connection(self):
+        return self._conn
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def fetch_notifications(self, alarm):
+        try:
+            rows = self._query(self._find_alarm_action_sql, (alarm['alarmDefinitionId'], alarm['newState']))
+            return [(row[0], row[1].lower(), row[2], row[3], row[4]) for row in rows]
+        except sqlite3.Error as e:
+            log.exception("Couldn't fetch alarms actions %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def fetch_notifications_batch(self, keys):
+        """Return {(alarm_definition_id, alarm_state): notification methods} with one query per batch
+        """
+        try:
+            rows = []
+            for batch in base_repo.batches(keys):
+                rows.extend(self._query(self._alarm_actions_batch_sql(len(batch)).replace('%s', '?'),
+                                        [value for key in batch for value in key]))
+            return base_repo.group_alarm_actions(keys, rows)
+        except sqlite3.Error as e:
+            log.exception("Couldn't fetch alarms actions %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def get_alarm_current_state(self, alarm_id):
+        try:
+            rows = self._query(self._find_alarm_state_sql, (alarm_id,))
+            return rows[0][0] if rows else None
+        except sqlite3.Error as e:
+            log.exception("Couldn't fetch the current alarm state %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def fetch_notification_method_types(self):
+        try:
+            return [row[0] for row in self._query(self._find_all_notification_types_sql)]
+        except sqlite3.Error as e:
+            log.exception("Couldn't fetch notification types %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def insert_notification_method_types(self, notification_types):
+        try:
+            with self._lock:
+                self._conn.executemany(self._insert_notification_types_sql,
+                                       [(notification_type,) for notification_type in notification_types])
+        except sqlite3.Error as e:
+            log.exception("Couldn't insert notification types %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
+
+    def get_notification(self, notification_id):
+        try:
+            rows = self._query(self._get_notification_sql, (notification_id,))
+            if not rows:
+                return None
+            row = rows[0]
+            return [row[0], row[1].lower(), row[2], row[3]]
+        except sqlite3.Error as e:
+            log.exception("Couldn't fetch the notification method %s", e)
+            self._statsd_configdb_error_count.increment()
+            raise exc.DatabaseException(e)
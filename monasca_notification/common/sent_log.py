@@ -0,0 +1,121 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+import threading
+import time
+
+from oslo_log import log as logging
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import NOTIFICATIONS_DEDUPLICATED_COUNT
+
+log = logging.getLogger(__name__)
+
+STATSD_CLIENT = client.get_client()
+deduplicated_count = STATSD_CLIENT.get_counter(name=NOTIFICATIONS_DEDUPLICATED_COUNT)
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS sent (
+                 method_id TEXT NOT NULL,
+                 alarm_id TEXT NOT NULL,
+                 alarm_timestamp INTEGER NOT NULL,
+                 state TEXT NOT NULL,
+                 sent_at REAL NOT NULL,
+                 PRIMARY KEY (method_id, alarm_id, alarm_timestamp, state)) WITHOUT ROWID"""
+_SENT_AT_INDEX = "CREATE INDEX IF NOT EXISTS sent_at ON sent (sent_at)"
+_FIND = "SELECT 1 FROM sent WHERE method_id = ? AND alarm_id = ? AND alarm_timestamp = ? AND state = ?"
+_INSERT = "INSERT OR REPLACE INTO sent VALUES (?, ?, ?, ?, ?)"
+_PRUNE = "DELETE FROM sent WHERE sent_at < ?"
+
+
+def _key(notification):
+    return (unicode(notification.id), notification.alarm_id, int(notification.raw_alarm['timestamp']),
+            notification.state)
+
+
+class SentLog(object):
+    """Remembers which notifications were sent, so a notification is not sent twice
+
+       Alarms are committed to Kafka only after their notifications were sent, so a crash or kill
+       in between makes the engine read them again after a restart. Notifications are keyed on
+       notification method, alarm, alarm timestamp and new state, in an SQLite database in WAL mode
+       shared by all engine processes of the host. Entries older than `max_age` seconds are pruned
+       every `prune_interval` seconds, configuration ::
+
+           idempotency:
+               database: /var/lib/monasca-notification/sent.db
+               max_age: 86400
+               prune_interval: 60
+
+       The log fails open, if the database is unavailable notifications are sent anyway.
+    """
+
+    def __init__(self, config):
+        self._max_age = config.get('max_age', 86400)
+        self._prune_interval = config.get('prune_interval', 60)
+        self._pruned = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(config['database'], timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # a killed process loses nothing in WAL mode, only a power loss may drop the latest entries
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_SENT_AT_INDEX)
+
+    def unsent(self, notifications):
+        """Return the notifications not sent before
+        """
+        try:
+            with self._lock:
+                sent = [self._conn.execute(_FIND, _key(notification)).fetchone() is not None
+                        for notification in notifications]
+        except sqlite3.Error:
+            log.exception('Checking the sent notification log failed, sending anyway')
+            return notifications
+
+        for notification, duplicate in zip(notifications, sent):
+            if duplicate:
+                log.info('Not sending %s notification %s for alarm %s again', notification.type,
+                         notification.name, notification.alarm_id)
+                deduplicated_count.increment(1, dimensions={'notification_type': notification.type})
+        return [notification for notification, duplicate in zip(notifications, sent) if not duplicate]
+
+    def add(self, notifications):
+        """Record notifications as sent
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(_INSERT, [_key(notification) + (now,) for notification in notifications])
+                    if now - self._pruned >= self._prune_interval:
+                        self._conn.execute(_PRUNE, (now - self._max_age,))
+                        self._pruned = now
+                    self._conn.execute('COMMIT')
+                except sqlite3.Error:
+                    self._conn.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error:
+            log.exception('Recording sent notifications failed')
+
+
+def load(config):
+    """Return the sent notification log, or None without an idempotency section
+    """
+    if not config:
+        return None
+    return SentLog(config)
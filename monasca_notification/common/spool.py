@@ -0,0 +1,240 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local spool for messages that could not be published to Kafka
+
+   Every engine process appends to its own directory below `directory`, named after the topic it
+   consumes and its pid, and holds an exclusive lock on it. A directory is a sequence of
+   segment files with one JSON record [topic, [messages]] per line; a segment is closed once it
+   reaches `segment_bytes`. A daemon thread replays the segments oldest first every
+   `drain_interval` seconds and deletes them once published. How far a segment was replayed is
+   kept next to it, so a failure half-way does not publish its first records twice.
+
+   Directories left behind by processes that died are unlocked and replayed by whichever engine
+   gets to them first.
+"""
+
+import collections
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from oslo_log import log as logging
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import SPOOL_BYTES, SPOOL_REPLAYED_COUNT, SPOOLED_COUNT
+
+log = logging.getLogger(__name__)
+
+STATSD_CLIENT = client.get_client()
+spooled_count = STATSD_CLIENT.get_counter(name=SPOOLED_COUNT)
+replayed_count = STATSD_CLIENT.get_counter(name=SPOOL_REPLAYED_COUNT)
+
+_SEGMENT = '%012d.segment'
+_POSITION = '.position'
+_LOCK = 'lock'
+
+
+def _segments(directory):
+    return sorted(os.path.join(directory, entry) for entry in os.listdir(directory) if entry.endswith('.segment'))
+
+
+def _lock(directory, blocking=True):
+    """Return the open lock file of `directory`, None if another process holds it and not blocking
+    """
+    lock = open(os.path.join(directory, _LOCK), 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        lock.close()
+        return None
+    return lock
+
+
+def _write(path, data, fsync):
+    with open(path, 'wb') as position:
+        position.write(data)
+        position.flush()
+        if fsync:
+            os.fsync(position.fileno())
+
+
+def _replay(segment, publish, fsync):
+    """Publish the records of `segment` not replayed yet, return False if publishing failed
+    """
+    position_path = segment + _POSITION
+    try:
+        with open(position_path, 'rb') as position_file:
+            position = int(position_file.read() or 0)
+    except IOError:
+        position = 0
+
+    with open(segment, 'rb') as records:
+        records.seek(position)
+        for line in records:
+            if not line.endswith('\n'):
+                # the process died while writing this record, it was never acknowledged
+                log.warn('Ignoring incomplete record at the end of spool segment %s', segment)
+                break
+            try:
+                topic, messages = json.loads(line)
+            except ValueError:
+                log.error('Skipping corrupt record at offset %d of spool segment %s', position, segment)
+            else:
+                if not publish(topic, [message.encode('utf-8') for message in messages]):
+                    return False
+                replayed_count.increment(len(messages), dimensions={'topic': topic})
+            position += len(line)
+            _write(position_path, str(position), fsync)
+    return True
+
+
+class Spool(object):
+    """Append-only segment files absorbing publishes while Kafka is unavailable, configuration ::
+
+           spool:
+               directory: /var/spool/monasca-notification
+               segment_bytes: 16777216
+               fsync: True  # fsync every record before the publish counts as done
+               drain_interval: 5  # seconds between replay attempts
+
+       publish - function(topic, messages) returning False if Kafka is still unavailable
+    """
+
+    def __init__(self, config, name, publish):
+        self._root = config['directory']
+        self._segment_bytes = config.get('segment_bytes', 16 * 1024 * 1024)
+        self._fsync = config.get('fsync', True)
+        self._interval = config.get('drain_interval', 5)
+        self._publish = publish
+        self._gauge = STATSD_CLIENT.get_gauge(dimensions={'spool': name})
+
+        # locked before it gets its name, so no other process takes it for the spool of a dead one
+        if not os.path.isdir(self._root):
+            os.makedirs(self._root)
+        creating = tempfile.mkdtemp(prefix='.%s-%d-' % (name, os.getpid()), dir=self._root)
+        self._lock_file = _lock(creating)
+        self._directory = os.path.join(self._root, os.path.basename(creating)[1:])
+        os.rename(creating, self._directory)
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._segments = collections.deque()  # paths of own segments not replayed yet, oldest first
+        self._file = None
+        self._sequence = 0
+        self._thread = None
+
+    def append(self, topic, messages):
+        """Add messages that could not be published, they are written before this returns
+        """
+        record = json.dumps([topic, messages]) + '\n'
+        with self._lock:
+            if self._file is None:
+                path = os.path.join(self._directory, _SEGMENT % self._sequence)
+                self._sequence += 1
+                self._file = open(path, 'ab')
+                self._segments.append(path)
+            self._file.write(record)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            if self._file.tell() >= self._segment_bytes:
+                self._close_segment()
+        spooled_count.increment(len(messages), dimensions={'topic': topic})
+
+    def pending(self):
+        """Return True while own messages wait for replay, new messages should be appended after them
+        """
+        return bool(self._segments)
+
+    def _close_segment(self):
+        self._file.close()
+        self._file = None
+
+    def drain(self):
+        """Replay everything spooled so far, oldest first, return False if Kafka is still unavailable
+        """
+        with self._drain_lock:
+            if not self._drain_orphans():
+                return False
+            while True:
+                with self._lock:
+                    if not self._segments:
+                        return True
+                    segment = self._segments[0]
+                    if self._file is not None and self._file.name == segment:
+                        self._close_segment()
+                if not _replay(segment, self._publish, self._fsync):
+                    return False
+                with self._lock:
+                    self._segments.popleft()
+                os.remove(segment)
+                if os.path.exists(segment + _POSITION):
+                    os.remove(segment + _POSITION)
+
+    def _drain_orphans(self):
+        for entry in os.listdir(self._root):
+            directory = os.path.join(self._root, entry)
+            if entry.startswith('.') or directory == self._directory or not os.path.isdir(directory):
+                continue
+            lock = _lock(directory, blocking=False)
+            if lock is None:
+                continue
+            try:
+                for segment in _segments(directory):
+                    if not _replay(segment, self._publish, self._fsync):
+                        return False
+                    os.remove(segment)
+                log.info('Replayed the spool %s left behind by a previous process', directory)
+                shutil.rmtree(directory)
+            finally:
+                lock.close()
+        return True
+
+    def _report(self):
+        size = 0
+        for segment in _segments(self._directory):
+            try:
+                size += os.path.getsize(segment)
+            except OSError:
+                pass  # replayed meanwhile
+        self._gauge.send(SPOOL_BYTES, size)
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='spool-drainer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.drain()
+                self._report()
+            except Exception:
+                log.exception('Replaying the spool %s failed', self._directory)
+
+
+def load(config, name, publish):
+    """Return the spool, or None without a spool section
+    """
+    if not config:
+        return None
+    return Spool(config, name, publish)
@@ -0,0 +1,85 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import Queue
+import time
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import QUEUE_BLOCKED_TIME, QUEUE_DEPTH
+
+STATSD_CLIENT = client.get_client()
+
+
+class StageQueue(object):
+    """Bounded queue between two pipeline stages
+
+       The depth is reported whenever an item is taken, and the time a producer was blocked by a
+       full queue whenever that happened, both with the queue name as dimension.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self._queue = Queue.Queue(size)
+        self._dimensions = {'queue': name}
+        self._gauge = STATSD_CLIENT.get_gauge()
+        self._timer = STATSD_CLIENT.get_timer()
+
+    def put(self, item, waiting=None):
+        """Add `item`, blocking while the queue is full
+
+           waiting - called about every 100ms while blocked, e.g. to keep draining another queue
+        """
+        try:
+            self._queue.put_nowait(item)
+            return
+        except Queue.Full:
+            pass
+
+        blocked = time.time()
+        while True:
+            if waiting is not None:
+                waiting()
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except Queue.Full:
+                pass
+        self._timer.timing(QUEUE_BLOCKED_TIME, time.time() - blocked, dimensions=self._dimensions)
+
+    def get(self, timeout=None):
+        """Remove and return the next item, None if there is none within `timeout` seconds
+        """
+        try:
+            item = self._queue.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+        self._gauge.send(QUEUE_DEPTH, self._queue.qsize(), dimensions=self._dimensions)
+        return item
+
+    def get_available(self, limit=None):
+        """Remove and return the items available right now without blocking, at most `limit`
+        """
+        items = []
+        while limit is None or len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except Queue.Empty:
+                break
+        if items:
+            self._gauge.send(QUEUE_DEPTH, self._queue.qsize(), dimensions=self._dimensions)
+        return items
+
+    def qsize(self):
+        return self._queue.qsize()
@@ -0,0 +1,129 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import hashlib
+import json
+import threading
+
+import six
+from jinja2 import Environment
+from jinja2 import meta
+from jinja2 import Template
+from jinja2 import TemplateSyntaxError
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import TEMPLATE_CACHE_COUNT, TEMPLATE_VARS_SKIPPED_COUNT
+
+STATSD_CLIENT = client.get_client()
+lookup_count = STATSD_CLIENT.get_counter(name=TEMPLATE_CACHE_COUNT)
+skipped_count = STATSD_CLIENT.get_counter(name=TEMPLATE_VARS_SKIPPED_COUNT)
+
+# only parses templates, they render plain text and are not escaped like with Template()
+_ENVIRONMENT = Environment(autoescape=False)  # nosec
+
+
+def referenced_variables(text):
+    """Return the names of the variables the template `text` reads from its context
+    """
+    return frozenset(meta.find_undeclared_variables(_ENVIRONMENT.parse(text)))
+
+
+_compiled = collections.OrderedDict()
+_compiled_lock = threading.Lock()
+_COMPILED_SIZE = 512
+
+
+def compile_cached(text):
+    """Return (template, referenced variables) for `text`, or None if it is not a valid template
+
+       Alarm descriptions are templates too and the same few are seen again and again, so they are
+       compiled and analysed once. Texts without any Jinja syntax are not compiled at all.
+    """
+    if not isinstance(text, six.string_types) or '{' not in text:
+        return None
+    with _compiled_lock:
+        compiled = _compiled.pop(text, False)
+        if compiled is not False:
+            _compiled[text] = compiled
+            return compiled
+    try:
+        compiled = Template(text), referenced_variables(text)
+    except TemplateSyntaxError:
+        compiled = None
+    with _compiled_lock:
+        _compiled[text] = compiled
+        while len(_compiled) > _COMPILED_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+class TemplateCache(object):
+    """Bounded LRU cache of rendered notification templates
+
+       Retries and periodic notifications render the same template for the same alarm over and
+       over. An entry is keyed by the template and a digest of only the variables the template
+       references, so e.g. a new notification_timestamp does not miss unless the template shows it.
+       Only templates compiled through the cache are cached.
+    """
+
+    def __init__(self, notification_type, size=256):
+        self._notification_type = notification_type
+        self._size = size
+        self._variables = {}  # template -> sorted names of its referenced variables
+        self._rendered = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, text):
+        template = Template(text)
+        self._variables[template] = sorted(referenced_variables(text))
+        return template
+
+    def variables(self, template):
+        """Return the names of the variables `template` references, None if not compiled here
+        """
+        return self._variables.get(template)
+
+    def render(self, template, template_vars):
+        variables = self._variables.get(template)
+        if variables is None or not self._size:
+            return template.render(**template_vars)
+
+        try:
+            # without sort_keys the C encoder is used, equal dicts in another order only cost a miss.
+            # The # nosec keeps bandit from reporting sha1, the digest is a cache key and not security relevant
+            digest = hashlib.sha1(json.dumps([template_vars.get(name) for name in variables],  # nosec
+                                             default=repr)).hexdigest()
+        except ValueError:
+            return template.render(**template_vars)
+        key = (template, digest)
+        with self._lock:
+            text = self._rendered.pop(key, None)
+            if text is not None:
+                self._rendered[key] = text
+        if text is not None:
+            lookup_count.increment(1, dimensions={'notification_type': self._notification_type, 'result': 'hit'})
+            return text
+
+        lookup_count.increment(1, dimensions={'notification_type': self._notification_type, 'result': 'miss'})
+        text = template.render(**template_vars)
+        with self._lock:
+            self._rendered[key] = text
+            while len(self._rendered) > self._size:
+                self._rendered.popitem(last=False)
+        return text
+
+    def __len__(self):
+        return len(self._rendered)
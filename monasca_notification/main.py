@@ -23,10 +23,15 @@ import multiprocessing
 import os
 import signal
 import sys
+import threading
 import time
 
 import yaml
 
+from common import profiler
+from monasca_notification.base_engine import drain_timeout
+from monitoring import admin
+from monitoring import aggregator
 from notification_engine import NotificationEngine
 from periodic_engine import PeriodicEngine
 from retry_engine import RetryEngine
@@ -34,6 +39,8 @@ from retry_engine import RetryEngine
 log = logging.getLogger(__name__)
 processors = []  # global list to facilitate clean signal handling
 exiting = False
+shutdown_timeout = 15  # seconds the processes get to drain after SIGTERM before they are killed
+config_file = '/etc/monasca/notification.yaml'  # re-read by the processes on SIGHUP
 
 
 def clean_exit(signum, frame=None):
@@ -52,23 +59,26 @@ def clean_exit(signum, frame=None):
     exiting = True
     wait_for_exit = False
 
+    started = time.time()
     for process in processors:
         try:
             if process.is_alive():
-                process.terminate()  # Sends sigterm which any processes after a notification is sent attempt to handle
+                process.terminate()  # Sends sigterm, the engines stop reading, drain and commit
                 wait_for_exit = True
         except Exception:  # nosec
             # There is really nothing to do if the kill fails, so just go on.
             # The # nosec keeps bandit from reporting this as a security issue
             pass
 
-    # wait for a couple seconds to give the subprocesses a chance to shut down correctly.
+    # give the subprocesses their drain timeout to finish in-flight notifications and commit
     if wait_for_exit:
-        time.sleep(2)
+        for process in processors:
+            process.join(max(0, started + shutdown_timeout - time.time()))
+        log.info('Processes drained in %.1fs' % (time.time() - started))
 
     # Kill everything, that didn't already die
     for child in multiprocessing.active_children():
-        log.debug('Killing pid %s' % child.pid)
+        log.warn('Killing pid %s, it did not finish draining in time' % child.pid)
         try:
             os.kill(child.pid, signal.SIGKILL)
         except Exception:  # nosec
@@ -82,13 +92,65 @@ def clean_exit(signum, frame=None):
     sys.exit(signum)
 
 
-def start_process(process_type, config, *args):
+def reload_config(signum, frame=None):
+    """Have every process re-read the configuration file, forwards SIGHUP to them
+    """
+    log.info('Received signal %s, reloading notification_types of %s' % (signum, config_file))
+    for process in processors:
+        try:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGHUP)
+        except Exception:  # nosec
+            pass
+
+
+def reconfigure(engine):
+    """Apply the notification_types of the configuration file to the engine of this process
+
+       Runs in its own thread, the engine keeps consuming meanwhile. Other sections need a restart.
+    """
+    try:
+        with open(config_file, 'r') as config:
+            changed = engine.reload(yaml.safe_load(config))
+        log.info('Reloaded %s, reconfigured notification types: %s' % (config_file, ', '.join(changed) or 'none'))
+    except Exception:
+        log.exception('Reloading %s failed, keeping the previous configuration' % config_file)
+
+
+def start_process(process_type, config, *args, **kwargs):
     log.info("start process: {}".format(process_type))
+    # the default action of SIGHUP would kill the process before its handler is set
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
     p = process_type(config, *args)
+    # stop reading and drain on SIGTERM from clean_exit, and on SIGINT sent to the whole process group
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: p.stop())
+        # don't fail notifications being sent with EINTR
+        signal.siginterrupt(signum, False)
+
+    def on_sighup(signum, frame):
+        # the handler interrupts the engine, which may hold locks the reload needs
+        threading.Thread(target=reconfigure, args=(p,), name='config-reload').start()
+
+    signal.signal(signal.SIGHUP, on_sighup)
+    signal.siginterrupt(signal.SIGHUP, False)
+    profiler.install(config.get('profiler'), process_type.__name__, p.threaded)
+    admin.start(config.get('admin'), process_type.__name__, kwargs.get('worker', 0))
+    aggregator.AGGREGATOR.start(config.get('statsd', {}).get('aggregate_interval'))
     p.run()
+    # the aggregator's daemon thread would not flush what was reported during the drain
+    aggregator.AGGREGATOR.stop()
+    aggregator.AGGREGATOR.flush()
+
+
+def add_process(process_type, config, *args):
+    processors.append(multiprocessing.Process(
+        target=start_process, args=(process_type, config) + args, kwargs={'worker': len(processors)}))
 
 
 def main(argv=None):
+    global config_file, shutdown_timeout
+
     if argv is None:
         argv = sys.argv
     if len(argv) == 2:
@@ -105,15 +167,14 @@ def main(argv=None):
     # Setup logging
     logging.config.dictConfig(config['logging'])
 
+    shutdown_timeout = drain_timeout(config) + 5  # time to commit and exit after the drain timeout
+
     for proc in range(0, config['processors']['notification']['number']):
-        processors.append(multiprocessing.Process(
-            target=start_process, args=(NotificationEngine, config)))
+        add_process(NotificationEngine, config)
 
-    processors.append(multiprocessing.Process(
-        target=start_process, args=(RetryEngine, config)))
+    add_process(RetryEngine, config)
 
-    processors.append(multiprocessing.Process(
-        target=start_process, args=(PeriodicEngine, config, 60)))
+    add_process(PeriodicEngine, config, 60)
 
     try:
         log.info('Starting processes')
@@ -125,6 +186,7 @@ def main(argv=None):
         signal.signal(signal.SIGCHLD, clean_exit)
         signal.signal(signal.SIGINT, clean_exit)
         signal.signal(signal.SIGTERM, clean_exit)
+        signal.signal(signal.SIGHUP, reload_config)
 
         while True:
             time.sleep(10)
@@ -0,0 +1,161 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local HTTP admin endpoint of an engine process
+
+   Serves the metrics of the local registry, i.e. everything the process sends to statsd under
+   the names of monitoring/metrics.py, plus the notifications being sent right now:
+
+       GET /metrics   Prometheus text format
+       GET /stats     JSON snapshot
+
+   Each engine process listens on `admin.port` plus its worker index, on `admin.host` (default
+   127.0.0.1).
+"""
+
+import BaseHTTPServer
+import json
+import os
+import re
+import SocketServer
+import threading
+import time
+
+from oslo_log import log as logging
+
+from monasca_notification.monitoring import registry
+
+log = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def _metric_name(name):
+    return _INVALID_NAME_CHARS.sub('_', name)
+
+
+def _labels(dimensions, extra=()):
+    labels = ['%s="%s"' % (_metric_name(k), unicode(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+              for k, v in tuple(dimensions) + tuple(extra)]
+    return '{%s}' % ','.join(labels) if labels else ''
+
+
+def _by_name(values):
+    grouped = {}
+    for (name, dimensions), value in values.items():
+        grouped.setdefault(_metric_name(name), []).append((dimensions, value))
+    return sorted(grouped.items())
+
+
+def prometheus_text(engine, started):
+    counters, gauges, timers, in_flight = registry.REGISTRY.snapshot()
+    lines = []
+    for name, series in _by_name(counters):
+        lines.append('# TYPE %s_total counter' % name)
+        lines.extend('%s_total%s %r' % (name, _labels(dimensions), float(value)) for dimensions, value in series)
+    for name, series in _by_name(gauges):
+        lines.append('# TYPE %s gauge' % name)
+        lines.extend('%s%s %r' % (name, _labels(dimensions), float(value)) for dimensions, value in series)
+    for name, series in _by_name(timers):
+        lines.append('# TYPE %s_seconds histogram' % name)
+        for dimensions, stats in series:
+            cumulative = 0
+            for bound, count in zip(registry.TIMER_BUCKETS + ('+Inf',), stats.buckets):
+                cumulative += count
+                lines.append('%s_seconds_bucket%s %d' % (name, _labels(dimensions, [('le', bound)]), cumulative))
+            lines.append('%s_seconds_sum%s %r' % (name, _labels(dimensions), stats.sum))
+            lines.append('%s_seconds_count%s %d' % (name, _labels(dimensions), stats.count))
+
+    per_type = {}
+    for notification_type, _, _ in in_flight:
+        per_type[notification_type] = per_type.get(notification_type, 0) + 1
+    lines.append('# TYPE monasca_notification_in_flight gauge')
+    lines.extend('monasca_notification_in_flight%s %d' % (_labels([('notification_type', t)]), count)
+                 for t, count in sorted(per_type.items()))
+    lines.append('# TYPE monasca_notification_uptime_seconds gauge')
+    lines.append('monasca_notification_uptime_seconds%s %r' % (_labels([('engine', engine)]), time.time() - started))
+    return '\n'.join(lines) + '\n'
+
+
+def json_snapshot(engine, started):
+    counters, gauges, timers, in_flight = registry.REGISTRY.snapshot()
+    now = time.time()
+    return {
+        'engine': engine,
+        'pid': os.getpid(),
+        'uptime': now - started,
+        'counters': [{'name': name, 'dimensions': dict(dimensions), 'value': value}
+                     for (name, dimensions), value in sorted(counters.items())],
+        'gauges': [{'name': name, 'dimensions': dict(dimensions), 'value': value}
+                   for (name, dimensions), value in sorted(gauges.items())],
+        'timers': [{'name': name, 'dimensions': dict(dimensions), 'count': stats.count, 'sum': stats.sum,
+                    'max': stats.max, 'mean': stats.sum / stats.count if stats.count else None}
+                   for (name, dimensions), stats in sorted(timers.items())],
+        'in_flight': [{'notification_type': notification_type, 'address': address, 'seconds': now - since}
+                      for notification_type, address, since in sorted(in_flight, key=lambda s: s[2])]
+    }
+
+
+def _handler(engine, started):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                self._reply(200, PROMETHEUS_CONTENT_TYPE, prometheus_text(engine, started).encode('utf-8'))
+            elif path == '/stats':
+                self._reply(200, 'application/json', json.dumps(json_snapshot(engine, started), sort_keys=True))
+            else:
+                self._reply(404, 'text/plain', 'Not found, try /metrics or /stats\n')
+
+        def _reply(self, code, content_type, body):
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug('admin endpoint: ' + format, *args)
+
+    return Handler
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start(config, engine, worker=0):
+    """Serve the admin endpoint of this process from a daemon thread when `admin.port` is configured
+
+       Returns the server or None.
+    """
+    if not config or not config.get('port'):
+        return None
+    address = (config.get('host', '127.0.0.1'), int(config['port']) + worker)
+    try:
+        server = _Server(address, _handler(engine, time.time()))
+    except Exception:
+        log.exception('Unable to serve the admin endpoint on %s:%d', *address)
+        return None
+
+    registry.REGISTRY.enabled = True
+    thread = threading.Thread(target=server.serve_forever, name='admin-endpoint')
+    thread.daemon = True
+    thread.start()
+    log.info('Admin endpoint of %s listening on http://%s:%d/metrics', engine, *server.server_address)
+    return server
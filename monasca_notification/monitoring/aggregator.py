@@ -0,0 +1,118 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process pre-aggregation of statsd metrics
+
+   While enabled, counters are summed, gauges keep their last value and timers are collected
+   into histograms per metric name and dimension set, and everything is sent once per flush
+   interval instead of formatting a UDP line per event. A timer is flushed as
+
+       <name>          mean of the interval, with the timer's own metric type
+       <name>.max      maximum of the interval
+       <name>.p99      99th percentile, upper bound of its histogram bucket
+       <name>.count    number of timings, as a counter
+
+   Counters are exact, sample rates only applied to what was sent on the wire.
+"""
+
+import threading
+
+from oslo_log import log as logging
+
+from monasca_notification.monitoring import registry
+
+log = logging.getLogger(__name__)
+
+
+class Aggregator(object):
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._counters = {}
+        self._gauges = {}
+        self._timers = {}
+
+    def add(self, connection, kind, metric, metric_type, value, dimensions):
+        key = (metric, frozenset(dimensions.items()) if dimensions else None)
+        with self._lock:
+            if kind == registry.COUNTER:
+                entry = self._counters.get(key)
+                if entry is None:
+                    self._counters[key] = [connection, metric_type, dimensions, value]
+                else:
+                    entry[3] += value
+            elif kind == registry.GAUGE:
+                self._gauges[key] = (connection, metric_type, dimensions, value)
+            else:
+                entry = self._timers.get(key)
+                if entry is None:
+                    entry = self._timers[key] = (connection, metric_type, dimensions, registry.TimerStats())
+                entry[3].add(value)
+
+    def flush(self):
+        """Send everything aggregated since the last flush, returns the number of lines sent
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+            timers, self._timers = self._timers, {}
+
+        lines = 0
+        for (metric, _), (connection, metric_type, dimensions, value) in counters.items():
+            connection.report(metric, metric_type, value, dimensions, 1)
+            lines += 1
+        for (metric, _), (connection, metric_type, dimensions, value) in gauges.items():
+            connection.report(metric, metric_type, value, dimensions, 1)
+            lines += 1
+        for (metric, _), (connection, metric_type, dimensions, stats) in timers.items():
+            connection.report(metric, metric_type, stats.sum / stats.count, dimensions, 1)
+            connection.report(metric + '.max', metric_type, stats.max, dimensions, 1)
+            connection.report(metric + '.p99', metric_type, stats.percentile(99), dimensions, 1)
+            connection.report(metric + '.count', 'c', stats.count, dimensions, 1)
+            lines += 4
+        return lines
+
+    def start(self, interval):
+        """Aggregate from now on and flush every `interval` seconds from a daemon thread
+        """
+        if not interval or self._thread:
+            return
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='statsd-aggregator')
+        self._thread.daemon = True
+        self._thread.start()
+        log.info('Aggregating statsd metrics, flushing every %ss', interval)
+
+    def stop(self):
+        """Stop aggregating and the flush thread, what was aggregated is left for a final flush()
+        """
+        if not self._thread:
+            return
+        self.enabled = False
+        self._stopped.set()
+        self._thread.join(1)
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Failed to flush aggregated statsd metrics')
+
+
+AGGREGATOR = Aggregator()
@@ -18,6 +18,9 @@ import monascastatsd
 from oslo_config import cfg
 from oslo_log import log
 
+from monasca_notification.monitoring import aggregator
+from monasca_notification.monitoring import registry
+
 LOG = log.getLogger(__name__)
 CONF = cfg.CONF
 
@@ -55,6 +58,46 @@ cfg.CONF.register_group(monitoring_group)
 cfg.CONF.register_opts(monitoring_opts, monitoring_group)
 
 
+class _LocalConnection(object):
+    """Statsd connection proxy for one metric kind
+
+       Values go to the aggregator instead of the wire while it is enabled, and are copied into the
+       registry of the admin endpoint while that is enabled.
+    """
+
+    def __init__(self, connection, kind):
+        self._connection = connection
+        self._kind = kind
+
+    def report(self, metric, metric_type, value, dimensions, sample_rate):
+        if aggregator.AGGREGATOR.enabled:
+            aggregator.AGGREGATOR.add(self._connection, self._kind, metric, metric_type, value, dimensions)
+        else:
+            self._connection.report(metric, metric_type, value, dimensions, sample_rate)
+        if registry.REGISTRY.enabled:
+            registry.REGISTRY.record(self._kind, metric, value, dimensions)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _Client(monascastatsd.Client):
+    """Client whose metrics pass through the local aggregator and registry
+    """
+
+    def get_counter(self, name, connection=None, dimensions=None):
+        return super(_Client, self).get_counter(
+            name, _LocalConnection(connection or self.connection, registry.COUNTER), dimensions)
+
+    def get_gauge(self, name=None, connection=None, dimensions=None):
+        return super(_Client, self).get_gauge(
+            name, _LocalConnection(connection or self.connection, registry.GAUGE), dimensions)
+
+    def get_timer(self, name=None, connection=None, dimensions=None):
+        return super(_Client, self).get_timer(
+            name, _LocalConnection(connection or self.connection, registry.TIMER), dimensions)
+
+
 def get_client(dimensions=None):
     """Creates statsd client
 
@@ -92,9 +135,9 @@ def get_client(dimensions=None):
                 LOG.warn('Cannot override fixed dimension %s=%s', key,
                          _DEFAULT_DIMENSIONS[key])
 
-    client = monascastatsd.Client(name=_CLIENT_NAME, host=CONF.monitoring.statsd_host,
-                                  port=CONF.monitoring.statsd_port, auto_buffer=True,
-                                  max_buffer_size=CONF.monitoring.statsd_buffer, dimensions=dims)
+    client = _Client(name=_CLIENT_NAME, host=CONF.monitoring.statsd_host,
+                     port=CONF.monitoring.statsd_port, auto_buffer=True,
+                     max_buffer_size=CONF.monitoring.statsd_buffer, dimensions=dims)
 
     LOG.debug('Created statsd client %s[%s] = %s:%d', _CLIENT_NAME, dims,
               CONF.monitoring.statsd_host, CONF.monitoring.statsd_port)
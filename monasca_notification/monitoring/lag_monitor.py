@@ -0,0 +1,113 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from monasca_common.kafka_lib import client as kafka_client
+from monasca_common.kafka_lib import common as kafka_common
+from oslo_log import log as logging
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import KAFKA_CONSUMER_LAG, MESSAGE_AGE, PERIODIC_DRIFT
+
+log = logging.getLogger(__name__)
+
+STATSD_CLIENT = client.get_client()
+
+# Offset request time selecting the offset of the next message to be appended to a partition
+_LATEST_OFFSET = -1
+
+
+class LagMonitor(object):
+    """Reports how far an engine is behind its topic
+
+       The engine only records what it is working on, which is a few attribute assignments. A
+       daemon thread queries the latest Kafka offsets and sends the gauges every `interval`
+       seconds, so do_message never waits for Kafka or statsd on its behalf.
+    """
+
+    def __init__(self, kafka_url, topic, interval):
+        self._kafka_url = kafka_url
+        self._topic = topic
+        self._interval = interval
+        self._kafka = None
+        self._thread = None
+        self._gauge = STATSD_CLIENT.get_gauge(dimensions={'topic': topic})
+
+        self._next_offsets = {}  # partition -> offset of the next message the engine will read
+        self._timestamp = None
+        self._finished = None
+        self._drift = None
+
+    def start(self):
+        if not self._interval or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='lag-monitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def received(self, partition, offset):
+        self._next_offsets[partition] = offset + 1
+
+    def processing(self, timestamp):
+        """Record the time in seconds the message being processed stands for
+        """
+        self._finished = None
+        self._timestamp = timestamp
+
+    def processed(self):
+        self._finished = time.time()
+
+    def fired(self, period, drift):
+        """Record how many seconds later than due a periodic notification was sent
+        """
+        if self._drift is None or drift > self._drift[1]:
+            self._drift = (period, drift)
+
+    def _latest_offsets(self, partitions):
+        if self._kafka is None:
+            self._kafka = kafka_client.KafkaClient(self._kafka_url)
+        try:
+            responses = self._kafka.send_offset_request(
+                [kafka_common.OffsetRequest(self._topic, partition, _LATEST_OFFSET, 1) for partition in partitions])
+        except Exception:
+            self._kafka.close()
+            self._kafka = None
+            raise
+        return {response.partition: response.offsets[0] for response in responses}
+
+    def report(self):
+        next_offsets = dict(self._next_offsets.items())
+        if next_offsets:
+            for partition, latest in self._latest_offsets(sorted(next_offsets)).items():
+                self._gauge.send(KAFKA_CONSUMER_LAG, max(0, latest - next_offsets[partition]),
+                                 dimensions={'partition': str(partition)})
+
+        timestamp, finished = self._timestamp, self._finished
+        if timestamp is not None:
+            self._gauge.send(MESSAGE_AGE, (finished or time.time()) - timestamp)
+
+        drift, self._drift = self._drift, None
+        if drift is not None:
+            self._gauge.send(PERIODIC_DRIFT, drift[1], dimensions={'period': str(drift[0])})
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.report()
+            except Exception:
+                log.exception('Failed to report consumer lag of topic %s', self._topic)
@@ -16,16 +16,77 @@ KAFKA_CONSUMER_ERRORS = 'kafka.consumer_errors'
 """ errors occured when fetching messages from Kafka (incl. ZK) """
 KAFKA_PRODUCER_ERRORS = "kafka.producer_errors"
 """ errors when publishing a message or message batch to Kafka """
+SPOOLED_COUNT = 'notification.spooled'
+""" messages written to the local spool because publishing to Kafka failed, by topic """
+SPOOL_REPLAYED_COUNT = 'notification.spool_replayed'
+""" spooled messages published to Kafka later, by topic """
+SPOOL_BYTES = 'notification.spool_bytes'
+""" size of the spool segments of an engine not replayed yet, by spool (the topic the engine consumes) """
+KAFKA_CONSUMER_LAG = "kafka.consumer_lag"
+""" messages the engine is behind the end of its topic, by partition """
+MESSAGE_AGE = 'notification.message_age'
+""" age in seconds of the message being processed, from the alarm or notification timestamp """
+PERIODIC_DRIFT = 'notification.periodic_drift'
+""" seconds a periodic notification was sent later than its period, worst since the last report """
 ALARMS_FINISHED_COUNT = 'notification.alarms_processed'
 """ number of processed alarms """
+ALARMS_SKIPPED_COUNT = 'notification.alarms_skipped'
+""" number of alarms skipped without notifications, by reason and by stage (prefilter or parse) """
 NOTIFICATION_SENT_COUNT = 'notification.notifications_sent'
 """ number of sent notifications """
 NOTIFICATION_SEND_ERROR_COUNT = 'notification.notification_send_errors'
 """ number of notification send errors """
 NOTIFICATION_SEND_TIMER = 'notification.notification_send_time'
 """ number of notification send timing """
+NOTIFICATIONS_DEDUPLICATED_COUNT = 'notification.notifications_deduplicated'
+""" notifications not sent because the sent notification log shows they were sent before, by notification type """
+TEMPLATE_CACHE_COUNT = 'notification.template_cache'
+""" template render cache lookups, by notification_type and result (hit or miss) """
+TEMPLATE_VARS_SKIPPED_COUNT = 'notification.template_vars_skipped'
+""" template variables not computed because the template does not reference them, by template
+    (alarm_description or notification) and notification_type """
+STAGE_TIMER = 'notification.stage_time'
+""" time spent per alarm pipeline stage, dimension stage is one of kafka_wait, parse, validate, db_lookup,
+    notification_build, template_render, kafka_publish, kafka_commit and memory_backpressure
+    (sending is notification_send_time). kafka_wait is the time until the next message arrived, idle
+    time included and the work done between messages excluded """
+ALARM_LATENCY_TIMER = 'notification.alarm_latency'
+""" time from the alarm timestamp until its notification was first sent, by notification type """
+NOTIFICATIONS_SHED_COUNT = 'notification.notifications_shed'
+""" notifications not sent on their own by admission control, by reason, action (dropped or summarized),
+    notification type and severity """
+ALARMS_TRUNCATED_COUNT = 'notification.alarms_truncated'
+""" oversized alarms decoded with only their first metrics and sub-alarms """
+ALARMS_GROUPED_COUNT = 'notification.alarms_grouped'
+""" notifications not sent on their own but combined with the ones of correlated alarms, by notification type """
+LANE_DEPTH = 'notification.lane_depth'
+""" notifications waiting in a priority lane, by lane """
+LANE_WAIT_TIME = 'notification.lane_wait_time'
+""" time a notification waited in its priority lane, by lane """
+QUEUE_DEPTH = 'notification.queue_depth'
+""" items waiting in a queue between two pipeline stages, by queue """
+QUEUE_BLOCKED_TIME = 'notification.queue_blocked_time'
+""" time a pipeline stage was blocked adding to a full queue, by queue """
+IN_FLIGHT_BYTES = 'notification.in_flight_bytes'
+""" approximate memory held by alarms read from Kafka and not finished yet, incl. their notifications, by topic """
+IN_FLIGHT_BYTES_HIGH_WATER = 'notification.in_flight_bytes_high_water'
+""" highest notification.in_flight_bytes since the previous report, by topic """
+DRAIN_TIMER = 'notification.drain_time'
+""" time an engine took to finish its in-flight messages after it was asked to stop, by topic """
+DRAIN_ABANDONED_COUNT = 'notification.drain_abandoned'
+""" messages left uncommitted because the drain timeout passed, read again by the next engine, by topic """
+TENANT_DISPATCHED_COUNT = 'notification.tenant_dispatched'
+""" notifications taken from the priority lanes and sent or failed, by tenant_id """
+TENANT_WAIT_TIME = 'notification.tenant_wait_time'
+""" time a notification waited in the priority lanes, incl. time its tenant was at its in-flight cap, by tenant_id """
 
 CONFIGDB_ERRORS = "configdb.access_errors"
 """ errors when accessing the configuration DB (e.g. MySQL) """
 CONFIGDB_TIME = "configdb.access_time"
 """ time needed to access the configuration DB (e.g. MySQL) """
+CONFIGDB_POOL_WAIT_TIME = "configdb.pool_wait_time"
+""" time spent waiting to check out a configuration DB connection from the pool """
+CONFIGDB_POOL_ACTIVE = "configdb.pool_active"
+""" number of configuration DB connections currently checked out """
+CONFIGDB_POOL_IDLE = "configdb.pool_idle"
+""" number of open configuration DB connections waiting in the pool """
@@ -0,0 +1,126 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process local copy of the metrics sent to statsd
+
+   Every counter, gauge and timer created through `client.get_client` reports here as well as to
+   statsd, so the admin endpoint can serve the current values even when the statsd agent is down.
+   Recording is off until `REGISTRY.enabled` is set, then it costs one lock and a dictionary
+   update per metric.
+"""
+
+import bisect
+import contextlib
+import itertools
+import threading
+import time
+
+# Upper bounds in seconds of the timer histogram buckets, the last bucket is unbounded
+TIMER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+TIMER = 'timer'
+
+
+class TimerStats(object):
+    __slots__ = ('count', 'sum', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(TIMER_BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(TIMER_BUCKETS, seconds)] += 1
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the `pct` percentile, at most the maximum seen
+        """
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(TIMER_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max)
+        return self.max
+
+
+def _key(name, dimensions):
+    return name, tuple(sorted(dimensions.items())) if dimensions else ()
+
+
+class Registry(object):
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timers = {}
+        self._in_flight = {}
+        self._in_flight_ids = itertools.count()
+
+    def record(self, kind, name, value, dimensions):
+        key = _key(name, dimensions)
+        with self._lock:
+            if kind == COUNTER:
+                self._counters[key] = self._counters.get(key, 0) + value
+            elif kind == GAUGE:
+                self._gauges[key] = value
+            else:
+                stats = self._timers.get(key)
+                if stats is None:
+                    stats = self._timers[key] = TimerStats()
+                stats.add(value)
+
+    @contextlib.contextmanager
+    def in_flight(self, notification_type, address):
+        """Track a notification send for the duration of the block
+        """
+        if not self.enabled:
+            yield
+            return
+        send_id = next(self._in_flight_ids)
+        self._in_flight[send_id] = (notification_type, address, time.time())
+        try:
+            yield
+        finally:
+            self._in_flight.pop(send_id, None)
+
+    def snapshot(self):
+        """Return a consistent copy of all values as
+           (counters, gauges, timers, in-flight sends), keyed by (name, sorted dimension items)
+        """
+        with self._lock:
+            timers = {}
+            for key, stats in self._timers.items():
+                copy = timers[key] = TimerStats()
+                copy.count, copy.sum, copy.max, copy.buckets = stats.count, stats.sum, stats.max, list(stats.buckets)
+            return dict(self._counters), dict(self._gauges), timers, list(self._in_flight.values())
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timers.clear()
+            self._in_flight.clear()
+
+
+REGISTRY = Registry()
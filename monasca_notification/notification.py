@@ -19,12 +19,116 @@ import logging
 import time
 
 import datetime
-from jinja2 import Template
-from jinja2 import TemplateSyntaxError
+
+from monasca_notification.common import template_cache
 
 log = logging.getLogger(__name__)
 
 
+class AlarmContext(object):
+    """Values derived from one alarm, computed once and shared by all notifications of the alarm
+
+       An alarm with N notification methods yields N notifications, which all reference the same
+       dimensions, metric values and rendered description, and serialize the alarm and its
+       metrics to JSON only once.
+    """
+    __slots__ = ('raw_alarm', 'alarm_timestamp', 'alarm_age', 'dimensions', 'metric_values',
+                 'alarm_description', '_json')
+
+    def __init__(self, alarm):
+        self.raw_alarm = alarm
+        self._json = {}
+
+        # The event timestamp is in milliseconds
+        self.alarm_timestamp = alarm['timestamp'] / 1000
+        self.alarm_age = time.time() - self.alarm_timestamp
+
+        # collect alarm dimensions and render alarm-description as needed
+        self.dimensions = {}
+        summary = alarm.get('dimensionSummary')
+        if summary:
+            # a truncated alarm only kept some of its metrics, the summary covers all of them
+            for k, v in summary.iteritems():
+                more = v['count'] - len(v['values'])
+                self.dimensions[k] = ", ".join(v['values']) + (", ... ({} more)".format(more) if more else "")
+        for metric in alarm['metrics'] if not summary else []:
+            for k, v in metric['dimensions'].iteritems():
+                old = self.dimensions.get(k)
+                if not old:
+                    self.dimensions[k] = v
+                elif isinstance(old, set):
+                    old.add(v)
+                else:
+                    self.dimensions[k] = {old, v}
+        for k, v in self.dimensions.iteritems():
+            if isinstance(v, set):
+                self.dimensions[k] = ", ".join(v)
+
+        # provide actual metric values leading to the alarm
+        self.metric_values = {}
+        for subalarm in alarm['subAlarms']:
+            metric_name = subalarm['subAlarmExpression']['metricDefinition']['name'].replace('.', '_')
+            metric_value = subalarm['currentValues']
+            if len(metric_value) == 0:
+                self.metric_values[metric_name] = None
+            elif len(metric_value) == 1:
+                self.metric_values[metric_name] = metric_value[0]
+            else:
+                self.metric_values[metric_name] = metric_value
+
+        # attempt interpreting description as Jinja2 template, with only the variables it uses
+        self.alarm_description = alarm['alarmDescription']
+        try:
+            compiled = template_cache.compile_cached(self.alarm_description)
+            if compiled:
+                template, variables = compiled
+                self.alarm_description = template.render(**self._template_vars(alarm, variables))
+        except Exception:
+            log.exception("failed rendering alarm-definition: %s", self.alarm_description)
+
+    def _template_vars(self, alarm, variables):
+        template_vars = {}
+        template_vars.update(self.dimensions)
+        template_vars.update(self.metric_values)
+        derived = {'_age': lambda: self.alarm_age,
+                   '_timestamp': lambda: str(datetime.datetime.utcfromtimestamp(
+                       self.alarm_timestamp)).replace(" ", "T") + 'Z',
+                   '_state': lambda: alarm['newState'],
+                   '_old_state': lambda: alarm['oldState']}
+        skipped = 0
+        for name, value in derived.iteritems():
+            if name in variables:
+                template_vars[name] = value()
+            else:
+                skipped += 1
+        if skipped:
+            template_cache.skipped_count.increment(skipped, dimensions={'template': 'alarm_description'})
+        return template_vars
+
+    def __eq__(self, other):
+        return isinstance(other, AlarmContext) and self.raw_alarm == other.raw_alarm
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def json(self, key):
+        """Return the JSON of raw_alarm (key 'raw_alarm') or of its metrics (key 'metrics')
+        """
+        text = self._json.get(key)
+        if text is None:
+            value = self.raw_alarm if key == 'raw_alarm' else self.raw_alarm[key]
+            # notifications may be sent from several threads, at worst both serialize it
+            text = self._json[key] = json.dumps(value)
+        return text
+
+    def dumps_with(self, data, key):
+        """Return json.dumps(data) with `key` added, serialized only once per alarm
+        """
+        text = json.dumps(data)
+        fragment = '"{}": {}'.format(key, self.json(key))
+        return '{' + fragment + '}' if text == '{}' else '{}, {}}}'.format(text[:-1], fragment)
+
+
 class Notification(object):
     """An abstract base class used to define the notification interface
        and common functions
@@ -53,10 +157,12 @@ class Notification(object):
         'retry_count',
         'raw_alarm',
         'period',
-        'periodic_topic'
+        'periodic_topic',
+        'context',
+        'truncated'
     )
 
-    def __init__(self, id, type, name, address, period, retry_count, alarm):
+    def __init__(self, id, type, name, address, period, retry_count, alarm, context=None):
         """Setup the notification object
              id - The notification id
              type - The notification type
@@ -66,6 +172,7 @@ class Notification(object):
              retry_count - number of times we've tried to send
              alarm - info that caused the notification
              notifications that come after this one to remain uncommitted.
+             context - the AlarmContext of alarm, shared by all its notifications
              Note that data may include unicode strings.
         """
         self.id = id
@@ -76,12 +183,13 @@ class Notification(object):
 
         self.raw_alarm = alarm
 
+        if context is None:
+            context = AlarmContext(alarm)
+
         self.alarm_id = alarm['alarmId']
         self.alarm_name = alarm['alarmName']
-        self.alarm_description = alarm['alarmDescription']
-        # The event timestamp is in milliseconds
-        self.alarm_timestamp = alarm['timestamp'] / 1000
-        self.alarm_age = time.time() - self.alarm_timestamp
+        self.alarm_timestamp = context.alarm_timestamp
+        self.alarm_age = context.alarm_age
         self.message = alarm['stateChangeReason']
         self.state = alarm['newState']
         self.old_state = alarm['oldState']
@@ -90,6 +198,8 @@ class Notification(object):
         self.lifecycle_state = alarm['lifecycleState']
         self.tenant_id = alarm['tenantId']
         self.metrics = alarm['metrics']
+        # set when an oversized alarm was decoded with only its first metrics and sub-alarms
+        self.truncated = 'truncated' in alarm
 
         # to be updated on actual notification send time
         self.notification_timestamp = None
@@ -98,49 +208,10 @@ class Notification(object):
         self.periodic_topic = period
         self.period = period
 
-        # collect alarm dimensions and render alarm-description as needed
-        self.dimensions = {}
-        for metric in self.metrics:
-            for k, v in metric['dimensions'].iteritems():
-                old = self.dimensions.get(k)
-                if not old:
-                    self.dimensions[k] = v
-                elif isinstance(old, set):
-                    old.add(v)
-                else:
-                    self.dimensions[k] = {old, v}
-        for k, v in self.dimensions.iteritems():
-            if isinstance(v, set):
-                self.dimensions[k] = ", ".join(v)
-
-        # provide actual metric values leading to the alarm
-        self.metric_values = {}
-        for subalarm in alarm['subAlarms']:
-            metric_name = subalarm['subAlarmExpression']['metricDefinition']['name'].replace('.', '_')
-            metric_value = subalarm['currentValues']
-            if len(metric_value) == 0:
-                self.metric_values[metric_name] = None
-            elif len(metric_value) == 1:
-                self.metric_values[metric_name] = metric_value[0]
-            else:
-                self.metric_values[metric_name] = metric_value
-
-        # add additional variables
-        template_vars = {}
-        template_vars.update(self.dimensions)
-        template_vars.update(self.metric_values)
-        template_vars['_age'] = self.alarm_age
-        template_vars['_timestamp'] = str(datetime.datetime.utcfromtimestamp(self.alarm_timestamp)).replace(" ", "T") + 'Z'
-        template_vars['_state'] = self.state
-        template_vars['_old_state'] = self.old_state
-
-        # attempt interpreting description as Jinja2 template
-        try:
-            self.alarm_description = Template(self.alarm_description).render(**template_vars)
-        except TemplateSyntaxError:
-            pass
-        except Exception:
-            log.exception("failed rendering alarm-definition: %s", self.alarm_description)
+        self.dimensions = context.dimensions
+        self.metric_values = context.metric_values
+        self.alarm_description = context.alarm_description
+        self.context = context
 
     def __eq__(self, other):
         if not isinstance(other, Notification):
@@ -157,33 +228,36 @@ class Notification(object):
 
     def to_json(self):
         notification_data = self.to_dict()
-        return json.dumps(notification_data)
+        del notification_data['raw_alarm']
+        return self.context.dumps_with(notification_data, 'raw_alarm')
+
+    # fields of to_dict, which templates can reference by the same name
+    to_dict_fields = frozenset([
+        'id',
+        'type',
+        'name',
+        'address',
+        'retry_count',
+        'raw_alarm',
+        'alarm_id',
+        'alarm_name',
+        'alarm_description',
+        'alarm_timestamp',
+        'message',
+        'notification_timestamp',
+        'old_state',
+        'state',
+        'severity',
+        'link',
+        'lifecycle_state',
+        'tenant_id',
+        'period',
+        'periodic_topic'
+    ])
 
     def to_dict(self):
         """Return json representation
             """
-        notification_fields = [
-            'id',
-            'type',
-            'name',
-            'address',
-            'retry_count',
-            'raw_alarm',
-            'alarm_id',
-            'alarm_name',
-            'alarm_description',
-            'alarm_timestamp',
-            'message',
-            'notification_timestamp',
-            'old_state',
-            'state',
-            'severity',
-            'link',
-            'lifecycle_state',
-            'tenant_id',
-            'period',
-            'periodic_topic'
-        ]
         notification_data = {name: getattr(self, name)
-                             for name in notification_fields}
+                             for name in self.to_dict_fields}
         return notification_data
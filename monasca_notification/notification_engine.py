@@ -13,28 +13,92 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
 import time
 
 from oslo_log import log as logging
 
 from monasca_notification.base_engine import BaseEngine
-from monasca_notification.monitoring.metrics import ALARMS_FINISHED_COUNT
+from monasca_notification.common import sent_log
+from monasca_notification.common.memory_budget import NOTIFICATION_BYTES
+from monasca_notification.common.offset_tracker import OffsetTracker
+from monasca_notification.common.stage_queue import StageQueue
+from monasca_notification.monitoring.metrics import ALARM_LATENCY_TIMER, ALARMS_FINISHED_COUNT
+from processors import admission
+from processors import grouping
+from processors.alarm_processor import alarm_timestamp
 from processors.alarm_processor import AlarmProcessor
 from processors.notification_processor import NotificationProcessor
+from processors.priority_lanes import PriorityLanes
 
 log = logging.getLogger(__name__)
 
 
+class _DrainOverdue(Exception):
+    """Raised while draining once the drain timeout passed, the remaining alarms are abandoned
+    """
+
+
+class _AlarmWork(object):
+    """Notifications of one alarm message not sent yet, the alarm is committed once none remain
+    """
+    __slots__ = ('partition', 'offset', 'remaining')
+
+    def __init__(self, partition, offset, remaining):
+        self.partition = partition
+        self.offset = offset
+        self.remaining = remaining
+
+
 class NotificationEngine(BaseEngine):
     def __init__(self, config):
-        super(NotificationEngine, self).__init__(config, config['kafka']['alarm_topic'], config['zookeeper']['notification_path'])
+        priority = config.get('priority') or {}
+        queues = config.get('queues') or {}
+        idle = priority.get('lanes') or queues.get('staged') or config.get('grouping') or config.get('admission')
+        super(NotificationEngine, self).__init__(config, config['kafka']['alarm_topic'], config['zookeeper']['notification_path'],
+                                                 commit_callback=self._idle if idle else None)
         self._topics = {}
         self._topics['notification_topic'] = config['kafka']['notification_topic']
         self._topics['retry_topic'] = config['kafka']['notification_retry_topic']
         self._alarm_ttl = config['processors']['alarm']['ttl']
         self._alarms = AlarmProcessor(self._alarm_ttl, config)
         self._finished_count = self._statsd.get_counter(name=ALARMS_FINISHED_COUNT)
-        self._notifier = NotificationProcessor(config)
+        self._latency_timer = self._statsd.get_timer()
+        self._notifier = NotificationProcessor(config, sent_log.load(config.get('idempotency')))
+        self._admission = admission.load(config.get('admission'))
+        self._grouping = grouping.load(config.get('grouping'))
+        self._admission_lock = threading.Lock()
+
+        # With priority lanes alarms are read ahead and their notifications sent by dispatcher
+        # threads, this thread keeps reading from and committing to Kafka
+        self._lanes = PriorityLanes(priority['lanes'], priority.get('tenants')) if priority.get('lanes') else None
+        self._read_ahead = priority.get('read_ahead', 256)
+        self._dispatchers = priority.get('dispatchers', 1)
+        self._work_lock = threading.Lock()
+        self._offsets = OffsetTracker()
+        self._committed = {}
+        self._capacity = threading.Condition()
+        self._worker_error = None
+        self._workers = []
+
+        # Staged, alarms are parsed and looked up by processors.alarm.number threads, sent by
+        # processors.send.number threads (or the priority lane dispatchers) and published by one
+        # thread, connected by bounded queues. This thread only reads from and commits to Kafka.
+        self._staged = queues.get('staged', False)
+        if self._staged:
+            self._alarm_workers = config['processors']['alarm'].get('number', 1)
+            self._alarm_batch_size = config['processors']['alarm'].get('batch_size', 64)
+            self._dispatchers = config['processors'].get('send', {}).get('number', self._dispatchers)
+            self._alarm_queue = StageQueue('alarms', queues.get('alarms_size', 256))
+            self._notification_queue = StageQueue('notifications', queues.get('notifications_size', 256))
+            self._sent_queue = StageQueue('sent_notifications', queues.get('sent_notifications_size', 256))
+            self._finished_queue = StageQueue('finished', queues.get('finished_size', 256))
+        # alarms finish once all their notifications are sent, grouped ones only after the window
+        self._finishes_later = True
+
+    @property
+    def threaded(self):
+        return bool(self._staged or self._lanes)
 
     def _add_periodic_notifications(self, notifications):
         for notification in notifications:
@@ -42,20 +106,392 @@ class NotificationEngine(BaseEngine):
             topic = notification.periodic_topic
             if notification.period:
                 notification.notification_timestamp = time.time()
-                self._producer.publish(self._config['kafka']['periodic'][60],
-                                       [notification.to_json()])
+                self.publish_messages([notification], self._config['kafka']['periodic'][60])
+
+    def _report_latency(self, notifications):
+        """Report the time from the alarm until its notifications were sent
+        """
+        for notification in notifications:
+            latency = notification.notification_timestamp - notification.raw_alarm['timestamp'] / 1000.0
+            self._latency_timer.timing(ALARM_LATENCY_TIMER, latency,
+                                       dimensions={'notification_type': notification.type})
 
     def do_message(self, alarm):
         log.debug('Received alarm >|%s|<', str(alarm))
+        self._lag.processing(alarm_timestamp(alarm[1].message.value))
+        if self._staged:
+            self._read_staged(alarm)
+            return
+
         notifications, partition, offset = self._alarms.to_notification(alarm)
-        if notifications:
-            self._add_periodic_notifications(notifications)
+        if self._lanes:
+            self._wait_for_capacity()
+        self._offsets.add(partition, offset)
+        work = self._start_alarm(partition, offset, notifications, self._finish)
+        send = self._admit(notifications, work, self._finish) + self._due(self._finish)
+
+        if self._lanes:
+            for notification, works in send:
+                self._lanes.put(notification, (notification, works))
+        elif send:
+            self._send(send)
+        self._commit_finished()
+
+    def _start_alarm(self, partition, offset, notifications, finish):
+        """Return the work tracking the notifications of an alarm, or None if it is finished already
+        """
+        if not notifications:
+            finish(partition, offset)
+            return None
+        self._budget.add(partition, offset, len(notifications) * NOTIFICATION_BYTES)
+        return _AlarmWork(partition, offset, len(notifications))
+
+    def _release(self, works, finish):
+        """Count one notification of each alarm in `works` as done, finish(partition, offset) alarms done
+
+           finish - _finish on the Kafka thread and the dispatchers, _queue_finished in the stages
+        """
+        with self._work_lock:
+            for work in works:
+                work.remaining -= 1
+            finished = [work for work in works if not work.remaining]
+        for work in finished:
+            finish(work.partition, work.offset)
+
+    def _admitted(self, pairs):
+        """Return the (notification, works) passing admission control and the works of the others
+
+           Called with the admission lock held.
+        """
+        if not self._admission or not pairs:
+            return pairs, []
+        admitted = set(id(notification) for notification in self._admission.admit([n for n, _ in pairs]))
+        shed = [work for notification, works in pairs if id(notification) not in admitted for work in works]
+        return [pair for pair in pairs if id(pair[0]) in admitted], shed
+
+    def _admit(self, notifications, work, finish):
+        """Return the notifications of one alarm to send now, after grouping and admission control
+
+           Returns [(notification, [works of the alarms it stands for])].
+        """
+        with self._admission_lock:
+            if self._grouping:
+                pairs = self._grouping.add(notifications, work)
+            else:
+                pairs = [(notification, [work]) for notification in notifications]
+            pairs, shed = self._admitted(pairs)
+        # shed notifications are done, dropped or summarized
+        self._release(shed, finish)
+        return pairs
+
+    def _due(self, finish):
+        """Return the notifications held back earlier that are due now, grouped ones and summaries
+        """
+        with self._admission_lock:
+            due = self._grouping.due() if self._grouping else []
+            due, shed = self._admitted(due)
+            if self._admission:
+                due += [(summary, []) for summary in self._admission.due()]
+        self._release(shed, finish)
+        return due
+
+    def _send_due(self):
+        """Hand on the held back notifications that are due, runs on the Kafka thread
+
+           Held back notifications keep their alarms in flight, so this also runs while waiting
+           for alarms to finish.
+        """
+        due = self._due(self._finish)
+        if self._staged:
+            for notification, works in due:
+                self._put_send(notification, works, waiting=self._finish_staged)
+        elif self._lanes:
+            for notification, works in due:
+                self._lanes.put(notification, (notification, works))
+        elif due:
+            self._send(due)
+
+    def _idle(self):
+        """Called about once a second by the consumer, between messages and while waiting for them
+        """
+        self._send_due()
+        if self._staged:
+            self._finish_staged()
+        else:
+            self._commit_finished()
+
+    def _send(self, pairs):
+        """Send, publish and release [(notification, works)], on the Kafka thread or a dispatcher
+        """
+        notifications = [notification for notification, _ in pairs]
+        self._add_periodic_notifications(notifications)
+
+        sent, failed = self._notifier.send(notifications)
+        self._report_latency(sent)
+        self.publish_messages(sent, self._topics['notification_topic'])
+        self.publish_messages(failed, self._topics['retry_topic'])
+        self._release([work for _, works in pairs for work in works], self._finish)
+
+    def _check_workers(self):
+        if self._worker_error is not None:
+            raise self._worker_error
 
-            sent, failed = self._notifier.send(notifications)
-            self.publish_messages(sent, self._topics['notification_topic'])
-            self.publish_messages(failed, self._topics['retry_topic'])
+    def _start_worker(self, name, target):
+        def run():
+            try:
+                target()
+            except Exception as e:
+                log.exception('Notification worker %s failed', name)
+                self._worker_error = e
+                with self._capacity:
+                    self._capacity.notify_all()
 
+        worker = threading.Thread(target=run, name=name)
+        worker.daemon = True
+        worker.start()
+        return worker
 
-        self._consumer.commit()
+    def _wait_for_capacity(self):
+        """Wait while `read_ahead` alarms are in flight, runs on the Kafka thread
+        """
+        while self._offsets.pending() >= self._read_ahead:
+            self._check_workers()
+            self._send_due()
+            with self._capacity:
+                if self._offsets.pending() >= self._read_ahead:
+                    self._capacity.wait(1)
+            self._commit_finished()
+        self._check_workers()
 
+    def _queue_finished(self, partition, offset):
+        self._finished_queue.put((partition, offset))
+
+    def _finish(self, partition, offset):
+        self._offsets.done(partition, offset)
+        self._budget.done(partition, offset)
         self._finished_count.increment()
+        with self._capacity:
+            self._capacity.notify()
+
+    def _over_budget(self):
+        self._send_due()
+        if self._staged:
+            self._finish_staged(timeout=0.1)
+        else:
+            self._check_workers()
+            self._budget.wait(0.1)
+            self._commit_finished()
+
+    def _repartitioned(self):
+        """Commit what finished and forget the offsets read, the partitions may move to another engine
+
+           Alarms still in flight are not committed by this engine anymore, they are read again from
+           the last commit by whichever engine gets their partition.
+        """
+        if self._staged:
+            self._finish_staged()
+        else:
+            self._commit_finished()
+        self._offsets.reset()
+        self._committed = {}
+
+    def _commit_finished(self):
+        """Commit up to the oldest alarm with unsent notifications, runs on the Kafka thread only
+        """
+        offsets = self._offsets.committable()
+        if offsets != self._committed and self.commit(offsets):
+            self._committed = offsets
+
+    def _dispatch(self):
+        while True:
+            item = self._lanes.get()
+            if item is None:
+                return
+            notification, works = item
+            try:
+                self._send([(notification, works)])
+            finally:
+                self._lanes.done(notification)
+
+    def _flush(self):
+        """Return all notifications still held back by the grouping and admission summaries, on the Kafka thread
+        """
+        with self._admission_lock:
+            held = self._grouping.flush() if self._grouping else []
+            held, shed = self._admitted(held)
+            if self._admission:
+                held += [(summary, []) for summary in self._admission.flush()]
+        self._release(shed, self._finish)
+        return held
+
+    def _read_staged(self, alarm):
+        """Hand a message read from Kafka to the alarm stage, runs on the Kafka thread
+        """
+        while self._offsets.pending() >= self._read_ahead:
+            self._send_due()
+            self._finish_staged(timeout=0.1)
+        self._offsets.add(alarm[0], alarm[1].offset)
+        self._alarm_queue.put(alarm, waiting=self._finish_staged)
+        self._finish_staged()
+
+    def _finish_staged(self, timeout=None):
+        """Mark the alarms finished by the publish stage and commit, runs on the Kafka thread
+
+           timeout - seconds to wait for at least one alarm to finish, don't wait if None
+        """
+        self._check_workers()
+        finished = self._finished_queue.get_available()
+        if not finished and timeout:
+            item = self._finished_queue.get(timeout)
+            finished = [item] if item is not None else []
+        for partition, offset in finished:
+            self._finish(partition, offset)
+        self._commit_finished()
+
+    def _put_send(self, notification, works, waiting=None):
+        if self._lanes:
+            self._lanes.put(notification, (notification, works))
+        else:
+            self._notification_queue.put((notification, works), waiting)
+
+    def _process_alarms(self):
+        """Alarm stage, parse alarms and look up their notification methods
+        """
+        while True:
+            # whatever queued up meanwhile is looked up in the configuration DB with one query
+            batch = [self._alarm_queue.get()]
+            batch.extend(self._alarm_queue.get_available(limit=self._alarm_batch_size - 1))
+            stopped = None in batch
+            if stopped:
+                # one stop marker per worker, leave the others to the remaining workers
+                for _ in range(batch.count(None) - 1):
+                    self._alarm_queue.put(None)
+                batch = [alarm for alarm in batch if alarm is not None]
+
+            for notifications, partition, offset in self._alarms.to_notifications(batch) if batch else []:
+                work = self._start_alarm(partition, offset, notifications, self._queue_finished)
+                for notification, works in self._admit(notifications, work, self._queue_finished):
+                    self._put_send(notification, works)
+            for notification, works in self._due(self._queue_finished):
+                self._put_send(notification, works)
+            if stopped:
+                return
+
+    def _send_notifications(self):
+        """Send stage, only calls the notifiers, publishing is left to the publish stage
+        """
+        while True:
+            item = self._lanes.get() if self._lanes else self._notification_queue.get()
+            if item is None:
+                return
+            notification, works = item
+            try:
+                sent, failed = self._notifier.send([notification])
+            finally:
+                if self._lanes:
+                    self._lanes.done(notification)
+            # neither sent nor failed if the notification type is not configured
+            self._sent_queue.put((notification, True if sent else False if failed else None, works))
+
+    def _publish_notifications(self):
+        """Publish stage, publishes whatever the send stage finished meanwhile in one batch per topic
+        """
+        while True:
+            results = [self._sent_queue.get()]
+            results.extend(self._sent_queue.get_available(limit=255))
+            stopped = None in results
+            results = [result for result in results if result is not None]
+
+            self._add_periodic_notifications([notification for notification, _, _ in results])
+            sent = [notification for notification, result, _ in results if result]
+            failed = [notification for notification, result, _ in results if result is False]
+            self._report_latency(sent)
+            if sent:
+                self.publish_messages(sent, self._topics['notification_topic'])
+            if failed:
+                self.publish_messages(failed, self._topics['retry_topic'])
+
+            self._release([work for _, _, works in results for work in works], self._queue_finished)
+            if stopped:
+                return
+
+    def _finish_draining(self):
+        """Waiting callback of the puts while draining
+        """
+        if self._drain_overdue():
+            raise _DrainOverdue()
+        self._finish_staged()
+
+    def _finish_lanes(self, timeout):
+        """Commit the alarms finished by the dispatchers, waiting up to `timeout` seconds for one
+        """
+        with self._capacity:
+            self._capacity.wait(timeout)
+        self._check_workers()
+        self._commit_finished()
+
+    def _join(self, workers, finish):
+        """Wait for `workers` to end while finish(timeout) commits the alarms they finished
+        """
+        while any(worker.is_alive() for worker in workers):
+            if self._drain_overdue():
+                raise _DrainOverdue()
+            finish(timeout=0.1)
+
+    def _consume(self):
+        if self._staged:
+            self._workers = ([self._start_worker('notification-alarms-%d' % i, self._process_alarms)
+                              for i in range(self._alarm_workers)],
+                             [self._start_worker('notification-sender-%d' % i, self._send_notifications)
+                              for i in range(self._dispatchers)],
+                             [self._start_worker('notification-publisher', self._publish_notifications)])
+        elif self._lanes:
+            self._workers = [self._start_worker('notification-dispatcher-%d' % i, self._dispatch)
+                             for i in range(self._dispatchers)]
+        super(NotificationEngine, self)._consume()
+
+    def _drain(self):
+        """Send what is read and held back, the consumer only stops when asked to or its topic ends
+        """
+        if not self._staged and not self._lanes:
+            held = self._flush()
+            if held:
+                self._send(held)
+            self._commit_finished()
+            return self._offsets.pending()
+
+        try:
+            if self._staged:
+                self._drain_staged()
+            else:
+                self._drain_lanes()
+        except _DrainOverdue:
+            pass
+        if self._staged:
+            self._finish_staged()
+        else:
+            self._commit_finished()
+        return self._offsets.pending()
+
+    def _drain_staged(self):
+        alarm_workers, senders, publisher = self._workers
+        for _ in alarm_workers:
+            self._alarm_queue.put(None, waiting=self._finish_draining)
+        self._join(alarm_workers, self._finish_staged)
+        for notification, works in self._flush():
+            self._put_send(notification, works, waiting=self._finish_draining)
+        if self._lanes:
+            self._lanes.close()
+        else:
+            for _ in senders:
+                self._notification_queue.put(None, waiting=self._finish_draining)
+        self._join(senders, self._finish_staged)
+        self._sent_queue.put(None, waiting=self._finish_draining)
+        self._join(publisher, self._finish_staged)
+
+    def _drain_lanes(self):
+        for notification, works in self._flush():
+            self._lanes.put(notification, (notification, works))
+        self._lanes.close()
+        self._join(self._workers, self._finish_lanes)
+        self._check_workers()
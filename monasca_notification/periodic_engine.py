@@ -58,10 +58,11 @@ class PeriodicEngine(BaseEngine):
     def do_message(self, raw_notification):
         message = raw_notification[1].message.value
         notification_data = json.loads(message)
+        self._lag.processing(notification_data.get('notification_timestamp'))
         notification = construct_notification_object(self._db_repo, notification_data)
 
         if notification is None:
-            self._consumer.commit()
+            self.commit()
             return
 
         if not notification_data['notification_timestamp']:
@@ -70,7 +71,7 @@ class PeriodicEngine(BaseEngine):
                                                         notification.name,
                                                         notification.notification_timestamp,
                                                         notification.period))
-            self._consumer.commit()
+            self.commit()
             return
 
         if self._keep_sending(notification.alarm_id,
@@ -83,6 +84,7 @@ class PeriodicEngine(BaseEngine):
 
             log.debug(u"Wait Duration {}".format(wait_duration))
             if wait_duration < 0:
+                self._lag.fired(self._period, -wait_duration)
                 log.debug(u"Periodic Firing for {} with name {} "
                           u"at {} with period {}.  ".format(notification.type,
                                              notification.name,
@@ -101,4 +103,4 @@ class PeriodicEngine(BaseEngine):
 
             self.publish_messages([notification], self._topic_name)
 
-        self._consumer.commit()
+        self.commit()
@@ -17,17 +17,28 @@ import abc
 import datetime
 
 import six
-from jinja2 import Template
+
+from monasca_notification.common import template_cache
+from monasca_notification.common.template_cache import TemplateCache
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import STAGE_TIMER
+
+STATSD_CLIENT = client.get_client()
+STATSD_TIMER = STATSD_CLIENT.get_timer()
 
 
 @six.add_metaclass(abc.ABCMeta)
 class AbstractNotifier(object):
+    # set by notifiers whose send_notification may run in several dispatcher threads at once
+    thread_safe = False
+
     def __init__(self, type):
         self._config = None
         self._type = type
         self._template_text = None
         self._template_mime_type = None
         self._template = None
+        self._template_cache = TemplateCache(type)
 
     @property
     def type(self):
@@ -43,7 +54,8 @@ class AbstractNotifier(object):
                 tpl_path = tpl['template_file']
                 self._template_text = open(tpl_path, 'r').read()
             self._template_mime_type = tpl.get('mime_type')
-            self._template = Template(self._template_text)
+            self._template_cache = TemplateCache(self._type, tpl.get('cache_size', 256))
+            self._template = self._template_cache.compile(self._template_text)
 
     @abc.abstractmethod
     def send_notification(self, notification):
@@ -69,9 +81,38 @@ class AbstractNotifier(object):
         if not template:
             template = self._template
 
-        template_vars = notification.to_dict()
-        template_vars['alarm_timestamp_utc'] = str(
-            datetime.datetime.utcfromtimestamp(notification.alarm_timestamp)).replace(" ", "T") + 'Z'
-        # replace markdown link syntax with Slack's own one
-        template_vars['alarm_description'] = self._format_text_for_channel(notification.alarm_description)
-        return template.render(**template_vars)
\ No newline at end of file
+        with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'template_render', 'notification_type': self._type}):
+            template_vars = self._template_vars(notification, self._template_cache.variables(template))
+            return self._template_cache.render(template, template_vars)
+
+    def _template_vars(self, notification, variables=None):
+        """Return the template variables of the notification, only the given ones if not None
+        """
+        derived = {
+            'alarm_timestamp_utc': lambda: str(
+                datetime.datetime.utcfromtimestamp(notification.alarm_timestamp)).replace(" ", "T") + 'Z',
+            # replace markdown link syntax with Slack's own one
+            'alarm_description': lambda: self._format_text_for_channel(notification.alarm_description),
+            # set when the notification stands in for a group of correlated alarms
+            'grouped_alarms': lambda: notification.raw_alarm.get('groupedAlarms', []),
+            'grouped_dimensions': lambda: notification.raw_alarm.get('groupedDimensions', {}),
+            # set when an oversized alarm was decoded with only its first metrics and sub-alarms
+            'truncated': lambda: notification.raw_alarm.get('truncated', {}),
+            'dimension_summary': lambda: notification.raw_alarm.get('dimensionSummary', {})}
+        if variables is None:
+            template_vars = notification.to_dict()
+            template_vars.update((name, value()) for name, value in derived.iteritems())
+            return template_vars
+
+        template_vars = {}
+        fields = notification.to_dict_fields
+        for name in variables:
+            if name in derived:
+                template_vars[name] = derived[name]()
+            elif name in fields:
+                template_vars[name] = getattr(notification, name)
+        skipped = len(fields.union(derived)) - len(template_vars)
+        if skipped:
+            template_cache.skipped_count.increment(skipped, dimensions={'template': 'notification',
+                                                                        'notification_type': self._type})
+        return template_vars
@@ -20,8 +20,6 @@ import markdown
 
 import re
 
-from jinja2 import Template
-
 from monasca_notification.monitoring import client
 from monasca_notification.monitoring.metrics import NOTIFICATION_SEND_TIMER
 from monasca_notification.plugins import abstract_notifier
@@ -73,7 +71,8 @@ class EmailNotifier(abstract_notifier.AbstractNotifier):
     def config(self, config):
         super(EmailNotifier, self).config(config)
         if self._template:
-            self._subject_template = Template(config['template'].get('subject', DEFAULT_SUBJECT_TEMPLATE))
+            self._subject_template = self._template_cache.compile(
+                config['template'].get('subject', DEFAULT_SUBJECT_TEMPLATE))
         self._smtp_connect()
 
     @STATSD_TIMER.timed(NOTIFICATION_SEND_TIMER, dimensions={'notification_type': 'email'})
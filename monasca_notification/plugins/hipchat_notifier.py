@@ -48,6 +48,8 @@ STATSD_TIMER = STATSD_CLIENT.get_timer()
 
 
 class HipChatNotifier(abstract_notifier.AbstractNotifier):
+    thread_safe = True
+
     def __init__(self, log):
         super(HipChatNotifier, self).__init__("hipchat")
         self._log = log
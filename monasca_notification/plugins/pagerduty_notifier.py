@@ -27,6 +27,8 @@ STATSD_TIMER = STATSD_CLIENT.get_timer()
 
 
 class PagerdutyNotifier(abstract_notifier.AbstractNotifier):
+    thread_safe = True
+
     def __init__(self, log):
         super(PagerdutyNotifier, self).__init__("pagerduty")
         self._log = log
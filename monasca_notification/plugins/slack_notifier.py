@@ -38,6 +38,8 @@ STATSD_TIMER = STATSD_CLIENT.get_timer()
 
 
 class SlackNotifier(abstract_notifier.AbstractNotifier):
+    thread_safe = True
+
     def __init__(self, log):
         super(SlackNotifier, self).__init__("slack")
         self._log = log
@@ -13,8 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-
 import requests
 
 from monasca_notification.monitoring import client
@@ -26,6 +24,8 @@ STATSD_TIMER = STATSD_CLIENT.get_timer()
 
 
 class WebhookNotifier(abstract_notifier.AbstractNotifier):
+    thread_safe = True
+
     def __init__(self, log):
         super(WebhookNotifier, self).__init__("webhook")
         self._log = log
@@ -44,8 +44,7 @@ class WebhookNotifier(abstract_notifier.AbstractNotifier):
                 'state': notification.state,
                 'old_state': notification.raw_alarm['oldState'],
                 'message': notification.message,
-                'tenant_id': notification.tenant_id,
-                'metrics': notification.metrics}
+                'tenant_id': notification.tenant_id}
 
         headers = {'content-type': 'application/json'}
 
@@ -54,7 +53,7 @@ class WebhookNotifier(abstract_notifier.AbstractNotifier):
         try:
             # Posting on the given URL
             result = requests.post(url=url,
-                                   data=json.dumps(body),
+                                   data=notification.context.dumps_with(body, 'metrics'),
                                    headers=headers,
                                    timeout=self._config['timeout'])
 
@@ -0,0 +1,217 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Admission control between building notifications and sending them
+
+   During alarm storms the engine would rather send fewer notifications in time than all of them
+   hours late. An admission controller decides for every notification whether it is sent, and may
+   add summary notifications standing in for the ones it held back. The controller is loaded from
+   `admission.driver` like the repository drivers, BudgetAdmission is the default.
+"""
+
+import abc
+import time
+
+import six
+from monasca_common.simport import simport
+from oslo_log import log as logging
+
+from monasca_notification import notification as notification_module
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import NOTIFICATIONS_SHED_COUNT
+
+log = logging.getLogger(__name__)
+
+STATSD_CLIENT = client.get_client()
+shed_count = STATSD_CLIENT.get_counter(name=NOTIFICATIONS_SHED_COUNT)
+
+DEFAULT_DRIVER = 'monasca_notification.processors.admission:BudgetAdmission'
+
+
+@six.add_metaclass(abc.ABCMeta)
+class AdmissionController(object):
+    def __init__(self, config):
+        self._config = config
+
+    @abc.abstractmethod
+    def admit(self, notifications):
+        """Return the notifications of one alarm that may be sent now
+        """
+
+    def due(self):
+        """Return notifications the controller generated itself and wants sent now, e.g. summaries
+        """
+        return []
+
+    def flush(self):
+        """Return all notifications the controller still holds, due or not, e.g. before stopping
+        """
+        return []
+
+    @staticmethod
+    def shed(notification, reason, action):
+        """Record that `notification` is not sent on its own, every shed decision must go through here
+        """
+        log.info('Shedding %s notification %s of alarm %s (tenant %s, severity %s): %s, %s',
+                 notification.type, notification.id, notification.alarm_id, notification.tenant_id,
+                 notification.severity, reason, action)
+        shed_count.increment(1, dimensions={'reason': reason,
+                                            'action': action,
+                                            'notification_type': notification.type,
+                                            'severity': notification.severity})
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def available(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens >= 1
+
+
+class _Summary(object):
+    __slots__ = ('latest', 'count', 'alarms', 'since')
+
+    def __init__(self, now):
+        self.latest = None
+        self.count = 0
+        self.alarms = []
+        self.since = now
+
+
+class BudgetAdmission(AdmissionController):
+    """Token bucket budgets per tenant and per notification method
+
+       A notification needs a token of its tenant's and of its method's bucket. Over budget,
+       notifications with a severity in `drop_severities` are dropped, the others are folded into
+       one summary per notification method that is sent every `summary_interval` seconds.
+       Severities in `exempt_severities` are always sent. Configuration ::
+
+           admission:
+               tenant: {rate: 10, burst: 100}  # notifications per second
+               method: {rate: 1, burst: 20}
+               drop_severities: [LOW]
+               exempt_severities: [CRITICAL]
+               summary_interval: 60
+               summary_alarms: 20  # alarms listed by name in a summary
+    """
+
+    def __init__(self, config):
+        super(BudgetAdmission, self).__init__(config)
+        self._tenant_budget = config.get('tenant')
+        self._method_budget = config.get('method')
+        self._drop = frozenset(s.upper() for s in config.get('drop_severities', ['LOW']))
+        self._exempt = frozenset(s.upper() for s in config.get('exempt_severities', ['CRITICAL']))
+        self._summary_interval = config.get('summary_interval', 60)
+        self._summary_alarms = config.get('summary_alarms', 20)
+        self._tenants = {}
+        self._methods = {}
+        self._summaries = {}
+
+    @staticmethod
+    def _bucket(buckets, key, budget, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(float(budget['rate']), float(budget.get('burst', budget['rate'])),
+                                                now)
+        return bucket
+
+    def _over_budget(self, notification, now):
+        """Take the tokens of `notification` and return None, or return the exhausted budget
+        """
+        buckets = []
+        if self._tenant_budget:
+            buckets.append(('tenant_budget',
+                            self._bucket(self._tenants, notification.tenant_id, self._tenant_budget, now)))
+        if self._method_budget:
+            buckets.append(('method_budget',
+                            self._bucket(self._methods, notification.id, self._method_budget, now)))
+        for reason, bucket in buckets:
+            if not bucket.available(now):
+                return reason
+        for _, bucket in buckets:
+            bucket.tokens -= 1
+        return None
+
+    def admit(self, notifications):
+        now = time.time()
+        admitted = []
+        for notification in notifications:
+            if notification.severity.upper() in self._exempt:
+                admitted.append(notification)
+                continue
+            reason = self._over_budget(notification, now)
+            if reason is None:
+                admitted.append(notification)
+            elif notification.severity.upper() in self._drop:
+                self.shed(notification, reason, 'dropped')
+            else:
+                self.shed(notification, reason, 'summarized')
+                self._add_to_summary(notification, now)
+        return admitted
+
+    def _add_to_summary(self, notification, now):
+        summary = self._summaries.get(notification.id)
+        if summary is None:
+            summary = self._summaries[notification.id] = _Summary(now)
+        summary.latest = notification
+        summary.count += 1
+        if len(summary.alarms) < self._summary_alarms:
+            summary.alarms.append(u'{} [{}, {}]'.format(notification.alarm_name, notification.state,
+                                                        notification.severity))
+
+    def due(self):
+        now = time.time()
+        due = [method for method, summary in self._summaries.items()
+               if now - summary.since >= self._summary_interval]
+        return [summary_notification(self._summaries.pop(method), now) for method in due]
+
+    def flush(self):
+        now = time.time()
+        summaries = self._summaries.values()
+        self._summaries.clear()
+        return [summary_notification(summary, now) for summary in summaries]
+
+
+def summary_notification(summary, now):
+    """Build one notification to the method of `summary` standing in for all notifications it holds
+    """
+    latest = summary.latest
+    listed = u'\n'.join(summary.alarms)
+    if summary.count > len(summary.alarms):
+        listed += u'\n... and {} more'.format(summary.count - len(summary.alarms))
+    alarm = dict(latest.raw_alarm)
+    alarm.update({
+        'alarmName': u'{} alarm notifications suppressed'.format(summary.count),
+        'alarmDescription': u'Notifications were held back during an alarm storm since {}'.format(
+            time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(summary.since))),
+        'stateChangeReason': listed,
+        'timestamp': int(now * 1000),
+        'metrics': [],
+        'subAlarms': []})
+    return notification_module.Notification(latest.id, latest.type, latest.name, latest.address, 0, 0, alarm)
+
+
+def load(config):
+    """Return the configured admission controller, or None without an admission section
+    """
+    if not config:
+        return None
+    return simport.load(config.get('driver', DEFAULT_DRIVER))(config)
@@ -15,6 +15,7 @@
 
 import json
 import logging
+import re
 import time
 
 from monasca_notification.common.repositories import exceptions as exc
@@ -22,48 +23,84 @@ from monasca_notification.common.utils import get_db_repo
 from monasca_notification import notification
 from monasca_notification import notification_exceptions
 from monasca_notification.monitoring import client
-from monasca_notification.monitoring.metrics import CONFIGDB_TIME
+from monasca_notification.monitoring.metrics import ALARMS_SKIPPED_COUNT, CONFIGDB_TIME, STAGE_TIMER
+from monasca_notification.processors import alarm_schema
+from monasca_notification.processors import large_alarm
 
 log = logging.getLogger(__name__)
 
 STATSD_CLIENT = client.get_client()
 STATSD_TIMER = STATSD_CLIENT.get_timer()
 no_notification_count = STATSD_CLIENT.get_counter(name='notification.alarms_no_notification')
+skipped_count = STATSD_CLIENT.get_counter(name=ALARMS_SKIPPED_COUNT)
+
+# Unescaped quotes only occur around JSON keys and string values, so these can only match keys
+_TIMESTAMP_RE = re.compile(r'"timestamp"\s*:\s*(\d+)(?:\.\d+)?\s*[,}]')
+_ACTIONS_DISABLED_RE = re.compile(r'"actionsEnabled"\s*:\s*(?:false|0)\s*[,}]')
+_ACTIONS_ENABLED_RE = re.compile(r'"actionsEnabled"\s*:')
+
+
+def alarm_timestamp(alarm_data):
+    """Return the alarm timestamp in seconds without decoding the JSON payload, None if ambiguous
+    """
+    match = AlarmProcessor._unique_match(_TIMESTAMP_RE, alarm_data)
+    return int(match.group(1)) / 1000.0 if match else None
 
 
 class AlarmProcessor(object):
     def __init__(self, alarm_ttl, config):
         self._alarm_ttl = alarm_ttl
         self._db_repo = get_db_repo(config)
+        self._large_alarms = large_alarm.load(config.get('large_alarms'))
 
-    @staticmethod
-    def _parse_alarm(alarm_data):
+    def _parse_alarm(self, alarm_data):
         """Parse the alarm message making sure it matches the expected format.
         """
-        expected_fields = [
-            'actionsEnabled',
-            'alarmId',
-            'alarmDefinitionId',
-            'alarmName',
-            'newState',
-            'oldState',
-            'stateChangeReason',
-            'severity',
-            'link',
-            'lifecycleState',
-            'tenantId',
-            'timestamp'
-        ]
-        json_alarm = json.loads(alarm_data)
-        alarm = json_alarm['alarm-transitioned']
-        for field in expected_fields:
-            if field not in alarm:
-                raise notification_exceptions.AlarmFormatError(
-                    'Alarm data missing field %s' % field)
-        if ('tenantId' not in alarm) or ('alarmId' not in alarm):
-            raise notification_exceptions.AlarmFormatError
+        if self._large_alarms and self._large_alarms.applies(alarm_data):
+            with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'parse'}):
+                return self._large_alarms.parse(alarm_data)
 
-        return alarm
+        try:
+            with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'parse'}):
+                json_alarm = json.loads(alarm_data)
+        except ValueError as e:
+            raise notification_exceptions.AlarmFormatError('Alarm data is not valid JSON: %s' % e)
+
+        with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'validate'}):
+            return alarm_schema.validate(json_alarm)
+
+    @staticmethod
+    def _unique_match(regex, data):
+        """Return the match if `regex` matches `data` exactly once, otherwise None
+        """
+        matches = regex.finditer(data)
+        first = next(matches, None)
+        if first is None or next(matches, None) is not None:
+            return None
+        return first
+
+    def _prefilter(self, raw_alarm):
+        """Find alarms that would be skipped anyway, without decoding the JSON payload
+
+           Returns the skip reason or None. This only decides when the answer is unambiguous, e.g. the
+           timestamp key occurs exactly once; everything else is left to the full parse.
+        """
+        message = raw_alarm[1].message
+        data = message.value
+        if self._alarm_ttl is not None:
+            # Kafka assigns the message timestamp on append, so it is never older than the alarm
+            message_timestamp = getattr(message, 'timestamp', None)
+            if message_timestamp and message_timestamp > 0:
+                if time.time() - message_timestamp / 1000.0 > self._alarm_ttl:
+                    return 'expired'
+            match = self._unique_match(_TIMESTAMP_RE, data)
+            if match and time.time() - int(match.group(1)) / 1000.0 > self._alarm_ttl:
+                return 'expired'
+
+        if self._unique_match(_ACTIONS_ENABLED_RE, data) and _ACTIONS_DISABLED_RE.search(data):
+            return 'actions_disabled'
+
+        return None
 
     def _alarm_is_valid(self, alarm):
         """Check if the alarm is enabled and is within the ttl, return True in that case
@@ -82,48 +119,131 @@ class AlarmProcessor(object):
 
     @STATSD_TIMER.timed(CONFIGDB_TIME, sample_rate=1)
     def _build_notification(self, alarm):
-        alarms_actions = self._db_repo.fetch_notifications(alarm)
+        with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'db_lookup'}):
+            alarms_actions = list(self._db_repo.fetch_notifications(alarm))
 
-        return [notification.Notification(
-                alarms_action[0],
-                alarms_action[1],
-                alarms_action[2],
-                alarms_action[3],
-                alarms_action[4],
-                0,
-                alarm) for alarms_action in alarms_actions]
+        return self._notifications(alarm, alarms_actions)
 
-    def to_notification(self, raw_alarm):
-        """Check the notification setting for this project then create the appropriate notification
+    @staticmethod
+    def _notifications(alarm, alarms_actions):
+        if not alarms_actions:
+            return []
+
+        with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'notification_build'}):
+            context = notification.AlarmContext(alarm)
+            return [notification.Notification(
+                    alarms_action[0],
+                    alarms_action[1],
+                    alarms_action[2],
+                    alarms_action[3],
+                    alarms_action[4],
+                    0,
+                    alarm,
+                    context) for alarms_action in alarms_actions]
+
+    @STATSD_TIMER.timed(CONFIGDB_TIME, sample_rate=1)
+    def _fetch_actions(self, keys):
+        """Return the notification methods of every (alarm_definition_id, alarm_state) in `keys`
+        """
+        with STATSD_TIMER.time(STAGE_TIMER, dimensions={'stage': 'db_lookup'}):
+            fetch_batch = getattr(self._db_repo, 'fetch_notifications_batch', None)
+            if fetch_batch is not None:
+                return fetch_batch(keys)
+            # repositories without batch support are asked once per key
+            actions = {}
+            for definition_id, state in keys:
+                alarm = {'alarmDefinitionId': definition_id, 'newState': state}
+                actions[(definition_id, state)] = list(self._db_repo.fetch_notifications(alarm))
+            return actions
+
+    def _alarm(self, raw_alarm):
+        """Return the parsed alarm of a message, None if it is skipped
         """
         global no_notification_count
 
         partition = raw_alarm[0]
         offset = raw_alarm[1].offset
+        reason = self._prefilter(raw_alarm)
+        if reason:
+            log.debug('Skipping alarm before parsing (%s), partition %d, offset %d', reason, partition, offset)
+            no_notification_count += 1
+            skipped_count.increment(dimensions={'reason': reason, 'stage': 'prefilter'})
+            return None
+
         try:
             alarm = self._parse_alarm(raw_alarm[1].message.value)
-        except Exception as e:  # This is general because of a lack of json exception base class
+        except notification_exceptions.AlarmFormatError as e:
+            log.warn("Invalid Alarm format skipping partition %d, offset %d\nError%s" % (partition, offset, e))
+            skipped_count.increment(dimensions={'reason': 'invalid', 'stage': 'parse'})
+            return None
+        except Exception as e:
             log.exception("Invalid Alarm format skipping partition %d, offset %d\nError%s" % (partition, offset, e))
-            return [], partition, offset
+            skipped_count.increment(dimensions={'reason': 'invalid', 'stage': 'parse'})
+            return None
 
         log.debug("Read alarm from alarms sent_queue. Partition %d, Offset %d, alarm data %s"
                   % (partition, offset, alarm))
 
         if not self._alarm_is_valid(alarm):
             no_notification_count += 1
-            return [], partition, offset
+            reason = 'actions_disabled' if not alarm['actionsEnabled'] else 'expired'
+            skipped_count.increment(dimensions={'reason': reason, 'stage': 'parse'})
+            return None
 
-        try:
-            notifications = self._build_notification(alarm)
-        except exc.DatabaseException:
-            log.debug('Database Error.  Attempting reconnect')
-            notifications = self._build_notification(alarm)
+        return alarm
+
+    @staticmethod
+    def _result(alarm, notifications, partition, offset):
+        global no_notification_count
 
         if len(notifications) == 0:
             no_notification_count += 1
+            skipped_count.increment(dimensions={'reason': 'no_notification', 'stage': 'parse'})
             log.debug('No notifications found for this alarm, partition %d, offset %d, alarm data %s'
                       % (partition, offset, alarm))
             return [], partition, offset
         else:
             log.debug('Found %d notifications: [%s]', len(notifications), notifications)
             return notifications, partition, offset
+
+    def to_notification(self, raw_alarm):
+        """Check the notification setting for this project then create the appropriate notification
+        """
+        partition = raw_alarm[0]
+        offset = raw_alarm[1].offset
+        alarm = self._alarm(raw_alarm)
+        if alarm is None:
+            return [], partition, offset
+
+        try:
+            notifications = self._build_notification(alarm)
+        except exc.DatabaseException:
+            log.debug('Database Error.  Attempting reconnect')
+            notifications = self._build_notification(alarm)
+
+        return self._result(alarm, notifications, partition, offset)
+
+    def to_notifications(self, batch):
+        """Like to_notification for a batch of raw alarms, with one DB lookup for the whole batch
+
+           Returns a (notifications, partition, offset) tuple per raw alarm, in the order of `batch`.
+        """
+        alarms = [(raw_alarm[0], raw_alarm[1].offset, self._alarm(raw_alarm)) for raw_alarm in batch]
+        keys = set((alarm['alarmDefinitionId'], alarm['newState']) for _, _, alarm in alarms if alarm is not None)
+
+        actions = {}
+        if keys:
+            try:
+                actions = self._fetch_actions(keys)
+            except exc.DatabaseException:
+                log.debug('Database Error.  Attempting reconnect')
+                actions = self._fetch_actions(keys)
+
+        results = []
+        for partition, offset, alarm in alarms:
+            if alarm is None:
+                results.append(([], partition, offset))
+                continue
+            alarms_actions = actions.get((alarm['alarmDefinitionId'], alarm['newState']), [])
+            results.append(self._result(alarm, self._notifications(alarm, alarms_actions), partition, offset))
+        return results
@@ -0,0 +1,106 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Schema of the alarm-transitioned envelope
+
+   The schema is compiled once at import time into flat lookup structures, so validating an alarm is
+   a single pass over the payload: one subset test for the required keys, a type check per typed
+   field, and one check per metric and sub-alarm. Everything `Notification` reads from the alarm is
+   covered, so malformed alarms are rejected here rather than failing half-way through building
+   notifications.
+"""
+
+import numbers
+
+import six
+
+from monasca_notification import notification_exceptions
+
+ENVELOPE = 'alarm-transitioned'
+
+_STRING = six.string_types
+_NUMBER = numbers.Number
+_LIST = list
+_DICT = dict
+
+# (field, accepted types) in the order missing fields are reported, None accepts any type
+ALARM_FIELDS = (
+    ('actionsEnabled', None),
+    ('alarmId', _STRING),
+    ('alarmDefinitionId', _STRING),
+    ('alarmName', _STRING),
+    ('newState', _STRING),
+    ('oldState', _STRING),
+    ('stateChangeReason', _STRING),
+    ('severity', _STRING),
+    ('link', None),
+    ('lifecycleState', None),
+    ('tenantId', _STRING),
+    ('timestamp', _NUMBER),
+    ('alarmDescription', None),
+    ('metrics', _LIST),
+    ('subAlarms', _LIST)
+)
+
+_REQUIRED = frozenset(name for name, _ in ALARM_FIELDS)
+_TYPED = tuple((name, types) for name, types in ALARM_FIELDS if types is not None)
+_TYPE_NAMES = {_STRING: 'a string', _NUMBER: 'a number', _LIST: 'a list', _DICT: 'a dictionary'}
+
+
+def _missing(alarm):
+    for name, _ in ALARM_FIELDS:
+        if name not in alarm:
+            return name
+
+
+def _validate_sub_alarm(i, sub_alarm):
+    try:
+        name = sub_alarm['subAlarmExpression']['metricDefinition']['name']
+        values = sub_alarm['currentValues']
+    except (KeyError, TypeError):
+        raise notification_exceptions.AlarmFormatError(
+            'Alarm sub-alarm %d is missing subAlarmExpression.metricDefinition.name or currentValues' % i)
+    if not isinstance(name, _STRING) or not isinstance(values, _LIST):
+        raise notification_exceptions.AlarmFormatError(
+            'Alarm sub-alarm %d has a malformed metric name or currentValues' % i)
+
+
+def validate(message):
+    """Validate a decoded alarm-transitioned message and return the normalized alarm
+
+       The alarm stays a plain dictionary, since it travels on as `Notification.raw_alarm` and is
+       serialized to the notification topics. Normalization only coerces actionsEnabled to a bool.
+       Raises AlarmFormatError describing the first problem found.
+    """
+    alarm = message.get(ENVELOPE) if isinstance(message, _DICT) else None
+    if not isinstance(alarm, _DICT):
+        raise notification_exceptions.AlarmFormatError('Alarm data missing field %s' % ENVELOPE)
+
+    if not _REQUIRED.issubset(alarm):
+        raise notification_exceptions.AlarmFormatError('Alarm data missing field %s' % _missing(alarm))
+
+    for name, types in _TYPED:
+        if not isinstance(alarm[name], types):
+            raise notification_exceptions.AlarmFormatError(
+                'Alarm field %s must be %s' % (name, _TYPE_NAMES[types]))
+
+    for i, metric in enumerate(alarm['metrics']):
+        if not isinstance(metric, _DICT) or not isinstance(metric.get('dimensions'), _DICT):
+            raise notification_exceptions.AlarmFormatError('Alarm metric %d has no dimensions dictionary' % i)
+    for i, sub_alarm in enumerate(alarm['subAlarms']):
+        _validate_sub_alarm(i, sub_alarm)
+
+    alarm['actionsEnabled'] = bool(alarm['actionsEnabled'])
+    return alarm
@@ -0,0 +1,180 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Grouping of correlated alarm transitions into one notification
+
+   When e.g. a network partition makes the same alarm definition fire for fifty hosts, every
+   notification method of the definition would be called fifty times. Instead the notifications
+   are held back for `window` seconds, grouped by alarm definition, notification method and new
+   state, and every group is sent as one notification.
+
+   The combined notification is the one of the first alarm of its group, with the metrics of all
+   alarms, so `dimensions` merges the dimensions of all of them. The alarm additionally carries ::
+
+       groupedAlarms: [{alarmId, alarmName, severity, timestamp, stateChangeReason, dimensions}]
+       groupedDimensions: {dimension: [sorted values over all alarms]}
+
+   which templates see as `grouped_alarms` and `grouped_dimensions`. Every notification goes along
+   with the work of its alarm, and a combined one with the works of all its alarms, so the engine
+   commits an alarm only once the notification standing in for it was sent.
+"""
+
+import collections
+import time
+
+from oslo_log import log as logging
+
+from monasca_notification import notification as notification_module
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import ALARMS_GROUPED_COUNT
+
+log = logging.getLogger(__name__)
+
+STATSD_CLIENT = client.get_client()
+grouped_count = STATSD_CLIENT.get_counter(name=ALARMS_GROUPED_COUNT)
+
+
+class _Group(object):
+    __slots__ = ('since', 'notifications', 'works')
+
+    def __init__(self, now):
+        self.since = now
+        self.notifications = []
+        self.works = []
+
+
+class AlarmGrouping(object):
+    """Holds notifications back and combines the ones of correlated alarms, configuration ::
+
+           grouping:
+               window: 10  # seconds a group waits for more alarms
+               max_alarms: 100  # a group is sent early once it has this many alarms
+               listed_alarms: 20  # alarms listed by reason in the combined message
+    """
+
+    def __init__(self, config):
+        self._window = config.get('window', 10)
+        self._max_alarms = config.get('max_alarms', 100)
+        self._listed_alarms = config.get('listed_alarms', 20)
+        self._groups = collections.OrderedDict()
+
+    @staticmethod
+    def key(notification):
+        """Return the group of `notification`, or None if it is sent on its own
+        """
+        definition = notification.raw_alarm.get('alarmDefinitionId')
+        # periodic notifications are re-sent per alarm by the periodic engine
+        if definition is None or notification.period:
+            return None
+        return definition, notification.id, notification.state
+
+    def add(self, notifications, work=None):
+        """Hold back the notifications that can be grouped, return the ones to send now
+
+           work - what the engine tracks the alarm of `notifications` with, None for nothing
+           Returns [(notification, [works of the alarms it stands for])].
+        """
+        now = time.time()
+        works = [work] if work is not None else []
+        send = []
+        for notification in notifications:
+            key = self.key(notification)
+            if key is None:
+                send.append((notification, works))
+                continue
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(now)
+            group.notifications.append(notification)
+            group.works.extend(works)
+            if len(group.notifications) >= self._max_alarms:
+                send.append(self._combine(self._groups.pop(key)))
+        return send
+
+    def due(self):
+        """Return the combined notifications of the groups whose window has passed, with their works
+        """
+        now = time.time()
+        due = [key for key, group in self._groups.items() if now - group.since >= self._window]
+        return [self._combine(self._groups.pop(key)) for key in due]
+
+    def flush(self):
+        """Return the combined notifications of all groups with their works, e.g. before stopping
+        """
+        groups = self._groups.values()
+        self._groups.clear()
+        return [self._combine(group) for group in groups]
+
+    def pending(self):
+        return sum(len(group.notifications) for group in self._groups.values())
+
+    def _combine(self, group):
+        notifications = group.notifications
+        if len(notifications) > 1:
+            grouped_count.increment(len(notifications) - 1, dimensions={'notification_type': notifications[0].type})
+            log.debug('Combining %d %s notifications of alarm definition %s', len(notifications),
+                      notifications[0].type, notifications[0].raw_alarm['alarmDefinitionId'])
+        return grouped_notification(notifications, self._listed_alarms), group.works
+
+
+def grouped_notification(notifications, listed_alarms):
+    """Build one notification standing in for `notifications`, which share method and new state
+    """
+    if len(notifications) == 1:
+        return notifications[0]
+
+    first = notifications[0]
+    metrics = []
+    grouped_alarms = []
+    grouped_dimensions = collections.defaultdict(set)
+    for notification in notifications:
+        metrics.extend(notification.metrics)
+        for metric in notification.metrics:
+            for name, value in metric['dimensions'].iteritems():
+                grouped_dimensions[name].add(value)
+        grouped_alarms.append({'alarmId': notification.alarm_id,
+                               'alarmName': notification.alarm_name,
+                               'severity': notification.severity,
+                               'timestamp': notification.raw_alarm['timestamp'],
+                               'stateChangeReason': notification.message,
+                               'dimensions': notification.dimensions})
+
+    listed = u'\n'.join(alarm['stateChangeReason'] for alarm in grouped_alarms[:listed_alarms])
+    if len(grouped_alarms) > listed_alarms:
+        listed += u'\n... and {} more'.format(len(grouped_alarms) - listed_alarms)
+
+    alarm = dict(first.raw_alarm)
+    # the dimension summary of a truncated alarm only covers that alarm, dimensions merge all kept metrics
+    alarm.pop('dimensionSummary', None)
+    if any(notification.truncated for notification in notifications):
+        alarm['truncated'] = {
+            key: sum(notification.raw_alarm.get('truncated', {}).get(key, len(notification.raw_alarm[key]))
+                     for notification in notifications)
+            for key in ('metrics', 'subAlarms')}
+    alarm.update({
+        'stateChangeReason': u'{} alarms changed to {}\n{}'.format(len(notifications), first.state, listed),
+        'metrics': metrics,
+        'groupedAlarms': grouped_alarms,
+        'groupedDimensions': {name: sorted(values) for name, values in grouped_dimensions.items()}})
+    return notification_module.Notification(first.id, first.type, first.name, first.address, first.period,
+                                            first.retry_count, alarm)
+
+
+def load(config):
+    """Return the alarm grouping, or None without a grouping section
+    """
+    if not config:
+        return None
+    return AlarmGrouping(config)
@@ -0,0 +1,201 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bounded decoding of alarms matching thousands of metrics
+
+   Decoded in full, such an alarm takes about ten times its payload in memory, and every
+   notification carries all of its metrics to the templates, the plugins and the notification
+   topics. Payloads over `threshold` bytes are instead decoded one metric and sub-alarm at a time,
+   keeping only the first `max_metrics` and `max_sub_alarms`. A truncated alarm additionally
+   carries ::
+
+       truncated: {metrics: original number of metrics, subAlarms: original number of sub-alarms}
+       dimensionSummary: {dimension: {values: [first distinct values], count: distinct values}}
+
+   The summary covers all metrics, so `dimensions` still lists the values of dropped metrics.
+   Templates see both as `truncated` and `dimension_summary`.
+"""
+
+import json
+from json import decoder
+
+from monasca_notification import notification_exceptions
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import ALARMS_TRUNCATED_COUNT
+from monasca_notification.processors import alarm_schema
+
+STATSD_CLIENT = client.get_client()
+truncated_count = STATSD_CLIENT.get_counter(name=ALARMS_TRUNCATED_COUNT)
+
+_decoder = json.JSONDecoder()
+_whitespace = decoder.WHITESPACE.match
+
+
+def _skip(data, idx):
+    return _whitespace(data, idx).end()
+
+
+def _expect(data, idx, char):
+    idx = _skip(data, idx)
+    if data[idx:idx + 1] != char:
+        raise ValueError('Expecting %r at char %d' % (char, idx))
+    return idx + 1
+
+
+def _scan_object(data, idx, decoders):
+    """Decode the JSON object at `idx`, the values of the keys in `decoders` with those
+
+       decoders - {key: function(data, idx) returning (value, end index)}
+       Returns (object, end index).
+    """
+    idx = _skip(data, _expect(data, idx, '{'))
+    result = {}
+    if data[idx:idx + 1] == '}':
+        return result, idx + 1
+    while True:
+        idx = _expect(data, idx, '"')
+        key, idx = decoder.scanstring(data, idx)
+        idx = _skip(data, _expect(data, idx, ':'))
+        decode = decoders.get(key)
+        result[key], idx = decode(data, idx) if decode else _decoder.raw_decode(data, idx)
+        idx = _skip(data, idx)
+        if data[idx:idx + 1] == '}':
+            return result, idx + 1
+        idx = _expect(data, idx, ',')
+
+
+def _scan_array(data, idx, consume):
+    """Pass the elements of the JSON array at `idx` to `consume` one at a time, return the end index
+    """
+    idx = _skip(data, _expect(data, idx, '['))
+    if data[idx:idx + 1] == ']':
+        return idx + 1
+    while True:
+        value, idx = _decoder.raw_decode(data, _skip(data, idx))
+        consume(value)
+        idx = _skip(data, idx)
+        if data[idx:idx + 1] == ']':
+            return idx + 1
+        idx = _expect(data, idx, ',')
+
+
+class _Bounded(object):
+    """Keeps the first `limit` elements of an array decoded one at a time
+    """
+
+    def __init__(self, limit):
+        self.kept = []
+        self.count = 0
+        self._limit = limit
+
+    def decode(self, data, idx):
+        """Decoder for _scan_object, anything but an array is decoded as is for the schema to reject
+        """
+        if data[idx:idx + 1] != '[':
+            return _decoder.raw_decode(data, idx)
+        return self, _scan_array(data, idx, self.add)
+
+    def add(self, element):
+        self.count += 1
+        if len(self.kept) < self._limit:
+            self.kept.append(element)
+
+    def truncated(self):
+        return self.count > len(self.kept)
+
+
+class _Metrics(_Bounded):
+    """Keeps the first metrics and summarizes the dimensions of all of them
+    """
+
+    def __init__(self, limit, dimension_values):
+        super(_Metrics, self).__init__(limit)
+        self._dimension_values = dimension_values
+        self._values = {}  # dimension -> set of distinct values
+        self._first = {}  # dimension -> first distinct values, in order
+
+    def add(self, metric):
+        if not isinstance(metric, dict) or not isinstance(metric.get('dimensions'), dict):
+            raise notification_exceptions.AlarmFormatError(
+                'Alarm metric %d has no dimensions dictionary' % self.count)
+        super(_Metrics, self).add(metric)
+        for name, value in metric['dimensions'].iteritems():
+            values = self._values.setdefault(name, set())
+            if value not in values:
+                values.add(value)
+                first = self._first.setdefault(name, [])
+                if len(first) < self._dimension_values:
+                    first.append(value)
+
+    def summary(self):
+        return {name: {'values': self._first[name], 'count': len(values)}
+                for name, values in self._values.iteritems()}
+
+
+class LargeAlarmParser(object):
+    """Decodes oversized alarm payloads with bounded metrics, configuration ::
+
+           large_alarms:
+               threshold: 1048576  # payloads over this many bytes are truncated
+               max_metrics: 100
+               max_sub_alarms: 20
+               dimension_values: 20  # distinct values listed per dimension in the summary
+    """
+
+    def __init__(self, config):
+        self._threshold = config.get('threshold', 1048576)
+        self._max_metrics = config.get('max_metrics', 100)
+        self._max_sub_alarms = config.get('max_sub_alarms', 20)
+        self._dimension_values = config.get('dimension_values', 20)
+
+    def applies(self, alarm_data):
+        return len(alarm_data) > self._threshold
+
+    def parse(self, alarm_data):
+        """Decode and validate `alarm_data`, return the alarm with truncated metrics and sub-alarms
+
+           Raises AlarmFormatError for invalid JSON or alarms not matching the schema.
+        """
+        metrics = _Metrics(self._max_metrics, self._dimension_values)
+        sub_alarms = _Bounded(self._max_sub_alarms)
+        alarm_decoders = {'metrics': metrics.decode, 'subAlarms': sub_alarms.decode}
+        try:
+            message, end = _scan_object(alarm_data, 0, {
+                alarm_schema.ENVELOPE: lambda data, idx: _scan_object(data, idx, alarm_decoders)})
+            if _skip(alarm_data, end) != len(alarm_data):
+                raise ValueError('Extra data at char %d' % _skip(alarm_data, end))
+        except ValueError as e:
+            raise notification_exceptions.AlarmFormatError('Alarm data is not valid JSON: %s' % e)
+
+        alarm = message.get(alarm_schema.ENVELOPE)
+        if isinstance(alarm, dict):
+            for name in ('metrics', 'subAlarms'):
+                if isinstance(alarm.get(name), _Bounded):
+                    alarm[name] = alarm[name].kept
+        alarm = alarm_schema.validate(message)
+
+        if metrics.truncated() or sub_alarms.truncated():
+            alarm['truncated'] = {'metrics': metrics.count, 'subAlarms': sub_alarms.count}
+            alarm['dimensionSummary'] = metrics.summary()
+            truncated_count.increment()
+        return alarm
+
+
+def load(config):
+    """Return the large alarm parser, or None without a large_alarms section
+    """
+    if not config:
+        return None
+    return LargeAlarmParser(config)
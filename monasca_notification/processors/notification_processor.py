@@ -23,7 +23,10 @@ log = logging.getLogger(__name__)
 
 class NotificationProcessor(object):
 
-    def __init__(self, config):
+    def __init__(self, config, sent_log=None):
+        """sent_log - SentLog skipping notifications sent before, e.g. by the process before a restart
+        """
+        self._sent_log = sent_log
         notifiers.init()
         notifiers.load_plugins(config['notification_types'])
         notifiers.config(config['notification_types'])
@@ -44,12 +47,25 @@ class NotificationProcessor(object):
                      .format(remaining_plugin_types))
             self._db_repo.insert_notification_method_types(remaining_plugin_types)
 
+    def reconfigure(self, config):
+        """Apply a re-read notification_types section, return the notification types that changed
+        """
+        changed = notifiers.reconfigure(config)
+        if changed:
+            self.insert_configured_plugins()
+        return changed
+
     def send(self, notifications):
         """Send the notifications
              For each notification in a message it is sent according to its type.
              If all notifications fail the alarm partition/offset are added to the finished queue
         """
 
+        if self._sent_log:
+            notifications = self._sent_log.unsent(notifications)
+
         sent, failed, invalid = notifiers.send_notifications(notifications)
 
+        if self._sent_log and sent:
+            self._sent_log.add(sent)
         return sent, failed
@@ -0,0 +1,217 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory priority lanes for notifications
+
+   A notification goes to the first lane, by descending weight, whose severities and notification
+   types match it, a lane without either matches everything. Lanes are served by smooth weighted
+   round robin over the lanes that are not empty, so a lane of weight 8 gets 8 sends for every
+   send of a busy lane of weight 1, but no lane starves.
+
+   Within a lane every tenant has its own queue, served the same way by tenant weight, and a
+   tenant with `max_in_flight` sends in progress is skipped until one of them is done. So a noisy
+   tenant only ever gets its share of the dispatchers.
+"""
+
+import collections
+import threading
+import time
+
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring.metrics import LANE_DEPTH, LANE_WAIT_TIME
+from monasca_notification.monitoring.metrics import TENANT_DISPATCHED_COUNT, TENANT_WAIT_TIME
+
+STATSD_CLIENT = client.get_client()
+
+
+def _smooth_weighted(candidates, weight):
+    """Pick one of `candidates` by smooth weighted round robin, `weight(c)` -> (weight, current)
+    """
+    total = 0
+    best = None
+    best_current = None
+    for candidate in candidates:
+        candidate_weight, current = weight(candidate)
+        current += candidate_weight
+        total += candidate_weight
+        candidate.current = current
+        if best is None or current > best_current:
+            best, best_current = candidate, current
+    if best is not None:
+        best.current -= total
+    return best
+
+
+class _TenantQueue(object):
+    __slots__ = ('tenant', 'weight', 'items', 'current')
+
+    def __init__(self, tenant, weight):
+        self.tenant = tenant
+        self.weight = weight
+        self.items = collections.deque()
+        self.current = 0
+
+
+class Lane(object):
+    def __init__(self, name, weight, severities=None, notification_types=None):
+        self.name = name
+        self.weight = weight
+        self.severities = frozenset(s.upper() for s in severities) if severities else None
+        self.notification_types = frozenset(t.lower() for t in notification_types) if notification_types else None
+        self.tenants = collections.OrderedDict()
+        self.size = 0
+        self.current = 0
+
+    def matches(self, notification):
+        if self.severities is not None and notification.severity.upper() not in self.severities:
+            return False
+        return self.notification_types is None or notification.type.lower() in self.notification_types
+
+    def append(self, tenant, weight, entry):
+        queue = self.tenants.get(tenant)
+        if queue is None:
+            queue = self.tenants[tenant] = _TenantQueue(tenant, weight)
+        queue.items.append(entry)
+        self.size += 1
+
+    def eligible(self, can_send):
+        return [queue for queue in self.tenants.itervalues() if can_send(queue.tenant)]
+
+    def pop(self, queues):
+        queue = _smooth_weighted(queues, lambda q: (q.weight, q.current))
+        entry = queue.items.popleft()
+        self.size -= 1
+        if not queue.items:
+            # an idle tenant neither banks nor owes turns
+            del self.tenants[queue.tenant]
+        return queue.tenant, entry
+
+
+class PriorityLanes(object):
+    def __init__(self, lanes, tenants=None):
+        """lanes - {name: {'weight': n, 'severities': [...], 'notification_types': [...]}}
+           tenants - {'weights': {tenant: n}, 'max_in_flight': n, 'in_flight': {tenant: n}}
+        """
+        if not lanes:
+            raise ValueError('At least one priority lane is required')
+        self._lanes = sorted((Lane(name, int(lane.get('weight', 1)), lane.get('severities'),
+                                   lane.get('notification_types'))
+                              for name, lane in lanes.items()),
+                             key=lambda lane: (-lane.weight, lane.name))
+        tenants = tenants or {}
+        self._tenant_weights = tenants.get('weights') or {}
+        self._max_in_flight = tenants.get('max_in_flight')
+        self._tenant_in_flight = tenants.get('in_flight') or {}
+        if any(lane.weight < 1 for lane in self._lanes) or any(w < 1 for w in self._tenant_weights.values()):
+            raise ValueError('Priority lane and tenant weights must be at least 1')
+        self._default = self._lanes[-1]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._size = 0
+        self._in_flight = collections.Counter()
+        self._gauge = STATSD_CLIENT.get_gauge()
+        self._timer = STATSD_CLIENT.get_timer()
+        self._dispatched = STATSD_CLIENT.get_counter(TENANT_DISPATCHED_COUNT)
+
+    def lane_for(self, notification):
+        for lane in self._lanes:
+            if lane.matches(notification):
+                return lane
+        return self._default
+
+    def _can_send(self, tenant):
+        cap = self._tenant_in_flight.get(tenant, self._max_in_flight)
+        return cap is None or self._in_flight[tenant] < cap
+
+    def put(self, notification, item):
+        lane = self.lane_for(notification)
+        tenant = notification.tenant_id
+        with self._cond:
+            lane.append(tenant, self._tenant_weights.get(tenant, 1), (time.time(), item))
+            self._size += 1
+            self._cond.notify()
+        return lane
+
+    def get(self, timeout=None):
+        """Remove and return the next item, None on timeout or once closed and empty
+
+           The tenant of the item counts as in flight until `done` is called for it.
+        """
+        with self._cond:
+            deadline = time.time() + timeout if timeout is not None else None
+            while True:
+                if self._size:
+                    choice = self._select()
+                    if choice is not None:
+                        break
+                elif self._closed:
+                    return None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            lane, queues = choice
+            tenant, (queued, item) = lane.pop(queues)
+            self._size -= 1
+            self._in_flight[tenant] += 1
+            depth = lane.size
+            if not depth:
+                lane.current = 0
+
+        waited = time.time() - queued
+        self._gauge.send(LANE_DEPTH, depth, dimensions={'lane': lane.name})
+        self._timer.timing(LANE_WAIT_TIME, waited, dimensions={'lane': lane.name})
+        self._timer.timing(TENANT_WAIT_TIME, waited, dimensions={'tenant_id': tenant})
+        return item
+
+    def done(self, notification):
+        """Release the in-flight slot taken by `get` for the tenant of `notification`
+        """
+        tenant = notification.tenant_id
+        with self._cond:
+            self._in_flight[tenant] -= 1
+            if not self._in_flight[tenant]:
+                del self._in_flight[tenant]
+            self._cond.notify()
+        self._dispatched.increment(1, dimensions={'tenant_id': tenant})
+
+    def _select(self):
+        """Return (lane, its tenant queues allowed to send) or None when every tenant is at its cap
+        """
+        eligible = {}
+        for lane in self._lanes:
+            if lane.size:
+                queues = lane.eligible(self._can_send)
+                if queues:
+                    eligible[lane] = queues
+        lane = _smooth_weighted([lane for lane in self._lanes if lane in eligible],
+                                lambda l: (l.weight, l.current))
+        return (lane, eligible[lane]) if lane is not None else None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def depths(self):
+        with self._cond:
+            return {lane.name: lane.size for lane in self._lanes}
+
+    def in_flight(self):
+        with self._cond:
+            return dict(self._in_flight)
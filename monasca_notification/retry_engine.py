@@ -19,6 +19,7 @@ import time
 from oslo_log import log as logging
 
 from monasca_notification.base_engine import BaseEngine
+from monasca_notification.common import sent_log
 from monasca_notification.common.utils import construct_notification_object
 from monasca_notification.common.utils import get_db_repo
 from processors import notification_processor
@@ -38,22 +39,25 @@ class RetryEngine(BaseEngine):
         self._topics['notification_topic'] = config['kafka']['notification_topic']
         self._topics['retry_topic'] = config['kafka']['notification_retry_topic']
 
-        self._notifier = notification_processor.NotificationProcessor(config)
+        self._notifier = notification_processor.NotificationProcessor(config,
+                                                                      sent_log.load(config.get('idempotency')))
         self._db_repo = get_db_repo(config)
 
 
     def do_message(self, raw_notification):
         message = raw_notification[1].message.value
         notification_data = json.loads(message)
+        self._lag.processing(notification_data.get('notification_timestamp'))
         notification = construct_notification_object(self._db_repo, notification_data)
         if notification is None:
-            self._consumer.commit()
+            self.commit()
             return
 
         wait_duration = self._retry_interval - (
             time.time() - notification_data['notification_timestamp'])
-        if wait_duration > 0:
-            time.sleep(wait_duration)
+        if wait_duration > 0 and not self._sleep(wait_duration):
+            # stopping, the retry is left uncommitted for the next engine
+            return
         sent, failed = self._notifier.send([notification])
         if sent:
             self.publish_messages([notification], self._topics['notification_topic'])
@@ -76,4 +80,4 @@ class RetryEngine(BaseEngine):
                                   notification.address,
                                   self._retry_max))
 
-        self._consumer.commit()
+        self.commit()
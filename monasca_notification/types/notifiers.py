@@ -15,12 +15,15 @@
 
 import six
 
+import copy
 import logging
+import threading
 import time
 
 from monasca_common.simport import simport
 
 from monasca_notification.monitoring import client
+from monasca_notification.monitoring import registry
 from monasca_notification.monitoring.metrics import NOTIFICATION_SENT_COUNT, NOTIFICATION_SEND_ERROR_COUNT
 from monasca_notification.plugins import email_notifier
 from monasca_notification.plugins import pagerduty_notifier
@@ -30,6 +33,11 @@ log = logging.getLogger(__name__)
 
 possible_notifiers = None
 configured_notifiers = None
+_notifier_locks = {}
+# what the configured notifiers and loaded plugins were set up with, compared on reconfigure
+_applied = {}
+_plugins = []
+_reconfigure_lock = threading.Lock()
 
 STATSD_CLIENT = client.get_client()
 statsd_sent_count = STATSD_CLIENT.get_counter(NOTIFICATION_SENT_COUNT)
@@ -40,6 +48,8 @@ def init():
     global possible_notifiers, configured_notifiers
 
     configured_notifiers = {}
+    _applied.clear()
+    del _plugins[:]
 
     possible_notifiers = [
         email_notifier.EmailNotifier(log),
@@ -54,6 +64,7 @@ def load_plugins(config):
     for plugin_class in config.get("plugins", []):
         try:
             possible_notifiers.append(simport.load(plugin_class)(log))
+            _plugins.append(plugin_class)
         except Exception:
             log.exception("unable to load the class {0} , ignoring it".format(plugin_class))
 
@@ -77,6 +88,7 @@ def config(cfg):
             try:
                 notifier.config(formatted_config[ntype])
                 configured_notifiers[ntype] = notifier
+                _applied[ntype] = _fingerprint(formatted_config[ntype])
                 log.info("{} notification ready".format(ntype))
             except Exception:
                 log.exception("config exception for {}".format(ntype))
@@ -91,6 +103,63 @@ def config(cfg):
         log.warn("No notifiers found for {0}". format(", ".join(config_with_no_notifiers)))
 
 
+def _fingerprint(notifier_config):
+    """What reconfigure compares, the section incl. the content of its template file
+    """
+    template_file = None
+    if isinstance(notifier_config, dict) and isinstance(notifier_config.get('template'), dict):
+        template_file = notifier_config['template'].get('template_file')
+    template_text = None
+    if template_file:
+        try:
+            with open(template_file, 'r') as template:
+                template_text = template.read()
+        except IOError:
+            pass  # reported by the notifier's config
+    return copy.deepcopy(notifier_config), template_text
+
+
+def reconfigure(cfg):
+    """Apply a re-read notification_types section, only to the notifiers whose section changed
+
+       A changed notifier is replaced by a new instance set up with its config method, sends in
+       progress finish with the previous one and the other notifiers keep their connections and
+       template caches. A notifier failing to configure keeps its previous configuration. Plugins
+       added to the section are loaded, removed ones stay loaded until restarted.
+       Returns the notification types that were reconfigured, added or removed.
+    """
+    global possible_notifiers, configured_notifiers
+
+    with _reconfigure_lock:
+        load_plugins({'plugins': [plugin for plugin in cfg.get('plugins', []) if plugin not in _plugins]})
+
+        formatted_config = {t.lower(): v for t, v in six.iteritems(cfg)}
+        changed = []
+        for index, notifier in enumerate(possible_notifiers):
+            ntype = notifier.type.lower()
+            if ntype not in formatted_config:
+                if configured_notifiers.pop(ntype, None) is not None:
+                    del _applied[ntype]
+                    changed.append(ntype)
+                    log.info("{} notification removed".format(ntype))
+                continue
+            fingerprint = _fingerprint(formatted_config[ntype])
+            if fingerprint == _applied.get(ntype):
+                continue
+            try:
+                replacement = type(notifier)(log)
+                replacement.config(formatted_config[ntype])
+            except Exception:
+                log.exception("config exception for {}, keeping its previous configuration".format(ntype))
+                continue
+            possible_notifiers[index] = replacement
+            configured_notifiers[ntype] = replacement
+            _applied[ntype] = fingerprint
+            changed.append(ntype)
+            log.info("{} notification reconfigured".format(ntype))
+        return changed
+
+
 def send_notifications(notifications):
     sent = []
     failed = []
@@ -125,7 +194,13 @@ def send_single_notification(notification):
 
     ntype = notification.type
     try:
-        return configured_notifiers[ntype].send_notification(notification)
+        notifier = configured_notifiers[ntype]
+        with registry.REGISTRY.in_flight(ntype, notification.address):
+            if notifier.thread_safe:
+                return notifier.send_notification(notification)
+            # several priority lane dispatchers may send at once, e.g. through one SMTP connection
+            with _notifier_locks.setdefault(ntype, threading.Lock()):
+                return notifier.send_notification(notification)
     except Exception:
         log.exception("send_notification exception for {}".format(ntype))
         return False
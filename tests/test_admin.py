@@ -0,0 +1,102 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the metrics registry and the admin endpoint"""
+
+import json
+import unittest
+import urllib2
+
+import mock
+
+from monasca_notification.monitoring import admin
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring import registry
+
+
+class TestAdmin(unittest.TestCase):
+    def setUp(self):
+        registry.REGISTRY.clear()
+        registry.REGISTRY.enabled = True
+        self.connection = mock.Mock()
+        self.statsd = client.get_client()
+
+    def tearDown(self):
+        registry.REGISTRY.enabled = False
+        registry.REGISTRY.clear()
+
+    def test_disabled_registry_records_nothing(self):
+        registry.REGISTRY.enabled = False
+        self.statsd.get_counter('notification.alarms_processed', connection=self.connection).increment()
+
+        self.assertTrue(self.connection.report.called)
+        self.assertEqual(({}, {}, {}, []), registry.REGISTRY.snapshot())
+
+    def test_metrics_are_recorded_and_still_sent(self):
+        counter = self.statsd.get_counter('notification.notifications_sent', connection=self.connection)
+        counter.increment(1, dimensions={'notification_type': 'email'})
+        counter.increment(2, dimensions={'notification_type': 'email'})
+        self.statsd.get_gauge(connection=self.connection).send('configdb.pool_idle', 3)
+        timer = self.statsd.get_timer(connection=self.connection)
+        timer.timing('notification.stage_time', 0.02, dimensions={'stage': 'parse'})
+        timer.timing('notification.stage_time', 7, dimensions={'stage': 'parse'})
+
+        self.assertEqual(5, self.connection.report.call_count)
+        counters, gauges, timers, _ = registry.REGISTRY.snapshot()
+        self.assertEqual([3], [v for (name, dims), v in counters.items()
+                               if name == 'monasca.notification.notifications_sent' and
+                               ('notification_type', 'email') in dims])
+        self.assertEqual([3], [v for (name, _), v in gauges.items() if name == 'monasca.configdb.pool_idle'])
+        stats = [s for (name, _), s in timers.items() if name == 'monasca.notification.stage_time'][0]
+        self.assertEqual((2, 7.02, 7), (stats.count, stats.sum, stats.max))
+
+        text = admin.prometheus_text('NotificationEngine', 0)
+        self.assertIn('# TYPE monasca_notification_notifications_sent_total counter', text)
+        self.assertIn('# TYPE monasca_notification_stage_time_seconds histogram', text)
+        self.assertIn('stage="parse",le="0.025"} 1\n', text)
+        self.assertIn('stage="parse",le="+Inf"} 2\n', text)
+        self.assertIn('monasca_configdb_pool_idle{', text)
+
+    def test_in_flight(self):
+        with registry.REGISTRY.in_flight('webhook', 'http://example.com'):
+            snapshot = admin.json_snapshot('RetryEngine', 0)
+            self.assertIn('monasca_notification_in_flight{notification_type="webhook"} 1',
+                          admin.prometheus_text('RetryEngine', 0))
+        self.assertEqual(['webhook'], [s['notification_type'] for s in snapshot['in_flight']])
+        self.assertEqual([], admin.json_snapshot('RetryEngine', 0)['in_flight'])
+
+    def test_not_configured(self):
+        self.assertIsNone(admin.start(None, 'NotificationEngine'))
+        self.assertIsNone(admin.start({'host': '127.0.0.1'}, 'NotificationEngine'))
+
+    def test_endpoint(self):
+        server = admin.start({'host': '127.0.0.1', 'port': 1}, 'PeriodicEngine', worker=-1)
+        try:
+            url = 'http://127.0.0.1:%d' % server.server_address[1]
+            self.statsd.get_counter('notification.alarms_processed', connection=self.connection).increment()
+
+            stats = json.load(urllib2.urlopen(url + '/stats'))
+            self.assertEqual('PeriodicEngine', stats['engine'])
+            self.assertEqual([1], [c['value'] for c in stats['counters']
+                                   if c['name'] == 'monasca.notification.alarms_processed'])
+
+            response = urllib2.urlopen(url + '/metrics')
+            self.assertTrue(response.info()['Content-Type'].startswith('text/plain; version=0.0.4'))
+            self.assertIn('monasca_notification_alarms_processed_total{', response.read())
+
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, url + '/other')
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,134 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the admission control"""
+
+import unittest
+
+import mock
+
+from monasca_notification import notification
+from monasca_notification.processors import admission
+
+
+def alarm(alarm_id, severity, tenant='tenant'):
+    return {'alarmId': alarm_id,
+            'alarmName': 'name of ' + alarm_id,
+            'alarmDescription': 'description',
+            'timestamp': 1429029121239,
+            'stateChangeReason': 'reason',
+            'newState': 'ALARM',
+            'oldState': 'OK',
+            'severity': severity,
+            'link': None,
+            'lifecycleState': None,
+            'tenantId': tenant,
+            'metrics': [{'dimensions': {'hostname': alarm_id}}],
+            'subAlarms': []}
+
+
+def notifications(count, severity, method='method-1', tenant='tenant'):
+    return [notification.Notification(method, 'email', 'ops', 'ops@example.com', 0, 0,
+                                      alarm('alarm-%d' % i, severity, tenant)) for i in range(count)]
+
+
+@mock.patch('monasca_notification.processors.admission.shed_count')
+@mock.patch('monasca_notification.processors.admission.time')
+class TestBudgetAdmission(unittest.TestCase):
+    def _admission(self, **config):
+        return admission.load(dict({'tenant': {'rate': 1, 'burst': 3}}, **config))
+
+    def test_not_configured(self, mock_time, mock_shed):
+        self.assertIsNone(admission.load(None))
+
+    def test_within_budget(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission()
+        admitted = controller.admit(notifications(3, 'HIGH'))
+
+        self.assertEqual(3, len(admitted))
+        self.assertFalse(mock_shed.increment.called)
+
+    def test_low_severity_dropped(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission()
+
+        self.assertEqual(3, len(controller.admit(notifications(5, 'LOW'))))
+        mock_shed.increment.assert_called_with(1, dimensions={'reason': 'tenant_budget', 'action': 'dropped',
+                                                              'notification_type': 'email', 'severity': 'LOW'})
+        self.assertEqual(2, mock_shed.increment.call_count)
+        self.assertEqual([], controller.due())
+
+    def test_budget_refills(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission()
+        controller.admit(notifications(3, 'LOW'))
+        self.assertEqual(0, len(controller.admit(notifications(1, 'LOW'))))
+
+        mock_time.time.return_value = 1002
+        self.assertEqual(2, len(controller.admit(notifications(3, 'LOW'))))
+
+    def test_budgets_per_tenant(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission()
+
+        self.assertEqual(3, len(controller.admit(notifications(4, 'LOW', tenant='a'))))
+        self.assertEqual(3, len(controller.admit(notifications(4, 'LOW', tenant='b'))))
+
+    def test_method_budget(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = admission.load({'method': {'rate': 1, 'burst': 1}})
+
+        self.assertEqual(1, len(controller.admit(notifications(2, 'LOW', method='m1'))))
+        self.assertEqual(1, len(controller.admit(notifications(2, 'LOW', method='m2'))))
+        self.assertEqual('method_budget', mock_shed.increment.call_args[1]['dimensions']['reason'])
+
+    def test_exempt_severity(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission()
+
+        self.assertEqual(10, len(controller.admit(notifications(10, 'CRITICAL'))))
+
+    def test_summary(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        mock_time.strftime.return_value = '2015-04-14T16:32:01Z'
+        controller = self._admission(summary_interval=60, summary_alarms=2)
+
+        self.assertEqual(3, len(controller.admit(notifications(7, 'HIGH'))))
+        self.assertEqual('summarized', mock_shed.increment.call_args[1]['dimensions']['action'])
+
+        mock_time.time.return_value = 1059
+        self.assertEqual([], controller.due())
+
+        mock_time.time.return_value = 1060
+        summaries = controller.due()
+        self.assertEqual(1, len(summaries))
+        summary = summaries[0]
+        self.assertEqual(('method-1', 'email', 'ops@example.com'), (summary.id, summary.type, summary.address))
+        self.assertEqual('4 alarm notifications suppressed', summary.alarm_name)
+        self.assertEqual(u'name of alarm-3 [ALARM, HIGH]\nname of alarm-4 [ALARM, HIGH]\n... and 2 more',
+                         summary.message)
+        self.assertEqual(0, summary.period)
+        self.assertEqual([], controller.due())
+
+    def test_flush(self, mock_time, mock_shed):
+        mock_time.time.return_value = 1000
+        controller = self._admission(summary_interval=60)
+        controller.admit(notifications(5, 'HIGH', method='m1') + notifications(4, 'HIGH', method='m2'))
+
+        summaries = controller.flush()
+        self.assertEqual([('m1', '2 alarm notifications suppressed'), ('m2', '4 alarm notifications suppressed')],
+                         sorted((summary.id, summary.alarm_name) for summary in summaries))
+        self.assertEqual([], controller.flush())
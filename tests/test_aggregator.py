@@ -0,0 +1,108 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the statsd Aggregator"""
+
+import unittest
+
+import mock
+
+from monasca_notification.monitoring import aggregator
+from monasca_notification.monitoring import client
+from monasca_notification.monitoring import registry
+
+
+class TestAggregator(unittest.TestCase):
+    def setUp(self):
+        aggregator.AGGREGATOR.flush()
+        aggregator.AGGREGATOR.enabled = True
+        self.connection = mock.Mock()
+        self.statsd = client.get_client()
+
+    def tearDown(self):
+        aggregator.AGGREGATOR.enabled = False
+        aggregator.AGGREGATOR.flush()
+
+    def _reported(self):
+        return {(c[0][0], c[0][3].get('notification_type')): (c[0][1], c[0][2])
+                for c in self.connection.report.call_args_list}
+
+    def test_counters_are_summed_per_dimension_set(self):
+        counter = self.statsd.get_counter('notification.notifications_sent', connection=self.connection)
+        for _ in range(3):
+            counter.increment(1, dimensions={'notification_type': 'email'})
+        counter.increment(5, dimensions={'notification_type': 'webhook'}, sample_rate=0.1)
+        self.assertFalse(self.connection.report.called)
+
+        self.assertEqual(2, aggregator.AGGREGATOR.flush())
+        self.assertEqual({('monasca.notification.notifications_sent', 'email'): ('c', 3),
+                          ('monasca.notification.notifications_sent', 'webhook'): ('c', 5)}, self._reported())
+
+        self.connection.reset_mock()
+        self.assertEqual(0, aggregator.AGGREGATOR.flush())
+        self.assertFalse(self.connection.report.called)
+
+    def test_gauges_keep_last_value(self):
+        gauge = self.statsd.get_gauge(connection=self.connection)
+        gauge.send('configdb.pool_idle', 1)
+        gauge.send('configdb.pool_idle', 4)
+
+        aggregator.AGGREGATOR.flush()
+        self.assertEqual({('monasca.configdb.pool_idle', None): ('g', 4)}, self._reported())
+
+    def test_timers_are_summarized(self):
+        timer = self.statsd.get_timer(connection=self.connection)
+        for seconds in [0.001] * 99 + [2]:
+            timer.timing('notification.notification_send_time', seconds, dimensions={'notification_type': 'slack'})
+
+        self.assertEqual(4, aggregator.AGGREGATOR.flush())
+        reported = self._reported()
+        name = 'monasca.notification.notification_send_time'
+        self.assertAlmostEqual(0.02099, reported[(name, 'slack')][1])
+        self.assertEqual(2, reported[(name + '.max', 'slack')][1])
+        self.assertEqual(0.005, reported[(name + '.p99', 'slack')][1])
+        self.assertEqual(('c', 100), reported[(name + '.count', 'slack')])
+
+    def test_disabled_sends_every_event(self):
+        aggregator.AGGREGATOR.enabled = False
+        counter = self.statsd.get_counter('notification.alarms_processed', connection=self.connection)
+        counter.increment()
+        counter.increment()
+
+        self.assertEqual(2, self.connection.report.call_count)
+        self.assertEqual(0, aggregator.AGGREGATOR.flush())
+
+    @mock.patch('monasca_notification.monitoring.aggregator.threading')
+    def test_start(self, mock_threading):
+        agg = aggregator.Aggregator()
+        agg.start(0)
+        self.assertFalse(agg.enabled)
+        self.assertFalse(mock_threading.Thread.called)
+
+        agg.start(10)
+        self.assertTrue(agg.enabled)
+        self.assertTrue(mock_threading.Thread.return_value.start.called)
+
+    def test_stop(self):
+        agg = aggregator.Aggregator()
+        agg.start(60)
+        thread = agg._thread
+        agg.add(self.connection, registry.COUNTER, 'notification.sent', 'c', 1, None)
+        agg.stop()
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(agg.enabled)
+        self.assertFalse(self.connection.report.called)
+        self.assertEqual(1, agg.flush())
@@ -28,6 +28,9 @@ from monasca_notification.processors import alarm_processor
 alarm_tuple = collections.namedtuple('alarm_tuple', ['offset', 'message'])
 message_tuple = collections.namedtuple('message_tuple', ['value'])
 
+metrics = [{'name': 'cpu_util', 'dimensions': {'hostname': 'foo1', 'service': 'bar1'}}]
+sub_alarms = [{'subAlarmExpression': {'metricDefinition': {'name': 'cpu_util'}}, 'currentValues': [95.0]}]
+
 
 class TestAlarmProcessor(unittest.TestCase):
     def setUp(self):
@@ -82,13 +85,32 @@ class TestAlarmProcessor(unittest.TestCase):
 
         self.assertIn(invalid_msg, self.trap)
 
-    def test_old_timestamp(self):
+    def test_malformed_metrics(self):
+        """Alarms with malformed metrics are rejected before any notification is built."""
+        alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
+                      "alarmDescription": "test alarm description",
+                      "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
+                      "timestamp": time.time() * 1000, "actionsEnabled": True, "metrics": ["cpu_util"],
+                      "subAlarms": sub_alarms,
+                      "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
+        alarm = self._create_raw_alarm(0, 6, alarm_dict)
+        notifications, partition, offset = self._run_alarm_processor(alarm, None)
+        self.assertEqual(notifications, [])
+
+        invalid_msg = ('Invalid Alarm format skipping partition 0, offset 6\n'
+                       'ErrorAlarm metric 0 has no dimensions dictionary')
+
+        self.assertIn(invalid_msg, self.trap)
+
+    @mock.patch.object(alarm_processor.AlarmProcessor, '_prefilter', return_value=None)
+    def test_old_timestamp(self, mock_prefilter):
         """Should cause the alarm_ttl to fire log a warning and push to finished queue."""
         timestamp = 1375346830042
         alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
                       "alarmDescription": "test alarm description",
                       "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
-                      "timestamp": timestamp, "actionsEnabled": 1, "metrics": "cpu_util",
+                      "timestamp": timestamp, "actionsEnabled": 1, "metrics": metrics,
+                      "subAlarms": sub_alarms,
                       "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
         alarm = self._create_raw_alarm(0, 2, alarm_dict)
         expected_datetime = time.ctime(timestamp / 1000)
@@ -104,12 +126,35 @@ class TestAlarmProcessor(unittest.TestCase):
 
         self.assertIn(old_msg, self.trap)
 
+    @mock.patch('monasca_notification.processors.alarm_processor.skipped_count')
+    def test_prefilter(self, mock_skipped):
+        """Expired and actions-disabled alarms are skipped before the payload is decoded."""
+        for offset, changes, reason in [(7, {"timestamp": 1375346830042}, 'expired'),
+                                        (8, {"actionsEnabled": False}, 'actions_disabled')]:
+            alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
+                          "alarmDescription": "test alarm description",
+                          "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
+                          "timestamp": time.time() * 1000, "actionsEnabled": True, "metrics": metrics,
+                          "subAlarms": sub_alarms,
+                          "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
+            alarm_dict.update(changes)
+            alarm = self._create_raw_alarm(0, offset, alarm_dict)
+
+            with mock.patch.object(alarm_processor.AlarmProcessor, '_parse_alarm') as mock_parse:
+                notifications, partition, offset = self._run_alarm_processor(alarm, None)
+
+            self.assertEqual(notifications, [])
+            self.assertFalse(mock_parse.called)
+            mock_skipped.increment.assert_called_with(dimensions={'reason': reason, 'stage': 'prefilter'})
+
     def test_no_notifications(self):
         """Test an alarm with no defined notifications
         """
         alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
+                      "alarmDescription": "test alarm description",
                       "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
-                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": "cpu_util",
+                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": metrics,
+                      "subAlarms": sub_alarms,
                       "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
         alarm = self._create_raw_alarm(0, 3, alarm_dict)
 
@@ -125,7 +170,8 @@ class TestAlarmProcessor(unittest.TestCase):
         alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
                       "alarmDescription": "test alarm description",
                       "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
-                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": "cpu_util",
+                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": metrics,
+                      "subAlarms": sub_alarms,
                       "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
         alarm = self._create_raw_alarm(0, 4, alarm_dict)
 
@@ -143,7 +189,8 @@ class TestAlarmProcessor(unittest.TestCase):
         alarm_dict = {"tenantId": "0", "alarmDefinitionId": "0", "alarmId": "1", "alarmName": "test Alarm",
                       "alarmDescription": "test alarm description",
                       "oldState": "OK", "newState": "ALARM", "stateChangeReason": "I am alarming!",
-                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": "cpu_util",
+                      "timestamp": time.time() * 1000, "actionsEnabled": 1, "metrics": metrics,
+                      "subAlarms": sub_alarms,
                       "severity": "LOW", "link": "http://some-place.com", "lifecycleState": "OPEN"}
 
         alarm = self._create_raw_alarm(0, 5, alarm_dict)
@@ -160,3 +207,39 @@ class TestAlarmProcessor(unittest.TestCase):
         self.assertEqual(notifications, [test_notification, test_notification2])
         self.assertEqual(partition, 0)
         self.assertEqual(offset, 5)
+
+    @mock.patch('pymysql.connect')
+    def test_batch_one_query(self, mock_mysql):
+        """A batch of alarms is looked up with one query and returned in order
+        """
+        mock_mysql.return_value = mock_mysql
+        mock_mysql.cursor.return_value = mock_mysql
+        mock_mysql.__iter__.return_value = [['0', 'ALARM', 1, 'EMAIL', 'test notification', 'me@here.com', 0],
+                                            ['1', 'OK', 2, 'WEBHOOK', 'test webhook', 'http://here', 60]]
+        config = {'mysql': {'host': 'mysql_host', 'user': 'mysql_user', 'db': 'dbname', 'passwd': 'mysql_passwd'}}
+        processor = alarm_processor.AlarmProcessor(600, config)
+
+        alarm_dicts = []
+        for definition_id, state in (('0', 'ALARM'), ('1', 'OK'), ('0', 'ALARM'), ('2', 'ALARM')):
+            alarm_dicts.append({"tenantId": "0", "alarmDefinitionId": definition_id, "alarmId": "1",
+                                "alarmName": "test Alarm", "alarmDescription": "test alarm description",
+                                "oldState": "OK", "newState": state, "stateChangeReason": "I am alarming!",
+                                "timestamp": time.time() * 1000, "actionsEnabled": True, "metrics": metrics,
+                                "subAlarms": sub_alarms, "severity": "LOW", "link": "http://some-place.com",
+                                "lifecycleState": "OPEN"})
+        batch = [self._create_raw_alarm(0, offset, alarm_dict) for offset, alarm_dict in enumerate(alarm_dicts)]
+        batch.insert(2, [0, alarm_tuple(9, message_tuple('{'))])
+
+        results = processor.to_notifications(batch)
+
+        self.assertEqual(1, mock_mysql.execute.call_count)
+        sql, params = mock_mysql.execute.call_args[0]
+        self.assertIn('IN ((%s, %s), (%s, %s), (%s, %s))', sql)
+        self.assertEqual(sorted(zip(params[::2], params[1::2])), [('0', 'ALARM'), ('1', 'OK'), ('2', 'ALARM')])
+
+        self.assertEqual([(0, 0), (0, 1), (0, 9), (0, 2), (0, 3)],
+                         [(partition, offset) for _, partition, offset in results])
+        self.assertEqual([[(1, 'email')], [(2, 'webhook')], [], [(1, 'email')], []],
+                         [[(n.id, n.type) for n in notifications] for notifications, _, _ in results])
+        self.assertEqual(60, results[1][0][0].period)
+        self.assertIs(results[0][0][0].raw_alarm, results[0][0][0].context.raw_alarm)
@@ -0,0 +1,70 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the alarm-transitioned schema"""
+
+import copy
+import unittest
+
+from monasca_notification import notification_exceptions
+from monasca_notification.processors import alarm_schema
+
+ALARM = {'tenantId': '0', 'alarmDefinitionId': '0', 'alarmId': '1', 'alarmName': 'test Alarm',
+         'alarmDescription': 'test alarm description', 'oldState': 'OK', 'newState': 'ALARM',
+         'stateChangeReason': 'I am alarming!', 'timestamp': 1429029121239, 'actionsEnabled': 1,
+         'severity': 'LOW', 'link': 'some-link', 'lifecycleState': 'OPEN',
+         'metrics': [{'name': 'cpu_util', 'dimensions': {'hostname': 'foo1'}}],
+         'subAlarms': [{'subAlarmExpression': {'metricDefinition': {'name': 'cpu_util'}},
+                        'currentValues': [95.0]}]}
+
+
+class TestAlarmSchema(unittest.TestCase):
+    def _validate(self, **changes):
+        alarm = copy.deepcopy(ALARM)
+        alarm.update(changes)
+        return alarm_schema.validate({'alarm-transitioned': alarm})
+
+    def _assert_invalid(self, message, **changes):
+        with self.assertRaises(notification_exceptions.AlarmFormatError) as ctx:
+            self._validate(**changes)
+        self.assertEqual(str(ctx.exception), message)
+
+    def test_valid(self):
+        alarm = self._validate()
+        self.assertIs(alarm['actionsEnabled'], True)
+        self.assertEqual(alarm['metrics'], ALARM['metrics'])
+
+    def test_missing_envelope(self):
+        with self.assertRaises(notification_exceptions.AlarmFormatError):
+            alarm_schema.validate({'alarm-created': ALARM})
+
+    def test_missing_field_reported_in_order(self):
+        alarm = copy.deepcopy(ALARM)
+        del alarm['tenantId']
+        del alarm['subAlarms']
+        with self.assertRaises(notification_exceptions.AlarmFormatError) as ctx:
+            alarm_schema.validate({'alarm-transitioned': alarm})
+        self.assertEqual(str(ctx.exception), 'Alarm data missing field tenantId')
+
+    def test_wrong_type(self):
+        self._assert_invalid('Alarm field timestamp must be a number', timestamp='yesterday')
+        self._assert_invalid('Alarm field metrics must be a list', metrics='cpu_util')
+
+    def test_malformed_sub_alarm(self):
+        self._assert_invalid('Alarm sub-alarm 0 is missing subAlarmExpression.metricDefinition.name or currentValues',
+                             subAlarms=[{'currentValues': []}])
+        self._assert_invalid('Alarm sub-alarm 0 has a malformed metric name or currentValues',
+                             subAlarms=[{'subAlarmExpression': {'metricDefinition': {'name': 'cpu'}},
+                                         'currentValues': 95.0}])
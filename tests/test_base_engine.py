@@ -0,0 +1,152 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests stopping and draining of the BaseEngine"""
+
+import time
+import unittest
+
+import mock
+
+from monasca_notification import base_engine
+
+
+class FakeConsumer(object):
+    """Hands out `messages`, then calls the commit callback while waiting like the Kafka consumer
+    """
+
+    def __init__(self, messages, commit_callback):
+        self._messages = messages
+        self._commit_callback = commit_callback
+        self.idle_calls = 0
+
+    def __iter__(self):
+        for message in self._messages:
+            yield message
+        while self.idle_calls < 100:
+            self.idle_calls += 1
+            self._commit_callback()
+
+
+class Engine(base_engine.BaseEngine):
+    def __init__(self, config, messages, stop_at=None):
+        self.handled = []
+        self._stop_at = stop_at
+        with mock.patch.object(base_engine, 'consumer') as mock_consumer, \
+                mock.patch.object(base_engine, 'producer'), \
+                mock.patch.object(base_engine, 'LagMonitor'):
+            mock_consumer.KafkaConsumer.side_effect = \
+                lambda *args, **kwargs: FakeConsumer(messages, kwargs['commit_callback'])
+            super(Engine, self).__init__(config, 'alarms', '/notification')
+
+    def do_message(self, message):
+        self.handled.append(message[1].offset)
+        if message[1].offset == self._stop_at:
+            self.stop()
+
+
+def messages(count):
+    return [(0, mock.Mock(offset=offset, message=mock.Mock(value='{}'))) for offset in range(count)]
+
+
+class TestBaseEngine(unittest.TestCase):
+    def setUp(self):
+        self.config = {'kafka': {'url': 'kafka:9092', 'group': 'notification'},
+                       'zookeeper': {'url': 'zookeeper:2181'},
+                       'shutdown': {'drain_timeout': 5}}
+
+    def test_drain_timeout(self):
+        self.assertEqual(10, base_engine.drain_timeout({}))
+        self.assertEqual(5, base_engine.drain_timeout(self.config))
+
+    def test_stops_after_current_message(self):
+        engine = Engine(self.config, messages(5), stop_at=2)
+        engine._drain_timer = mock.Mock()
+        engine.run()
+
+        self.assertEqual([0, 1, 2], engine.handled)
+        self.assertFalse(engine._consumer.idle_calls)
+        engine._drain_timer.timing.assert_called_once_with(base_engine.DRAIN_TIMER, mock.ANY,
+                                                           dimensions={'topic': 'alarms'})
+
+    def test_stops_while_waiting_for_messages(self):
+        engine = Engine(self.config, messages(1))
+        idle = mock.Mock(side_effect=engine.stop)
+        engine._commit_callback = idle
+        engine.run()
+
+        self.assertEqual([0], engine.handled)
+        self.assertEqual(1, engine._consumer.idle_calls)
+        idle.assert_called_once_with()
+
+    @mock.patch('monasca_notification.base_engine.time')
+    def test_commit_callback_once_a_second(self, mock_time):
+        engine = Engine(self.config, [])
+        engine._commit_callback = mock.Mock()
+        for now in (100, 100.01, 100.5, 101, 101.2, 102.5):
+            mock_time.time.return_value = now
+            engine._between_messages()
+        self.assertEqual(3, engine._commit_callback.call_count)
+
+    @mock.patch('monasca_notification.base_engine.time')
+    def test_kafka_wait_excludes_commit_callback(self, mock_time):
+        clock = [100]
+        mock_time.time.side_effect = lambda: clock[0]
+        engine = Engine(self.config, [])
+        first, second = messages(2)
+
+        def consumer():
+            clock[0] += 1
+            yield first
+            clock[0] += 2
+            engine._between_messages()
+            clock[0] += 1
+            yield second
+        engine._consumer = consumer()
+        engine._commit_callback = lambda: clock.__setitem__(0, clock[0] + 5)
+        engine._stage_timer = mock.Mock()
+        engine._consume()
+
+        self.assertEqual([0, 1], engine.handled)
+        engine._stage_timer.timing.assert_has_calls([
+            mock.call(base_engine.STAGE_TIMER, 1, dimensions={'stage': 'kafka_wait'}),
+            mock.call(base_engine.STAGE_TIMER, 3, dimensions={'stage': 'kafka_wait'})])
+
+    def test_not_stopped_by_end_of_topic(self):
+        engine = Engine(self.config, messages(1))
+        engine._drain_timer = mock.Mock()
+        engine.run()
+
+        self.assertEqual(100, engine._consumer.idle_calls)
+        self.assertFalse(engine._drain_timer.timing.called)
+
+    @mock.patch('monasca_notification.base_engine.time')
+    def test_drain_overdue(self, mock_time):
+        engine = Engine(self.config, [])
+        mock_time.time.return_value = 100
+        self.assertFalse(engine._drain_overdue())
+        engine.stop()
+        mock_time.time.return_value = 105
+        self.assertFalse(engine._drain_overdue())
+        mock_time.time.return_value = 105.1
+        self.assertTrue(engine._drain_overdue())
+
+    def test_sleep_ends_when_stopping(self):
+        engine = Engine(self.config, [])
+        self.assertTrue(engine._sleep(0.01))
+        engine.stop()
+        started = time.time()
+        self.assertFalse(engine._sleep(10))
+        self.assertLess(time.time() - started, 1)
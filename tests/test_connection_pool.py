@@ -0,0 +1,101 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the ConnectionPool"""
+
+import time
+import unittest
+
+import mock
+
+from monasca_notification.common.repositories import exceptions as exc
+from monasca_notification.common.repositories.base import connection_pool
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.connect = mock.Mock(side_effect=lambda: mock.Mock())
+        self.ping = mock.Mock()
+
+    def _pool(self, **config):
+        return connection_pool.ConnectionPool(self.connect, self.ping, config)
+
+    def test_connection_reused(self):
+        pool = self._pool()
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertFalse(self.ping.called)
+
+    def test_connection_discarded_on_error(self):
+        pool = self._pool()
+        try:
+            with pool.connection() as first:
+                raise ValueError()
+        except ValueError:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once_with()
+        self.assertEqual(self.connect.call_count, 2)
+
+    def test_stale_connection_replaced(self):
+        pool = self._pool(health_check_interval=0)
+        self.ping.side_effect = Exception
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.ping.assert_called_once_with(first)
+
+    @mock.patch('monasca_notification.common.repositories.base.connection_pool.time')
+    def test_reconnect_backoff(self, mock_time):
+        pool = self._pool(backoff_initial=1, backoff_max=2)
+        self.connect.side_effect = Exception
+        mock_time.time.return_value = 100
+        # each failed connect doubles the time until the next attempt, up to backoff_max
+        for now, backoff in ((100, 1), (101, 2), (103, 2)):
+            mock_time.time.return_value = now
+            self.assertRaises(Exception, pool.connection().__enter__)
+            mock_time.time.return_value = now + backoff - 0.1
+            self.assertRaises(exc.DatabaseException, pool.connection().__enter__)
+        self.assertEqual(3, self.connect.call_count)
+        self.assertFalse(mock_time.sleep.called)
+
+        self.connect.side_effect = lambda: mock.Mock()
+        mock_time.time.return_value = 105
+        with pool.connection():
+            pass
+        self.assertEqual(0, pool._backoff)
+
+    def test_checkout_during_backoff_does_not_block(self):
+        pool = self._pool(backoff_initial=30)
+        self.connect.side_effect = Exception
+        self.assertRaises(Exception, pool.connection().__enter__)
+
+        started = time.time()
+        self.assertRaises(exc.DatabaseException, pool.connection().__enter__)
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(1, self.connect.call_count)
+        # the failed checkout does not hold a slot of the pool
+        self.assertEqual(0, pool._active)
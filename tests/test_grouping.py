@@ -0,0 +1,141 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the grouping of correlated alarms"""
+
+import unittest
+
+import mock
+
+from monasca_notification import notification
+from monasca_notification.plugins import abstract_notifier
+from monasca_notification.processors import grouping
+
+
+def alarm(hostname, definition='def-1', state='ALARM'):
+    return {'alarmId': 'alarm-' + hostname,
+            'alarmDefinitionId': definition,
+            'alarmName': 'disk full',
+            'alarmDescription': 'description',
+            'timestamp': 1429029121239,
+            'stateChangeReason': 'disk full on ' + hostname,
+            'newState': state,
+            'oldState': 'OK',
+            'severity': 'HIGH',
+            'link': None,
+            'lifecycleState': None,
+            'tenantId': 'tenant',
+            'metrics': [{'dimensions': {'hostname': hostname, 'service': 'compute'}}],
+            'subAlarms': []}
+
+
+def email(alarm_data, method='method-1', period=0):
+    return notification.Notification(method, 'email', 'ops', 'ops@example.com', period, 0, alarm_data)
+
+
+class TemplateNotifier(abstract_notifier.AbstractNotifier):
+    def __init__(self):
+        super(TemplateNotifier, self).__init__('email')
+
+    def send_notification(self, notification):
+        return self._render_notification_text(notification)
+
+
+@mock.patch('monasca_notification.processors.grouping.grouped_count')
+@mock.patch('monasca_notification.processors.grouping.time')
+class TestAlarmGrouping(unittest.TestCase):
+    def test_not_configured(self, mock_time, mock_count):
+        self.assertIsNone(grouping.load(None))
+
+    def test_groups_within_window(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        grouper = grouping.load({'window': 10})
+
+        self.assertEqual([], grouper.add([email(alarm('host-1'))], 'work-1'))
+        mock_time.time.return_value = 1005
+        self.assertEqual([], grouper.add([email(alarm('host-2')), email(alarm('host-3'))], 'work-2'))
+        self.assertEqual([], grouper.due())
+        self.assertEqual(3, grouper.pending())
+
+        mock_time.time.return_value = 1010
+        combined = grouper.due()
+        self.assertEqual(1, len(combined))
+        self.assertEqual(0, grouper.pending())
+        combined, works = combined[0]
+        self.assertEqual(['work-1', 'work-2', 'work-2'], works)
+        self.assertEqual(('method-1', 'email', 'alarm-host-1'), (combined.id, combined.type, combined.alarm_id))
+        self.assertEqual(u'3 alarms changed to ALARM\ndisk full on host-1\ndisk full on host-2\ndisk full on host-3',
+                         combined.message)
+        self.assertEqual({'hostname': ['host-1', 'host-2', 'host-3'], 'service': ['compute']},
+                         combined.raw_alarm['groupedDimensions'])
+        self.assertEqual(['alarm-host-1', 'alarm-host-2', 'alarm-host-3'],
+                         [a['alarmId'] for a in combined.raw_alarm['groupedAlarms']])
+        self.assertEqual('compute', combined.dimensions['service'])
+        mock_count.increment.assert_called_once_with(2, dimensions={'notification_type': 'email'})
+
+    def test_separate_groups(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        grouper = grouping.load({'window': 10})
+        grouper.add([email(alarm('host-1')), email(alarm('host-2'), method='method-2'),
+                     email(alarm('host-3', definition='def-2')), email(alarm('host-4', state='OK'))])
+
+        mock_time.time.return_value = 1010
+        due = [notification for notification, _ in grouper.due()]
+        self.assertEqual(4, len(due))
+        self.assertFalse(any('groupedAlarms' in n.raw_alarm for n in due))
+        self.assertFalse(mock_count.increment.called)
+
+    def test_periodic_not_grouped(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        grouper = grouping.load({'window': 10})
+
+        self.assertEqual([['work']], [works for _, works in grouper.add([email(alarm('host-1'), period=60)],
+                                                                         'work')])
+        self.assertEqual(0, grouper.pending())
+
+    def test_max_alarms(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        grouper = grouping.load({'window': 10, 'max_alarms': 2, 'listed_alarms': 1})
+
+        sent = grouper.add([email(alarm('host-%d' % i)) for i in range(3)])
+        self.assertEqual(1, len(sent))
+        self.assertEqual(u'2 alarms changed to ALARM\ndisk full on host-0\n... and 1 more', sent[0][0].message)
+        self.assertEqual([], sent[0][1])
+        self.assertEqual(1, grouper.pending())
+        self.assertEqual(1, len(grouper.flush()))
+        self.assertEqual(0, grouper.pending())
+
+    def test_template_variables(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        grouper = grouping.load({'window': 0})
+        grouper.add([email(alarm('host-1')), email(alarm('host-2'))])
+        notifier = TemplateNotifier()
+        notifier.config({'template': {'text': "{{ grouped_dimensions.hostname|join(' ') }} "
+                                              "{{ grouped_alarms|length }}"}})
+
+        self.assertEqual('host-1 host-2 2', notifier.send_notification(grouper.due()[0][0]))
+
+    def test_truncated_alarms(self, mock_time, mock_count):
+        truncated = alarm('host-1')
+        truncated.update({'truncated': {'metrics': 500, 'subAlarms': 0},
+                          'dimensionSummary': {'hostname': {'values': ['host-1'], 'count': 400}}})
+
+        combined = grouping.grouped_notification([email(truncated), email(alarm('host-2'))], 20)
+
+        self.assertTrue(combined.truncated)
+        self.assertEqual({'metrics': 501, 'subAlarms': 0}, combined.raw_alarm['truncated'])
+        self.assertNotIn('dimensionSummary', combined.raw_alarm)
+        self.assertEqual({'hostname', 'service'}, set(combined.dimensions))
+        self.assertEqual({'host-1', 'host-2'}, set(combined.dimensions['hostname'].split(', ')))
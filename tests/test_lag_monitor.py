@@ -0,0 +1,100 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the LagMonitor"""
+
+import unittest
+
+import mock
+
+from monasca_common.kafka_lib import common as kafka_common
+
+from monasca_notification.monitoring import lag_monitor
+from monasca_notification.processors import alarm_processor
+
+
+class TestLagMonitor(unittest.TestCase):
+    def setUp(self):
+        self.monitor = lag_monitor.LagMonitor('kafka:9092', 'retry-notifications', 30)
+        self.monitor._gauge = mock.Mock()
+        self.monitor._kafka = mock.Mock()
+        self.monitor._kafka.send_offset_request.side_effect = lambda requests: [
+            kafka_common.OffsetResponse(r.topic, r.partition, 0, (100 + r.partition,)) for r in requests]
+
+    def _sent(self):
+        return {(c[0][0], tuple(sorted((c[1].get('dimensions') or {}).items()))): c[0][1]
+                for c in self.monitor._gauge.send.call_args_list}
+
+    def test_nothing_received(self):
+        self.monitor.report()
+
+        self.assertFalse(self.monitor._kafka.send_offset_request.called)
+        self.assertFalse(self.monitor._gauge.send.called)
+
+    def test_lag_per_partition(self):
+        self.monitor.received(0, 89)
+        self.monitor.received(1, 100)
+
+        self.monitor.report()
+
+        sent = self._sent()
+        self.assertEqual(10, sent[('kafka.consumer_lag', (('partition', '0'),))])
+        self.assertEqual(0, sent[('kafka.consumer_lag', (('partition', '1'),))])
+
+    @mock.patch('monasca_notification.monitoring.lag_monitor.time')
+    def test_message_age(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.monitor.processing(940)
+        self.monitor.report()
+        self.assertEqual(60, self._sent()[('notification.message_age', ())])
+
+        # once processed the age no longer grows
+        self.monitor.processed()
+        mock_time.time.return_value = 2000
+        self.monitor._gauge.reset_mock()
+        self.monitor.report()
+        self.assertEqual(60, self._sent()[('notification.message_age', ())])
+
+    def test_periodic_drift_worst_since_last_report(self):
+        self.monitor.fired(60, 2)
+        self.monitor.fired(60, 7)
+        self.monitor.fired(60, 1)
+
+        self.monitor.report()
+        self.assertEqual(7, self._sent()[('notification.periodic_drift', (('period', '60'),))])
+
+        self.monitor._gauge.reset_mock()
+        self.monitor.report()
+        self.assertNotIn(('notification.periodic_drift', (('period', '60'),)), self._sent())
+
+    def test_kafka_error_resets_client(self):
+        kafka = self.monitor._kafka
+        kafka.send_offset_request.side_effect = kafka_common.KafkaError()
+        self.monitor.received(0, 1)
+
+        self.assertRaises(kafka_common.KafkaError, self.monitor.report)
+        self.assertTrue(kafka.close.called)
+        self.assertIsNone(self.monitor._kafka)
+
+    def test_disabled(self):
+        monitor = lag_monitor.LagMonitor('kafka:9092', 'retry-notifications', 0)
+        monitor.start()
+        self.assertIsNone(monitor._thread)
+
+    def test_alarm_timestamp(self):
+        self.assertEqual(1375346830.042, alarm_processor.alarm_timestamp(
+            '{"alarm-transitioned": {"alarmId": "a", "timestamp": 1375346830042}}'))
+        self.assertIsNone(alarm_processor.alarm_timestamp(
+            '{"alarm-transitioned": {"timestamp": 1, "metrics": [{"dimensions": {"timestamp": 2}}]}}'))
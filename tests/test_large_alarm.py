@@ -0,0 +1,83 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the LargeAlarmParser"""
+
+import json
+import unittest
+
+import mock
+
+from monasca_notification import notification
+from monasca_notification import notification_exceptions
+from monasca_notification.processors import alarm_schema
+from monasca_notification.processors import large_alarm
+
+
+def alarm_data(metrics, sub_alarms=1, **fields):
+    alarm = {'tenantId': '0', 'alarmDefinitionId': '0', 'alarmId': '1', 'alarmName': 'test Alarm',
+             'alarmDescription': 'test alarm description', 'oldState': 'OK', 'newState': 'ALARM',
+             'stateChangeReason': 'I am alarming!', 'timestamp': 1429029121239, 'actionsEnabled': True,
+             'severity': 'LOW', 'link': 'http://some-place.com', 'lifecycleState': 'OPEN',
+             'metrics': [{'name': 'cpu_util', 'dimensions': {'hostname': 'host%d' % (i % 30), 'service': 'compute'}}
+                         for i in range(metrics)],
+             'subAlarms': [{'subAlarmExpression': {'metricDefinition': {'name': 'cpu_util'}},
+                            'currentValues': [95.0 + i]} for i in range(sub_alarms)]}
+    alarm.update(fields)
+    return json.dumps({alarm_schema.ENVELOPE: alarm}, indent=1)
+
+
+@mock.patch('monasca_notification.processors.large_alarm.truncated_count')
+class TestLargeAlarmParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = large_alarm.LargeAlarmParser({'threshold': 1000, 'max_metrics': 10, 'max_sub_alarms': 2,
+                                                    'dimension_values': 5})
+
+    def test_applies(self, mock_count):
+        self.assertFalse(self.parser.applies('x' * 1000))
+        self.assertTrue(self.parser.applies('x' * 1001))
+
+    def test_same_as_full_decode_when_within_limits(self, mock_count):
+        data = alarm_data(metrics=10, sub_alarms=2, alarmDescription=u'caf\xe9 {"a": [1]}')
+
+        self.assertEqual(alarm_schema.validate(json.loads(data)), self.parser.parse(data))
+        self.assertFalse(mock_count.increment.called)
+
+    def test_truncated(self, mock_count):
+        alarm = self.parser.parse(alarm_data(metrics=500, sub_alarms=3))
+
+        self.assertEqual(json.loads(alarm_data(metrics=10))[alarm_schema.ENVELOPE]['metrics'], alarm['metrics'])
+        self.assertEqual(2, len(alarm['subAlarms']))
+        self.assertEqual({'metrics': 500, 'subAlarms': 3}, alarm['truncated'])
+        self.assertEqual({'hostname': {'values': ['host0', 'host1', 'host2', 'host3', 'host4'], 'count': 30},
+                          'service': {'values': ['compute'], 'count': 1}}, alarm['dimensionSummary'])
+        mock_count.increment.assert_called_once_with()
+
+        context = notification.AlarmContext(alarm)
+        self.assertEqual({'hostname': 'host0, host1, host2, host3, host4, ... (25 more)', 'service': 'compute'},
+                         context.dimensions)
+        self.assertTrue(notification.Notification(1, 'email', 'name', 'address', 0, 0, alarm, context).truncated)
+
+    def test_invalid(self, mock_count):
+        for data, message in (
+                (alarm_data(metrics=20)[:-2], 'Alarm data is not valid JSON'),
+                (alarm_data(metrics=20) + ' {}', 'Alarm data is not valid JSON: Extra data'),
+                (alarm_data(metrics=20).replace('"dimensions"', '"dims"', 1),
+                 'Alarm metric 0 has no dimensions dictionary'),
+                (alarm_data(metrics=0, subAlarms=None), 'Alarm field subAlarms must be a list'),
+                (alarm_data(metrics=20, newState=None), 'Alarm field newState must be a string')):
+            with self.assertRaises(notification_exceptions.AlarmFormatError) as ctx:
+                self.parser.parse(data)
+            self.assertTrue(str(ctx.exception).startswith(message), str(ctx.exception))
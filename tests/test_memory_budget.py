@@ -0,0 +1,86 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the MemoryBudget"""
+
+import collections
+import threading
+import unittest
+
+import mock
+
+from monasca_notification.common import memory_budget
+
+alarm_tuple = collections.namedtuple('alarm_tuple', ['offset', 'message'])
+message_tuple = collections.namedtuple('message_tuple', ['value'])
+
+
+@mock.patch('monasca_notification.common.memory_budget.STATSD_CLIENT')
+class TestMemoryBudget(unittest.TestCase):
+    def test_message_size(self, mock_statsd):
+        message = [0, alarm_tuple(1, message_tuple('x' * 100))]
+        self.assertEqual(100 * memory_budget.PAYLOAD_FACTOR, memory_budget.message_size(message))
+
+    def test_accounting(self, mock_statsd):
+        budget = memory_budget.MemoryBudget(1000, 'alarms')
+        budget.add(0, 1, 600)
+        self.assertFalse(budget.exceeded())
+
+        budget.add(0, 1, 600)
+        self.assertFalse(budget.exceeded(), 'a single message is always let through')
+
+        budget.add(1, 1, 100)
+        self.assertEqual(1300, budget.total())
+        self.assertTrue(budget.exceeded())
+
+        budget.done(0, 1)
+        budget.done(0, 1)
+        self.assertEqual(100, budget.total())
+        self.assertFalse(budget.exceeded())
+
+    def test_unlimited(self, mock_statsd):
+        budget = memory_budget.MemoryBudget(None, 'alarms')
+        for offset in range(10):
+            budget.add(0, offset, 10 ** 9)
+
+        self.assertFalse(budget.exceeded())
+
+    def test_reports_high_water(self, mock_statsd):
+        budget = memory_budget.MemoryBudget(None, 'alarms', interval=0)
+        budget.add(0, 1, 500)
+        budget.add(0, 2, 500)
+        budget._high_water = 1500
+        budget.done(0, 1)
+
+        gauge = mock_statsd.get_gauge.return_value
+        mock_statsd.get_gauge.assert_called_with(dimensions={'topic': 'alarms'})
+        self.assertEqual([mock.call('notification.in_flight_bytes', 500),
+                          mock.call('notification.in_flight_bytes_high_water', 1500)],
+                         gauge.send.call_args_list[-2:])
+
+        budget.done(0, 2)
+        gauge.send.assert_called_with('notification.in_flight_bytes_high_water', 500)
+
+    def test_wait_until_done(self, mock_statsd):
+        budget = memory_budget.MemoryBudget(100, 'alarms')
+        budget.add(0, 1, 100)
+        budget.add(0, 2, 100)
+        self.assertTrue(budget.exceeded())
+
+        timer = threading.Timer(0.05, budget.done, (0, 1))
+        timer.start()
+        budget.wait(5)
+        timer.join()
+        self.assertFalse(budget.exceeded())
@@ -57,3 +57,27 @@ class TestMySqlRepo(unittest.TestCase):
                 pass
 
         self.assertEqual(mock_mysql.connect.call_count, 2)
+
+    @mock.patch('monasca_notification.common.repositories.mysql.mysql_repo.pymysql')
+    def testDuplicateNotificationTypesKeepConnection(self, mock_mysql):
+        m = mock.MagicMock()
+        m.cursor.return_value.executemany.side_effect = pymysql.IntegrityError(
+            pymysql.constants.ER.DUP_ENTRY, "Duplicate entry 'EMAIL' for key 'PRIMARY'")
+
+        mock_mysql.connect.return_value = m
+        mock_mysql.Error = pymysql.Error
+        mock_mysql.IntegrityError = pymysql.IntegrityError
+        mock_mysql.constants = pymysql.constants
+
+        config = {'mysql': {'host': 'foo',
+                            'port': '3306',
+                            'user': 'bar',
+                            'passwd': '1',
+                            'db': '2'}}
+
+        repo = mysql_repo.MysqlRepo(config)
+        repo.insert_notification_method_types([('EMAIL',)])
+        repo.insert_notification_method_types([('EMAIL',)])
+
+        self.assertEqual(mock_mysql.connect.call_count, 1)
+        self.assertFalse(m.close.called)
@@ -158,3 +158,31 @@ def test_unequal():
     test_notification2.alarm_id = None
 
     assert(test_notification != test_notification2)
+
+
+def test_shared_context():
+    alarm = {'alarmId': 'alarmId',
+             'alarmName': 'alarmName',
+             'alarmDescription': 'Disk of {{ hostname }} is {{ _state }}',
+             'timestamp': 1429029121239,
+             'stateChangeReason': 'stateChangeReason',
+             'newState': 'ALARM',
+             'oldState': 'OK',
+             'severity': 'LOW',
+             "link": "some-link",
+             "lifecycleState": "OPEN",
+             'tenantId': 'tenantId',
+             'metrics': [{'dimensions': {'hostname': 'foo'}}],
+             'subAlarms': []}
+    context = notification.AlarmContext(alarm)
+    email = notification.Notification(0, 'email', 'name', 'address', 0, 0, alarm, context)
+    webhook = notification.Notification(1, 'webhook', 'name', 'http://address', 0, 0, alarm, context)
+
+    assert email.alarm_description == 'Disk of foo is ALARM'
+    assert email.dimensions is webhook.dimensions
+    assert email.alarm_age == webhook.alarm_age
+
+    assert json.loads(email.to_json())['raw_alarm'] == alarm
+    assert json.loads(webhook.to_json())['id'] == 1
+    assert json.loads(context.dumps_with({'id': 1}, 'metrics')) == {'id': 1, 'metrics': alarm['metrics']}
+    assert json.loads(context.dumps_with({}, 'metrics')) == {'metrics': alarm['metrics']}
@@ -0,0 +1,299 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the NotificationEngine with a fake consumer, producer, alarm processor and notifier"""
+
+import json
+import time
+import unittest
+
+import mock
+
+from monasca_notification import base_engine
+from monasca_notification import notification
+from monasca_notification import notification_engine
+from monasca_notification.monitoring.metrics import ALARM_LATENCY_TIMER, STAGE_TIMER
+from monasca_notification.processors import alarm_processor
+
+
+def alarm(alarm_id, severity='HIGH', definition='def-1'):
+    return {'alarmId': alarm_id, 'alarmDefinitionId': definition, 'alarmName': 'name of ' + alarm_id,
+            'alarmDescription': 'description', 'timestamp': 1429029121239, 'stateChangeReason': 'reason',
+            'newState': 'ALARM', 'oldState': 'OK', 'severity': severity, 'link': None, 'lifecycleState': None,
+            'tenantId': 'tenant', 'metrics': [{'dimensions': {'hostname': alarm_id}}], 'subAlarms': []}
+
+
+def email(alarm_id, **fields):
+    return notification.Notification('method-1', 'email', 'ops', 'ops@example.com', 0, 0, alarm(alarm_id, **fields))
+
+
+class FakeConsumer(object):
+    """Hands out `messages`, then calls the commit callback until the engine stops
+    """
+
+    def __init__(self, messages, commit_callback, events):
+        self._messages = messages
+        self._commit_callback = commit_callback
+        self._events = events
+
+    def __iter__(self):
+        for message in self._messages:
+            yield message
+        for _ in range(1000):
+            self._commit_callback()
+            time.sleep(0.002)
+        raise AssertionError('the engine did not stop')
+
+    def send_offset_commit_request(self, group, payloads):
+        self._events.extend(('commit', payload.offset) for payload in payloads)
+
+    @property
+    def _kafka(self):
+        return self
+
+    _kafka_group = 'notification'
+
+
+class EngineTestCase(unittest.TestCase):
+    """Runs a NotificationEngine over messages whose notifications are given per offset
+    """
+
+    def setUp(self):
+        self.config = {'kafka': {'url': 'kafka:9092', 'group': 'notification', 'alarm_topic': 'alarms',
+                                 'notification_topic': 'notifications', 'notification_retry_topic': 'retry',
+                                 'periodic': {60: 'periodic-60'}},
+                       'zookeeper': {'url': 'zookeeper:2181', 'notification_path': '/notification'},
+                       'processors': {'alarm': {'ttl': None}}}
+        self.notifications = {}  # offset -> notifications of the alarm
+        self.sent = []
+        self.published = []
+        self.events = []  # ('commit', offset) and ('publish', alarm id) in order
+
+    def _to_notification(self, message):
+        partition, offset = message[0], message[1].offset
+        return self.notifications.get(offset, []), partition, offset
+
+    def _send(self, notifications):
+        for n in notifications:
+            n.notification_timestamp = time.time()
+        self.sent.extend(notifications)
+        return notifications, []
+
+    def _publish(self, topic, values):
+        for value in values:
+            self.published.append((topic, json.loads(value)['alarm_id']))
+            self.events.append(('publish', json.loads(value)['alarm_id']))
+
+    def commits(self):
+        return [offset for event, offset in self.events if event == 'commit']
+
+    def engine(self, offsets, stop=True):
+        patches = [mock.patch.object(base_engine, 'consumer'), mock.patch.object(base_engine, 'producer'),
+                   mock.patch.object(base_engine, 'LagMonitor'),
+                   mock.patch.object(notification_engine, 'AlarmProcessor'),
+                   mock.patch.object(notification_engine, 'NotificationProcessor')]
+        mock_consumer, mock_producer, _, mock_alarms, mock_notifier = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+        messages = [(0, mock.Mock(offset=offset, message=mock.Mock(value='{}'))) for offset in offsets]
+        mock_consumer.KafkaConsumer.side_effect = \
+            lambda *args, **kwargs: FakeConsumer(messages, kwargs['commit_callback'], self.events)
+        mock_producer.KafkaProducer.return_value.publish.side_effect = self._publish
+        mock_alarms.return_value.to_notification.side_effect = self._to_notification
+        mock_alarms.return_value.to_notifications.side_effect = \
+            lambda batch: [self._to_notification(message) for message in batch]
+        mock_notifier.return_value.send.side_effect = self._send
+
+        engine = notification_engine.NotificationEngine(self.config)
+        if stop:
+            # stop once everything was handed out, the fake consumer calls the commit callback
+            engine._commit_callback = engine.stop
+        return engine
+
+
+class TestStageTimers(EngineTestCase):
+    @mock.patch('pymysql.connect')
+    def test_stages_and_latency(self, mock_mysql):
+        mock_mysql.return_value = mock_mysql
+        mock_mysql.cursor.return_value = mock_mysql
+        mock_mysql.__iter__.return_value = [[1, 'EMAIL', 'ops', 'ops@example.com', 0]]
+        engine = self.engine([], stop=False)
+        timer = mock.MagicMock()
+        engine._stage_timer = timer
+        engine._latency_timer = mock.Mock()
+        engine._alarms = alarm_processor.AlarmProcessor(None, {'mysql': {'host': 'mysql_host', 'user': 'mysql_user',
+                                                                         'db': 'dbname', 'passwd': 'mysql_passwd'}})
+
+        raw_alarm = dict(alarm('alarm-0'), actionsEnabled=True, timestamp=(time.time() - 2) * 1000,
+                         subAlarms=[{'subAlarmExpression': {'metricDefinition': {'name': 'cpu'}},
+                                     'currentValues': [95.0]}])
+        message = mock.Mock(offset=0, message=mock.Mock(value=json.dumps({'alarm-transitioned': raw_alarm})))
+        with mock.patch.object(alarm_processor, 'STATSD_TIMER', timer):
+            engine.do_message((0, message))
+
+        self.assertEqual(['alarm-0'], [n.alarm_id for n in self.sent])
+        stages = set(c[1]['dimensions']['stage'] for c in timer.time.call_args_list if c[0] == (STAGE_TIMER,))
+        self.assertEqual(set(['parse', 'validate', 'db_lookup', 'notification_build', 'kafka_publish',
+                              'kafka_commit']), stages)
+        (name, latency), dimensions = engine._latency_timer.timing.call_args
+        self.assertEqual(ALARM_LATENCY_TIMER, name)
+        self.assertAlmostEqual(2, latency, delta=1)
+        self.assertEqual({'dimensions': {'notification_type': 'email'}}, dimensions)
+
+
+@mock.patch('monasca_notification.processors.admission.shed_count')
+class TestDrain(EngineTestCase):
+    def test_pending_summary_sent(self, mock_shed):
+        self.config['admission'] = {'tenant': {'rate': 1, 'burst': 1}, 'summary_interval': 60}
+        self.notifications = {0: [email('alarm-0')], 1: [email('alarm-1')], 2: [email('alarm-2')]}
+        engine = self.engine([0, 1, 2])
+        engine.run()
+
+        self.assertEqual(['alarm-0', '2 alarm notifications suppressed'], [n.alarm_name.replace('name of ', '')
+                                                                          for n in self.sent])
+        self.assertEqual(2, len([topic for topic, _ in self.published if topic == 'notifications']))
+
+
+class TestStaged(EngineTestCase):
+    def setUp(self):
+        super(TestStaged, self).setUp()
+        self.config['queues'] = {'staged': True}
+        self.config['processors']['send'] = {'number': 2}
+        self.notifications = dict((offset, [email('alarm-%d' % offset)]) for offset in range(5))
+
+    def assert_committed_after_publishing(self):
+        commits = self.commits()
+        self.assertEqual(sorted(commits), commits)
+        self.assertEqual(5, commits[-1])
+        published = set()
+        for event, value in self.events:
+            if event == 'publish':
+                published.add(value)
+            else:
+                # committing offset n finishes the alarms before it
+                self.assertTrue(set('alarm-%d' % offset for offset in range(value)) <= published,
+                                'committed %d before publishing: %s' % (value, self.events))
+
+    def test_commits_after_publishing(self):
+        engine = self.engine([0, 1, 2, 3, 4], stop=False)
+        between_messages = engine._commit_callback
+
+        def idle():
+            between_messages()
+            if self.commits() and self.commits()[-1] == 5:
+                engine.stop()
+        engine._commit_callback = idle
+        engine.run()
+
+        self.assertEqual(['alarm-%d' % offset for offset in range(5)],
+                         sorted(alarm_id for _, alarm_id in self.published))
+        self.assert_committed_after_publishing()
+
+    def test_drain_sends_and_commits_in_flight(self):
+        send = self._send
+
+        def slow_send(notifications):
+            time.sleep(0.05)
+            return send(notifications)
+        self._send = slow_send
+        engine = self.engine([0, 1, 2, 3, 4], stop=False)
+        in_flight = []
+
+        def stop():
+            # once the last message was handed to the alarm stage
+            in_flight.append(engine._offsets.pending())
+            engine.stop()
+        engine._commit_callback = stop
+        engine.run()
+
+        self.assertTrue(in_flight[0])
+        self.assertEqual(5, len(self.sent))
+        self.assert_committed_after_publishing()
+        self.assertEqual(0, engine._offsets.pending())
+
+
+class TestRepartition(EngineTestCase):
+    def test_forgets_offsets_of_lost_partitions(self):
+        self.notifications = {0: [email('alarm-0')], 1: [email('alarm-1')]}
+        engine = self.engine([], stop=False)
+        engine._send = mock.Mock()  # alarm-1 stays in flight
+        engine.do_message((3, mock.Mock(offset=0, message=mock.Mock(value='{}'))))
+        engine.do_message((3, mock.Mock(offset=1, message=mock.Mock(value='{}'))))
+        engine._finish(3, 0)
+        engine._repartitioned()
+        self.assertEqual([1], self.commits()[-1:])
+
+        # the partition went elsewhere, its alarm finishing later is not committed anymore
+        engine._finish(3, 1)
+        engine._commit_finished()
+        self.assertEqual([1], self.commits()[-1:])
+        self.assertEqual(0, engine._offsets.pending())
+
+
+@mock.patch('monasca_notification.processors.grouping.grouped_count')
+@mock.patch('monasca_notification.processors.grouping.time')
+class TestGrouping(EngineTestCase):
+    def setUp(self):
+        super(TestGrouping, self).setUp()
+        self.config['grouping'] = {'window': 10}
+        # alarms 0 and 2 are grouped, alarm 1 has no notifications
+        self.notifications = {0: [email('alarm-0')], 2: [email('alarm-2')]}
+
+    def test_sequential_commits_held_alarms_once_sent(self, mock_time, mock_count):
+        mock_time.time.return_value = 1000
+        engine = self.engine([], stop=False)
+        for offset in range(3):
+            engine.do_message((0, mock.Mock(offset=offset, message=mock.Mock(value='{}'))))
+
+        self.assertEqual([], self.sent)
+        self.assertEqual([0], sorted(set(self.commits())))
+        self.assertEqual(2, engine._offsets.pending())
+
+        mock_time.time.return_value = 1010
+        engine._idle()
+        self.assertEqual(['alarm-0'], [notification.alarm_id for notification in self.sent])
+        self.assertEqual(['alarm-0', 'alarm-2'], [a['alarmId'] for a in self.sent[0].raw_alarm['groupedAlarms']])
+        self.assertEqual([('publish', 'alarm-0'), ('commit', 3)], self.events[-2:])
+        self.assertEqual(0, engine._offsets.pending())
+
+    def run_until_sent(self, engine, mock_time):
+        """Run the engine, pass the window once both alarms are held and stop once they were sent
+        """
+        mock_time.time.return_value = 1000
+        between_messages = engine._commit_callback
+
+        def idle():
+            if engine._grouping.pending() == 2:
+                mock_time.time.return_value = 1010
+            between_messages()
+            if self.sent:
+                engine.stop()
+        engine._commit_callback = idle
+        engine.run()
+
+        self.assertEqual(['alarm-0'], [notification.alarm_id for notification in self.sent])
+        published = self.events.index(('publish', 'alarm-0'))
+        self.assertFalse([offset for offset in self.commits()[:published] if offset > 0],
+                         'committed past a held alarm: %s' % self.events)
+        self.assertEqual(3, self.commits()[-1])
+
+    def test_lanes_commit_held_alarms_once_sent(self, mock_time, mock_count):
+        self.config['priority'] = {'lanes': {'all': {'weight': 1}}}
+        self.run_until_sent(self.engine([0, 1, 2], stop=False), mock_time)
+
+    def test_staged_commits_held_alarms_once_sent(self, mock_time, mock_count):
+        self.config['queues'] = {'staged': True}
+        self.run_until_sent(self.engine([0, 1, 2], stop=False), mock_time)
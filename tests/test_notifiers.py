@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import contextlib
+import tempfile
 import time
 import unittest
 
@@ -69,6 +70,27 @@ class NotifyStub(object):
                 return True
 
 
+class ConfigStub(object):
+    """Notifier recording its configuration, failing to configure with fail: True
+    """
+
+    def __init__(self, log):
+        self.config_dict = None
+
+    def config(self, config_dict):
+        if config_dict.get('fail'):
+            raise Exception
+        self.config_dict = config_dict
+
+
+class EmailConfigStub(ConfigStub):
+    type = 'email'
+
+
+class WebhookConfigStub(ConfigStub):
+    type = 'webhook'
+
+
 class Statsd(object):
     def __init__(self):
         self.timer = StatsdTimer()
@@ -397,3 +419,48 @@ class TestInterface(unittest.TestCase):
         notifiers.load_plugins(config_dict)
         notifiers.config(config_dict)
         self.assertEqual('No notifiers found for fake_notifier', mock_log.warn.call_args[0][0])
+
+
+@mock.patch('monasca_notification.types.notifiers.log')
+class TestReconfigure(unittest.TestCase):
+    def setUp(self):
+        notifiers.init()
+        notifiers.possible_notifiers = [EmailConfigStub(None), WebhookConfigStub(None)]
+
+    def tearDown(self):
+        notifiers.init()
+
+    def test_only_changed_notifiers_replaced(self, mock_log):
+        notifiers.config({'email': {'server': 'smtp1'}, 'webhook': {'timeout': 5}})
+        webhook = notifiers.configured_notifiers['webhook']
+
+        self.assertEqual(['email'], notifiers.reconfigure({'email': {'server': 'smtp2'}, 'webhook': {'timeout': 5}}))
+        self.assertEqual({'server': 'smtp2'}, notifiers.configured_notifiers['email'].config_dict)
+        self.assertIs(webhook, notifiers.configured_notifiers['webhook'])
+        self.assertIs(notifiers.configured_notifiers['email'], notifiers.possible_notifiers[0])
+
+        self.assertEqual([], notifiers.reconfigure({'email': {'server': 'smtp2'}, 'webhook': {'timeout': 5}}))
+
+    def test_added_removed_and_failing(self, mock_log):
+        notifiers.config({'email': {'server': 'smtp1'}})
+        email = notifiers.configured_notifiers['email']
+
+        self.assertEqual(['webhook'], notifiers.reconfigure({'email': {'server': 'smtp1', 'fail': True},
+                                                             'webhook': {'timeout': 5}}))
+        self.assertIs(email, notifiers.configured_notifiers['email'])
+        self.assertTrue(mock_log.exception.called)
+
+        self.assertEqual(['email'], notifiers.reconfigure({'webhook': {'timeout': 5}}))
+        self.assertEqual(['WEBHOOK'], notifiers.enabled_notifications())
+
+    def test_template_file_changed(self, mock_log):
+        with tempfile.NamedTemporaryFile() as template:
+            template.write('{{ alarm_name }}')
+            template.flush()
+            cfg = {'email': {'server': 'smtp1', 'template': {'template_file': template.name}}}
+            notifiers.config(cfg)
+            self.assertEqual([], notifiers.reconfigure(cfg))
+
+            template.write(' changed')
+            template.flush()
+            self.assertEqual(['email'], notifiers.reconfigure(cfg))
@@ -0,0 +1,171 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the PriorityLanes, incl. tenant fairness, and the OffsetTracker"""
+
+import collections
+import unittest
+
+import mock
+
+from monasca_notification.common.offset_tracker import OffsetTracker
+from monasca_notification.processors.priority_lanes import PriorityLanes
+
+_Notification = collections.namedtuple('Notification', ['severity', 'type', 'tenant_id'])
+
+
+def Notification(severity, type, tenant_id='tenant'):
+    return _Notification(severity, type, tenant_id)
+
+LANES = {'critical': {'weight': 8, 'severities': ['CRITICAL']},
+         'pagerduty': {'weight': 4, 'notification_types': ['pagerduty']},
+         'default': {'weight': 1}}
+
+
+class TestPriorityLanes(unittest.TestCase):
+    def setUp(self):
+        self.lanes = PriorityLanes(LANES)
+
+    def test_lane_for(self):
+        self.assertEqual('critical', self.lanes.lane_for(Notification('CRITICAL', 'email')).name)
+        self.assertEqual('critical', self.lanes.lane_for(Notification('critical', 'pagerduty')).name)
+        self.assertEqual('pagerduty', self.lanes.lane_for(Notification('LOW', 'PAGERDUTY')).name)
+        self.assertEqual('default', self.lanes.lane_for(Notification('LOW', 'email')).name)
+
+    def test_unmatched_goes_to_lowest_weight(self):
+        lanes = PriorityLanes({'critical': {'weight': 2, 'severities': ['CRITICAL']},
+                               'high': {'weight': 1, 'severities': ['HIGH']}})
+        self.assertEqual('high', lanes.lane_for(Notification('LOW', 'email')).name)
+
+    def test_weighted_dispatch(self):
+        for i in range(90):
+            self.lanes.put(Notification('LOW', 'email'), 'low')
+        for i in range(10):
+            self.lanes.put(Notification('CRITICAL', 'email'), 'critical')
+
+        first = [self.lanes.get() for _ in range(18)]
+        self.assertEqual(10, first.count('critical'))
+        self.assertEqual(8, first.count('low'))
+        self.assertEqual({'critical': 0, 'pagerduty': 0, 'default': 82}, self.lanes.depths())
+
+    def test_no_starvation(self):
+        for i in range(100):
+            self.lanes.put(Notification('CRITICAL', 'email'), 'critical')
+        self.lanes.put(Notification('LOW', 'email'), 'low')
+
+        self.assertIn('low', [self.lanes.get() for _ in range(9)])
+
+    def test_fifo_within_lane(self):
+        for i in range(5):
+            self.lanes.put(Notification('LOW', 'email'), i)
+        self.assertEqual(range(5), [self.lanes.get() for _ in range(5)])
+
+    def test_get_timeout_and_close(self):
+        self.assertIsNone(self.lanes.get(timeout=0.01))
+        self.lanes.put(Notification('LOW', 'email'), 'last')
+        self.lanes.close()
+        self.assertEqual('last', self.lanes.get())
+        self.assertIsNone(self.lanes.get())
+
+    def test_invalid_config(self):
+        self.assertRaises(ValueError, PriorityLanes, {})
+        self.assertRaises(ValueError, PriorityLanes, {'default': {'weight': 0}})
+        self.assertRaises(ValueError, PriorityLanes, LANES, {'weights': {'a': 0}})
+
+    def test_tenants_take_turns(self):
+        for i in range(50):
+            self.lanes.put(Notification('LOW', 'email', 'noisy'), 'noisy')
+        self.lanes.put(Notification('LOW', 'email', 'quiet'), 'quiet')
+
+        self.assertEqual(['noisy', 'quiet', 'noisy'], [self.lanes.get() for _ in range(3)])
+
+    def test_tenant_weights(self):
+        lanes = PriorityLanes(LANES, {'weights': {'a': 3}})
+        for i in range(20):
+            lanes.put(Notification('LOW', 'email', 'a'), 'a')
+            lanes.put(Notification('LOW', 'email', 'b'), 'b')
+
+        first = [lanes.get() for _ in range(8)]
+        self.assertEqual(6, first.count('a'))
+        self.assertEqual(2, first.count('b'))
+
+    def test_tenant_in_flight_cap(self):
+        lanes = PriorityLanes(LANES, {'max_in_flight': 1, 'in_flight': {'b': 2}})
+        for tenant in ('a', 'a', 'b', 'b', 'b'):
+            lanes.put(Notification('LOW', 'email', tenant), tenant)
+
+        self.assertEqual(['a', 'b', 'b'], [lanes.get() for _ in range(3)])
+        self.assertIsNone(lanes.get(timeout=0.01))
+        self.assertEqual({'a': 1, 'b': 2}, lanes.in_flight())
+
+        lanes.done(Notification('LOW', 'email', 'b'))
+        self.assertEqual('b', lanes.get(timeout=0.01))
+        lanes.done(Notification('LOW', 'email', 'a'))
+        self.assertEqual('a', lanes.get(timeout=0.01))
+
+    def test_capped_tenant_does_not_block_lane(self):
+        lanes = PriorityLanes(LANES, {'max_in_flight': 1})
+        lanes.put(Notification('CRITICAL', 'email', 'a'), 'a1')
+        lanes.put(Notification('CRITICAL', 'email', 'a'), 'a2')
+        lanes.put(Notification('LOW', 'email', 'b'), 'b')
+
+        self.assertEqual(['a1', 'b'], [lanes.get(timeout=0.01) for _ in range(2)])
+        self.assertEqual({'critical': 1, 'pagerduty': 0, 'default': 0}, lanes.depths())
+
+    @mock.patch('monasca_notification.processors.priority_lanes.STATSD_CLIENT')
+    def test_tenant_metrics(self, mock_statsd):
+        lanes = PriorityLanes(LANES)
+        lanes.put(Notification('LOW', 'email', 'a'), 'a')
+        lanes.get()
+        lanes.done(Notification('LOW', 'email', 'a'))
+
+        mock_statsd.get_timer.return_value.timing.assert_any_call('notification.tenant_wait_time', mock.ANY,
+                                                                  dimensions={'tenant_id': 'a'})
+        mock_statsd.get_counter.return_value.increment.assert_called_once_with(1, dimensions={'tenant_id': 'a'})
+
+
+class TestOffsetTracker(unittest.TestCase):
+    def test_commits_only_over_finished_offsets(self):
+        tracker = OffsetTracker()
+        for offset in range(10, 14):
+            tracker.add(0, offset)
+        tracker.add(1, 7)
+        self.assertEqual({0: 10, 1: 7}, tracker.committable())
+
+        tracker.done(0, 11)
+        tracker.done(0, 12)
+        tracker.done(1, 7)
+        self.assertEqual({0: 10, 1: 8}, tracker.committable())
+        self.assertEqual(2, tracker.pending())
+
+        tracker.done(0, 10)
+        self.assertEqual({0: 13, 1: 8}, tracker.committable())
+        tracker.done(0, 13)
+        self.assertEqual({0: 14, 1: 8}, tracker.committable())
+        self.assertEqual(0, tracker.pending())
+
+    def test_reset(self):
+        tracker = OffsetTracker()
+        tracker.add(0, 10)
+        tracker.add(0, 11)
+        tracker.done(0, 11)
+        tracker.reset()
+        self.assertEqual({}, tracker.committable())
+        self.assertEqual(0, tracker.pending())
+
+        # a message in flight during the reset finishes later
+        tracker.done(0, 10)
+        tracker.add(1, 5)
+        self.assertEqual({1: 5}, tracker.committable())
@@ -0,0 +1,113 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the engine Profiler"""
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from monasca_notification.common import profiler
+
+
+def busy(seconds):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_not_configured(self):
+        self.assertIsNone(profiler.install(None, 'NotificationEngine'))
+        self.assertIsNone(profiler.install({'duration': 5}, 'NotificationEngine'))
+
+    @mock.patch('monasca_notification.common.profiler.log')
+    @mock.patch('monasca_notification.common.profiler.signal')
+    def test_warns_cprofile_of_threaded_engine(self, mock_signal, mock_log):
+        profiler.install({'directory': self.directory}, 'NotificationEngine', threaded=True)
+        self.assertEqual(1, mock_log.warn.call_count)
+
+        mock_log.reset_mock()
+        profiler.install({'directory': self.directory, 'mode': 'sample'}, 'NotificationEngine', threaded=True)
+        profiler.install({'directory': self.directory}, 'RetryEngine')
+        self.assertFalse(mock_log.warn.called)
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, profiler.Profiler, {'directory': self.directory, 'mode': 'perf'}, 'RetryEngine')
+
+    def test_cprofile_window(self):
+        p = profiler.Profiler({'directory': self.directory}, 'NotificationEngine')
+        p.start()
+        self.assertTrue(p.active)
+        busy(0.01)
+        path = p.stop()
+
+        self.assertFalse(p.active)
+        self.assertTrue(os.path.basename(path).startswith('NotificationEngine-%d-' % os.getpid()))
+        self.assertTrue(path.endswith('.prof'))
+        functions = [f[2] for f in pstats.Stats(path).stats]
+        self.assertIn('busy', functions)
+
+    def test_sample_window(self):
+        p = profiler.Profiler({'directory': self.directory, 'mode': 'sample', 'sample_interval': 0.001},
+                              'PeriodicEngine')
+        worker = threading.Thread(target=busy, args=(0.1,), name='notification-sender-0')
+        p.start()
+        worker.start()
+        busy(0.1)
+        worker.join()
+        path = p.stop()
+
+        self.assertTrue(path.endswith('.folded'))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        main = threading.current_thread().name
+        self.assertTrue(any(line.startswith(main + ';') and ';test_profiler.py:busy:' in line for line in lines))
+        self.assertTrue(any(line.startswith('notification-sender-0;') and ';test_profiler.py:busy:' in line
+                            for line in lines))
+        self.assertFalse(any(line.startswith('profiler-sampler;') for line in lines))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+
+    @mock.patch('monasca_notification.common.profiler.signal')
+    def test_signal_starts_window_and_alarm_ends_it(self, mock_signal):
+        p = profiler.install({'directory': self.directory, 'duration': 5}, 'RetryEngine')
+        handlers = dict(c[0] for c in mock_signal.signal.call_args_list)
+        self.assertFalse(mock_signal.setitimer.called)
+
+        handlers[mock_signal.SIGUSR2](mock_signal.SIGUSR2, None)
+        self.assertTrue(p.active)
+        mock_signal.setitimer.assert_called_with(mock_signal.ITIMER_REAL, 5)
+
+        # a second request during the window is ignored
+        mock_signal.setitimer.reset_mock()
+        handlers[mock_signal.SIGUSR2](mock_signal.SIGUSR2, None)
+        self.assertFalse(mock_signal.setitimer.called)
+
+        handlers[mock_signal.SIGALRM](mock_signal.SIGALRM, None)
+        self.assertFalse(p.active)
+        self.assertFalse(mock_signal.setitimer.called)
+        self.assertEqual(1, len(os.listdir(self.directory)))
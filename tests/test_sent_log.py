@@ -0,0 +1,76 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the SentLog"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mock
+
+from monasca_notification.common import sent_log
+
+
+def notification(method_id=1, alarm_id='alarm', timestamp=1429029121239, state='ALARM'):
+    return mock.Mock(id=method_id, type='email', alarm_id=alarm_id, state=state,
+                     raw_alarm={'timestamp': timestamp})
+
+
+@mock.patch('monasca_notification.common.sent_log.deduplicated_count')
+class TestSentLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = {'database': os.path.join(self.directory, 'sent.db'), 'max_age': 100}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_not_configured(self, mock_count):
+        self.assertIsNone(sent_log.load(None))
+
+    def test_skips_sent_after_restart(self, mock_count):
+        sent = notification()
+        sent_log.load(self.config).add([sent])
+
+        restarted = sent_log.load(self.config)
+        others = [notification(method_id=2), notification(alarm_id='other'), notification(timestamp=1429029181239),
+                  notification(state='OK')]
+        self.assertEqual(others, restarted.unsent([notification()] + others))
+        mock_count.increment.assert_called_once_with(1, dimensions={'notification_type': 'email'})
+
+    @mock.patch('monasca_notification.common.sent_log.time')
+    def test_pruned_by_age(self, mock_time, mock_count):
+        log = sent_log.load(self.config)
+        mock_time.time.return_value = 1000
+        log.add([notification(alarm_id='old')])
+        mock_time.time.return_value = 1050
+        log.add([notification(alarm_id='young')])
+
+        mock_time.time.return_value = 1101
+        log.add([notification(alarm_id='new')])
+        self.assertEqual(['old'], [n.alarm_id for n in log.unsent([notification(alarm_id=alarm_id)
+                                                                  for alarm_id in ('old', 'young', 'new')])])
+
+    def test_fails_open(self, mock_count):
+        log = sent_log.load(self.config)
+        log.add([notification()])
+        log._conn = mock.Mock(execute=mock.Mock(side_effect=sqlite3.OperationalError('database is locked')))
+
+        notifications = [notification()]
+        self.assertEqual(notifications, log.unsent(notifications))
+        log.add(notifications)
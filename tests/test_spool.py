@@ -0,0 +1,111 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the Spool"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from monasca_notification.common import spool
+
+
+@mock.patch('monasca_notification.common.spool.STATSD_CLIENT')
+@mock.patch('monasca_notification.common.spool.replayed_count')
+@mock.patch('monasca_notification.common.spool.spooled_count')
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.published = []
+        self.kafka_up = True
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def publish(self, topic, messages):
+        if not self.kafka_up:
+            return False
+        self.published.append((topic, messages))
+        return True
+
+    def spool(self, **config):
+        config['directory'] = self.directory
+        return spool.load(config, 'alarms', self.publish)
+
+    def test_not_configured(self, mock_spooled, mock_replayed, mock_statsd):
+        self.assertIsNone(spool.load(None, 'alarms', self.publish))
+
+    def test_replay_in_order(self, mock_spooled, mock_replayed, mock_statsd):
+        spooler = self.spool(segment_bytes=60)
+        self.assertFalse(spooler.pending())
+        for i in range(5):
+            spooler.append('notifications', ['{"id": %d}' % i])
+        spooler.append('retry', [u'{"name": "caf\\u00e9"}', '{}'])
+
+        self.assertTrue(spooler.pending())
+        self.assertEqual(3, len(spool._segments(spooler._directory)))
+        self.assertTrue(spooler.drain())
+
+        self.assertEqual([('notifications', ['{"id": %d}' % i]) for i in range(5)] +
+                         [('retry', ['{"name": "caf\\u00e9"}', '{}'])], self.published)
+        self.assertIsInstance(self.published[-1][1][0], str)
+        self.assertFalse(spooler.pending())
+        self.assertEqual(['lock'], os.listdir(spooler._directory))
+        mock_spooled.increment.assert_called_with(2, dimensions={'topic': 'retry'})
+        mock_replayed.increment.assert_called_with(2, dimensions={'topic': 'retry'})
+
+    def test_failure_resumes_without_duplicates(self, mock_spooled, mock_replayed, mock_statsd):
+        spooler = self.spool()
+        spooler.append('notifications', ['1'])
+        spooler.append('notifications', ['2'])
+        publish = spooler._publish
+
+        def publish_once(topic, messages):
+            published = publish(topic, messages)
+            self.kafka_up = False
+            return published
+        spooler._publish = publish_once
+
+        self.assertFalse(spooler.drain())
+        self.assertTrue(spooler.pending())
+        spooler.append('notifications', ['3'])
+
+        self.kafka_up = True
+        spooler._publish = publish
+        self.assertTrue(spooler.drain())
+        self.assertEqual([['1'], ['2'], ['3']], [messages for _, messages in self.published])
+
+    def test_replays_spool_of_dead_process(self, mock_spooled, mock_replayed, mock_statsd):
+        dead = self.spool()
+        dead.append('notifications', ['1'])
+        dead.append('notifications', ['2'])
+        with open(dead._file.name, 'ab') as segment:
+            segment.write('["notifications", ["3"')
+        dead._lock_file.close()
+
+        live = self.spool()
+        other = self.spool()
+        self.kafka_up = False
+        self.assertFalse(live.drain())
+        self.assertTrue(os.path.isdir(dead._directory))
+
+        self.kafka_up = True
+        self.assertTrue(live.drain())
+        self.assertEqual([['1'], ['2']], [messages for _, messages in self.published])
+        self.assertFalse(os.path.exists(dead._directory))
+        self.assertTrue(os.path.isdir(other._directory), 'the spool of a live process is left alone')
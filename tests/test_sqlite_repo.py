@@ -0,0 +1,80 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from monasca_notification.common.repositories.sqlite import seed
+from monasca_notification.common.repositories.sqlite import sqlite_repo
+from monasca_notification.common.utils import get_db_repo
+
+
+class TestSqliteRepo(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.database = os.path.join(self.tmpdir, 'mon.db')
+        config = {'database': {'repo_driver': 'monasca_notification.common.repositories.sqlite.sqlite_repo:SqliteRepo'},
+                  'sqlite': {'database': self.database}}
+        self.repo = get_db_repo(config)
+        self.seeded = seed.seed(self.repo.connection, definitions=5, methods=8, alarms=20, tenants=2)
+
+    def tearDown(self):
+        sqlite_repo._connections.pop(self.database)[0].close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_fetch_notifications(self):
+        definition_id = sorted(self.seeded.alarm_definitions)[0]
+        actions = self.repo.fetch_notifications({'alarmDefinitionId': definition_id, 'newState': 'ALARM'})
+
+        self.assertEqual(len(actions), 2)
+        methods = dict(self.seeded.notification_methods)
+        for action in actions:
+            self.assertEqual(action[1], methods[action[0]])
+
+    def test_fetch_notifications_batch(self):
+        keys = set((definition_id, state) for definition_id in self.seeded.alarm_definitions
+                   for state in ('ALARM', 'OK', 'UNDETERMINED'))
+        keys.add(('missing', 'ALARM'))
+
+        actions = self.repo.fetch_notifications_batch(keys)
+
+        self.assertEqual(set(actions), keys)
+        self.assertEqual(actions[('missing', 'ALARM')], [])
+        for definition_id, state in keys:
+            self.assertEqual(sorted(actions[(definition_id, state)]),
+                             sorted(self.repo.fetch_notifications({'alarmDefinitionId': definition_id,
+                                                                   'newState': state})))
+
+    def test_get_alarm_current_state(self):
+        alarm_id, _, state = self.seeded.alarms[0]
+
+        self.assertEqual(self.repo.get_alarm_current_state(alarm_id), state)
+        self.assertIsNone(self.repo.get_alarm_current_state('missing'))
+
+    def test_notification_method_types(self):
+        self.repo.insert_notification_method_types(['EMAIL', 'JIRA'])
+
+        self.assertEqual(sorted(self.repo.fetch_notification_method_types()),
+                         ['EMAIL', 'JIRA', 'PAGERDUTY', 'SLACK', 'WEBHOOK'])
+
+    def test_get_notification(self):
+        method_id, method_type = self.seeded.notification_methods[0]
+
+        notification = self.repo.get_notification(method_id)
+        self.assertEqual(notification[1], method_type)
+        self.assertEqual(notification[2], seed.DEFAULT_ADDRESSES[method_type])
+        self.assertIsNone(self.repo.get_notification('missing'))
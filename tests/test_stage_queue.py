@@ -0,0 +1,56 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the StageQueue"""
+
+import unittest
+
+import mock
+
+from monasca_notification.common.stage_queue import StageQueue
+
+
+@mock.patch('monasca_notification.common.stage_queue.STATSD_CLIENT')
+class TestStageQueue(unittest.TestCase):
+    def test_put_get(self, mock_statsd):
+        queue = StageQueue('alarms', 4)
+        for i in range(3):
+            queue.put(i)
+
+        self.assertEqual(0, queue.get())
+        mock_statsd.get_gauge.return_value.send.assert_called_with('notification.queue_depth', 2,
+                                                                   dimensions={'queue': 'alarms'})
+        self.assertEqual([1], queue.get_available(limit=1))
+        self.assertEqual([2], queue.get_available())
+        self.assertEqual([], queue.get_available())
+        self.assertIsNone(queue.get(timeout=0.01))
+        self.assertFalse(mock_statsd.get_timer.return_value.timing.called)
+
+    def test_blocked_put_calls_waiting(self, mock_statsd):
+        queue = StageQueue('finished', 1)
+        queue.put('first')
+
+        def waiting():
+            # the consumer side making room, like the Kafka thread draining finished alarms
+            waiting.calls += 1
+            if waiting.calls == 2:
+                self.assertEqual(['first'], queue.get_available())
+        waiting.calls = 0
+
+        queue.put('second', waiting=waiting)
+        self.assertEqual(2, waiting.calls)
+        self.assertEqual('second', queue.get())
+        mock_statsd.get_timer.return_value.timing.assert_called_once_with('notification.queue_blocked_time', mock.ANY,
+                                                                          dimensions={'queue': 'finished'})
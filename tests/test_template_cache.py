@@ -0,0 +1,127 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the TemplateCache and template variable analysis"""
+
+import unittest
+
+import mock
+from jinja2 import Template
+
+from monasca_notification import notification
+from monasca_notification.common import template_cache
+from monasca_notification.plugins import abstract_notifier
+
+
+@mock.patch('monasca_notification.common.template_cache.lookup_count')
+class TestTemplateCache(unittest.TestCase):
+    def test_referenced_variables(self, mock_count):
+        self.assertEqual({'state', 'alarm_name', 'raw_alarm'},
+                         template_cache.referenced_variables(
+                             "{% set x = 1 %}{{ {'OK': 'ok'}[state] }} {{ alarm_name|upper }} "
+                             "{% for m in raw_alarm.metrics %}{{ m }}{{ x }}{% endfor %}"))
+
+    def test_hit_ignores_unreferenced_variables(self, mock_count):
+        cache = template_cache.TemplateCache('email')
+        template = cache.compile('{{ alarm_name }} is {{ state }}')
+
+        self.assertEqual('disk is ALARM', cache.render(template, {'alarm_name': 'disk', 'state': 'ALARM',
+                                                                  'notification_timestamp': 1}))
+        with mock.patch.object(Template, 'render') as mock_render:
+            self.assertEqual('disk is ALARM', cache.render(template, {'alarm_name': 'disk', 'state': 'ALARM',
+                                                                      'notification_timestamp': 2}))
+            self.assertFalse(mock_render.called)
+        self.assertEqual('disk is OK', cache.render(template, {'alarm_name': 'disk', 'state': 'OK'}))
+
+        self.assertEqual([mock.call(1, dimensions={'notification_type': 'email', 'result': result})
+                          for result in ('miss', 'hit', 'miss')], mock_count.increment.call_args_list)
+
+    def test_templates_cached_separately(self, mock_count):
+        cache = template_cache.TemplateCache('email')
+        subject = cache.compile('Subject {{ alarm_name }}')
+        body = cache.compile('Body {{ alarm_name }}')
+
+        self.assertEqual('Subject disk', cache.render(subject, {'alarm_name': 'disk'}))
+        self.assertEqual('Body disk', cache.render(body, {'alarm_name': 'disk'}))
+
+    def test_bounded(self, mock_count):
+        cache = template_cache.TemplateCache('email', size=2)
+        template = cache.compile('{{ alarm_name }}')
+        for name in ('a', 'b', 'c', 'b'):
+            cache.render(template, {'alarm_name': name})
+
+        self.assertEqual(2, len(cache))
+        cache.render(template, {'alarm_name': 'a'})
+        self.assertEqual('miss', mock_count.increment.call_args[1]['dimensions']['result'])
+
+    def test_disabled(self, mock_count):
+        cache = template_cache.TemplateCache('email', size=0)
+        template = cache.compile('{{ alarm_name }}')
+
+        self.assertEqual('a', cache.render(template, {'alarm_name': 'a'}))
+        self.assertEqual(0, len(cache))
+        self.assertFalse(mock_count.increment.called)
+
+
+class TemplateNotifier(abstract_notifier.AbstractNotifier):
+    def __init__(self):
+        super(TemplateNotifier, self).__init__('email')
+
+    def send_notification(self, notification):
+        return self._render_notification_text(notification)
+
+    def _format_text_for_channel(self, text_md):
+        self.formatted = True
+        return text_md.upper()
+
+
+@mock.patch('monasca_notification.common.template_cache.skipped_count')
+class TestTemplateVariables(unittest.TestCase):
+    def setUp(self):
+        self.notification = mock.Mock(alarm_name='disk', alarm_description='full', alarm_timestamp=0, state='OK',
+                                      raw_alarm={}, to_dict_fields=notification.Notification.to_dict_fields)
+
+    def test_compile_cached(self, mock_skipped):
+        self.assertIsNone(template_cache.compile_cached('no template here'))
+        self.assertIsNone(template_cache.compile_cached(None))
+        self.assertIsNone(template_cache.compile_cached('{{ broken'))
+
+        template, variables = template_cache.compile_cached('{{ hostname }} is {{ _state }}')
+        self.assertEqual({'hostname', '_state'}, variables)
+        self.assertIs(template, template_cache.compile_cached('{{ hostname }} is {{ _state }}')[0])
+
+    def test_only_referenced_variables(self, mock_skipped):
+        notifier = TemplateNotifier()
+        notifier.config({'template': {'text': '{{ alarm_name }} {{ alarm_timestamp_utc }}', 'cache_size': 0}})
+
+        self.assertEqual('disk 1970-01-01T00:00:00Z', notifier.send_notification(self.notification))
+        self.assertFalse(hasattr(notifier, 'formatted'))
+        self.assertFalse(self.notification.to_dict.called)
+        mock_skipped.increment.assert_called_once_with(23, dimensions={'template': 'notification',
+                                                                       'notification_type': 'email'})
+
+    def test_formatted_description(self, mock_skipped):
+        notifier = TemplateNotifier()
+        notifier.config({'template': {'text': '{{ alarm_description }} {{ undefined }}'}})
+
+        self.assertEqual('FULL ', notifier.send_notification(self.notification))
+
+    def test_description_variables(self, mock_skipped):
+        alarm = {'alarmId': 'alarmId', 'alarmDescription': '{{ hostname }} is {{ _state }}',
+                 'timestamp': 1429029121239, 'newState': 'ALARM', 'oldState': 'OK',
+                 'metrics': [{'dimensions': {'hostname': 'foo'}}], 'subAlarms': []}
+
+        self.assertEqual('foo is ALARM', notification.AlarmContext(alarm).alarm_description)
+        mock_skipped.increment.assert_called_once_with(3, dimensions={'template': 'alarm_description'})
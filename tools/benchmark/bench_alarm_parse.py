@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark of alarm parsing and validation on payloads of growing size.
+
+   Compares the previous field loop, which left metrics and sub-alarms unchecked, with the compiled
+   alarm_schema validator, and shows the share of the time spent in json.loads:
+
+       PYTHONPATH=. python tools/benchmark/bench_alarm_parse.py --metrics 1,100,1000,5000
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+
+import storm
+
+from monasca_notification.processors import alarm_schema
+
+LEGACY_FIELDS = ['actionsEnabled', 'alarmId', 'alarmDefinitionId', 'alarmName', 'newState', 'oldState',
+                 'stateChangeReason', 'severity', 'link', 'lifecycleState', 'tenantId', 'timestamp']
+
+
+def legacy_parse(alarm_data):
+    expected_fields = list(LEGACY_FIELDS)
+    alarm = json.loads(alarm_data)['alarm-transitioned']
+    for field in expected_fields:
+        if field not in alarm:
+            raise ValueError('Alarm data missing field %s' % field)
+    if ('tenantId' not in alarm) or ('alarmId' not in alarm):
+        raise ValueError()
+    return alarm
+
+
+def schema_parse(alarm_data):
+    return alarm_schema.validate(json.loads(alarm_data))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark alarm parsing and validation')
+    parser.add_argument('--metrics', default='1,10,100,1000,5000', help='Comma separated metrics per alarm')
+    parser.add_argument('--repeat', type=int, default=5, help='Best of n runs')
+    args = parser.parse_args(argv)
+
+    print('{:>8} {:>12} {:>12} {:>12} {:>12}'.format('metrics', 'bytes', 'json us', 'legacy us', 'schema us'))
+    for metrics in [int(m) for m in args.metrics.split(',')]:
+        shape = storm.StormShape(metrics=metrics)
+        payload = json.dumps(storm.alarm_transition('alarm-id', 'definition-id', 'tenant-id', 'ALARM', shape,
+                                                    random.Random(0), 1500000000))
+        number = max(1, 20000 // metrics)
+        results = []
+        for func in (json.loads, legacy_parse, schema_parse):
+            best = min(timeit.repeat(lambda: func(payload), number=number, repeat=args.repeat))
+            results.append(best / number * 1e6)
+        print('{:>8} {:>12} {:>12.1f} {:>12.1f} {:>12.1f}'.format(metrics, len(payload), *results))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark of the per-event cost of statsd metrics.
+
+   Compares a plain monascastatsd client with the client of monitoring/client.get_client sending
+   every event, and with in-process aggregation enabled (flush cost included). Metrics go to a
+   local UDP socket that is never read:
+
+       PYTHONPATH=. python tools/benchmark/bench_statsd.py --events 200000
+"""
+
+import argparse
+import socket
+import sys
+import time
+
+import monascastatsd
+
+from monasca_notification.monitoring import aggregator
+from monasca_notification.monitoring import client
+
+NOTIFICATION_TYPES = ('email', 'webhook', 'pagerduty', 'slack')
+
+
+def emit(statsd, events):
+    sent = statsd.get_counter('notification.notifications_sent')
+    timer = statsd.get_timer()
+    for i in xrange(events // 2):
+        dimensions = {'notification_type': NOTIFICATION_TYPES[i % 4]}
+        sent.increment(1, dimensions=dimensions)
+        timer.timing('notification.notification_send_time', 0.01 * (i % 7), dimensions=dimensions)
+
+
+def measure(name, statsd, events, flush_every=0):
+    start = time.time()
+    if flush_every:
+        for _ in range(events // flush_every):
+            emit(statsd, flush_every)
+            aggregator.AGGREGATOR.flush()
+    else:
+        emit(statsd, events)
+    elapsed = time.time() - start
+    print('{:<12} {:>10.2f} us/event'.format(name, elapsed / events * 1e6))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the per-event cost of statsd metrics')
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--flush-every', type=int, default=10000,
+                        help='Events between aggregator flushes, e.g. a 10s interval at 1000 events/s')
+    args = parser.parse_args(argv)
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    port = sink.getsockname()[1]
+    client.CONF.set_override('statsd_host', '127.0.0.1', 'monitoring')
+    client.CONF.set_override('statsd_port', port, 'monitoring')
+
+    measure('monascastatsd', monascastatsd.Client(name='monasca', port=port,
+                                                  dimensions={'service': 'monitoring'}), args.events)
+    measure('get_client', client.get_client(), args.events)
+    aggregator.AGGREGATOR.enabled = True
+    measure('aggregated', client.get_client(), args.events, args.flush_every)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process stand-ins for Kafka and the notification endpoints used by the benchmark harness
+"""
+
+import asyncore
+import BaseHTTPServer
+import collections
+import smtpd
+import SocketServer
+import threading
+import time
+
+from monasca_notification.common.repositories.sqlite import sqlite_repo
+
+Message = collections.namedtuple('Message', ['value'])
+OffsetAndMessage = collections.namedtuple('OffsetAndMessage', ['offset', 'message'])
+
+
+class FakeTopic(object):
+    """Append-only single-partition topic
+
+       Consumers block for new messages until the topic is closed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.messages = []
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def append(self, values):
+        with self._cond:
+            self.messages.extend(values)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def get(self, offset):
+        """Return the message at `offset`, or None once the topic is closed and drained
+        """
+        with self._cond:
+            while offset >= len(self.messages) and not self.closed:
+                self._cond.wait(0.1)
+            if offset < len(self.messages):
+                return self.messages[offset]
+            return None
+
+
+class FakeKafka(object):
+    """Replaces the monasca_common.kafka consumer and producer modules of base_engine
+
+       Install with ::
+
+           base_engine.consumer = base_engine.producer = FakeKafka()
+    """
+
+    def __init__(self):
+        self.topics = {}
+        self.listeners = []  # callables invoked with (topic, values, publish time)
+        self._lock = threading.Lock()
+
+    def topic(self, name):
+        with self._lock:
+            if name not in self.topics:
+                self.topics[name] = FakeTopic(name)
+            return self.topics[name]
+
+    def KafkaConsumer(self, kafka_url, zookeeper_url, zookeeper_path, group, topic, *args, **kwargs):
+        return FakeConsumer(self.topic(topic), group)
+
+    def KafkaProducer(self, kafka_url, *args, **kwargs):
+        return FakeProducer(self)
+
+    def publish(self, topic, values):
+        now = time.time()
+        self.topic(topic).append(values)
+        for listener in self.listeners:
+            listener(topic, values, now)
+
+
+class FakeConsumer(object):
+    def __init__(self, topic, group):
+        self._topic = topic
+        self._offset = 0
+        self._end = None
+        self.committed = 0
+        # BaseEngine.commit(offsets) commits through the consumer's client
+        self._kafka = self
+        self._kafka_group = group
+
+    def snapshot(self):
+        """Only consume what has been published so far, for engines republishing to their own topic
+        """
+        self._end = len(self._topic.messages)
+
+    def __iter__(self):
+        while self._end is None or self._offset < self._end:
+            offset = self._offset
+            value = self._topic.get(offset)
+            if value is None:
+                return
+            self._offset += 1
+            yield 0, OffsetAndMessage(offset, Message(value))
+
+    def commit(self):
+        """Everything handed out so far counts as committed, as with the real consumer
+        """
+        self.committed = self._offset
+
+    def send_offset_commit_request(self, group, payloads):
+        for payload in payloads:
+            self.committed = payload.offset
+
+
+class FakeProducer(object):
+    def __init__(self, kafka):
+        self._kafka = kafka
+
+    def publish(self, topic, messages, key=None):
+        self._kafka.publish(topic, messages)
+
+
+class CountingSqliteRepo(sqlite_repo.SqliteRepo):
+    """SqliteRepo counting every query, shared across all repositories of the process
+    """
+    queries = 0
+    _queries_lock = threading.Lock()
+
+    def _query(self, sql, params=()):
+        with CountingSqliteRepo._queries_lock:
+            CountingSqliteRepo.queries += 1
+        return super(CountingSqliteRepo, self)._query(sql, params)
+
+
+def _http_handler(received, failure_every, delay):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.getheader('content-length', 0)))
+            if delay:
+                time.sleep(delay)
+            with received.get_lock():
+                received.value += 1
+                fail = failure_every and received.value % failure_every == 0
+            self.send_response(500 if fail else 200)
+            self.send_header('content-type', 'text/plain')
+            self.send_header('content-length', '2')
+            self.end_headers()
+            self.wfile.write('ok')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def run_http_sink(port, received, failure_every=0, delay=0):
+    """Accept any POST after `delay` seconds, answering every `failure_every`-th request with a 500
+    """
+    server = _ThreadingHTTPServer(('127.0.0.1', port), _http_handler(received, failure_every, delay))
+    server.serve_forever()
+
+
+class _SmtpSink(smtpd.SMTPServer):
+    def __init__(self, port, received):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', port), None)
+        self._received = received
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        with self._received.get_lock():
+            self._received.value += 1
+
+
+def run_smtp_sink(port, received):
+    _SmtpSink(port, received)
+    asyncore.loop()
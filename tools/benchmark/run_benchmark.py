@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end throughput benchmark of the notification, retry and periodic engines.
+
+   Kafka is replaced by in-process topics, the configuration DB by a seeded in-memory SQLite
+   database, and every notification is delivered to local HTTP and SMTP sinks running in separate
+   processes, so a whole storm can be replayed on one machine:
+
+       python tools/benchmark/run_benchmark.py --alarms 20000 --types webhook,email --json
+
+   CPU per alarm is measured on the benchmark process only, sinks are excluded. With --rate the
+   storm is generated while the engine runs and its CPU is included.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import socket
+import sys
+import threading
+import time
+
+import fakes
+import storm
+
+from monasca_notification import base_engine
+from monasca_notification.common.repositories.sqlite import seed
+from monasca_notification.common.repositories.sqlite import sqlite_repo
+from monasca_notification.notification_engine import NotificationEngine
+from monasca_notification.periodic_engine import PeriodicEngine
+from monasca_notification.retry_engine import RetryEngine
+from monasca_notification.types import notifiers
+
+ALARM_TTL = 14400
+PERIOD = 60
+
+
+def build_config(args):
+    notification_types = {
+        'plugins': ['monasca_notification.plugins.slack_notifier:SlackNotifier'],
+        'email': {'server': '127.0.0.1',
+                  'port': args.smtp_port,
+                  'user': None,
+                  'password': None,
+                  'timeout': 5,
+                  'from_addr': 'bench@localhost'},
+        'webhook': {'timeout': 5},
+        'pagerduty': {'timeout': 5},
+        'slack': {'timeout': 5}
+    }
+    return {
+        'kafka': {'url': 'fake',
+                  'group': 'monasca-notification',
+                  'alarm_topic': 'alarm-state-transitions',
+                  'notification_topic': 'alarm-notifications',
+                  'notification_retry_topic': 'retry-notifications',
+                  'periodic': {PERIOD: '60-seconds-notifications'},
+                  'lag_interval': 0},
+        'zookeeper': {'url': 'fake',
+                      'notification_path': '/notification/alarms',
+                      'notification_retry_path': '/notification/retry',
+                      'periodic_path': {PERIOD: '/notification/60_seconds'}},
+        'database': {'repo_driver': 'fakes:CountingSqliteRepo'},
+        'sqlite': {'database': ':memory:'},
+        'notification_types': {t: v for t, v in notification_types.items() if t in args.types or t == 'plugins'},
+        'processors': {'alarm': {'number': args.alarm_workers, 'ttl': ALARM_TTL},
+                       'notification': {'number': 1},
+                       'send': {'number': args.dispatchers}},
+        'queues': {'staged': args.staged},
+        'memory': {'in_flight_bytes': args.in_flight_bytes},
+        'retry': {'interval': 0, 'max_attempts': args.retry_attempts},
+        'priority': {'read_ahead': 256,
+                     'dispatchers': args.dispatchers,
+                     'tenants': {'max_in_flight': args.dispatchers},
+                     'lanes': {'critical': {'weight': 8, 'severities': ['CRITICAL']},
+                               'high': {'weight': 4, 'severities': ['HIGH']},
+                               'default': {'weight': 1}}} if args.priority else {},
+    }
+
+
+def start_sinks(args):
+    http_received = multiprocessing.Value('l', 0)
+    smtp_received = multiprocessing.Value('l', 0)
+    sinks = [multiprocessing.Process(target=fakes.run_http_sink,
+                                     args=(args.http_port, http_received, args.failure_every, args.http_delay)),
+             multiprocessing.Process(target=fakes.run_smtp_sink, args=(args.smtp_port, smtp_received))]
+    for sink in sinks:
+        sink.daemon = True
+        sink.start()
+    for port in (args.http_port, args.smtp_port):
+        _wait_for_port(port)
+    return sinks, http_received, smtp_received
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except socket.error:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def point_pagerduty_at_sink(args):
+    # PagerdutyNotifier.config hardcodes the public endpoint
+    if 'pagerduty' in notifiers.configured_notifiers:
+        notifiers.configured_notifiers['pagerduty']._config['url'] = 'http://127.0.0.1:%d/pagerduty' % args.http_port
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def measure(name, engine, consumed):
+    """Run `engine` until its topic is drained and return its resource usage
+    """
+    queries = fakes.CountingSqliteRepo.queries
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+
+    engine.run()
+
+    elapsed = time.time() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    messages = consumed()
+    return {'engine': name,
+            'messages': messages,
+            'seconds': elapsed,
+            'throughput': messages / elapsed if elapsed else None,
+            'cpu_ms_per_message': 1000.0 * cpu / messages if messages else None,
+            'db_queries_per_message': float(fakes.CountingSqliteRepo.queries - queries) / messages
+            if messages else None}
+
+
+def publish_storm(kafka, topic, alarms, rate):
+    interval = 1.0 / rate if rate else 0
+    start = time.time()
+    for i, (_, payload) in enumerate(alarms):
+        if interval:
+            delay = start + i * interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        kafka.publish(topic, [payload])
+    kafka.topic(topic).close()
+
+
+def backdate(topic, period):
+    """Make every queued periodic notification due, so the periodic engine fires without waiting
+    """
+    due = time.time() - period - 1
+    for i, value in enumerate(topic.messages):
+        data = json.loads(value)
+        data['notification_timestamp'] = due
+        topic.messages[i] = json.dumps(data)
+
+
+def run(args):
+    config = build_config(args)
+    kafka = fakes.FakeKafka()
+    base_engine.consumer = base_engine.producer = kafka
+
+    sent = []
+    kafka.listeners.append(lambda topic, values, now: sent.extend((now, v) for v in values)
+                           if topic == config['kafka']['notification_topic'] else None)
+
+    conn, lock = sqlite_repo.get_connection(config['sqlite']['database'])
+    addresses = {'email': 'bench@localhost',
+                 'webhook': 'http://127.0.0.1:%d/webhook' % args.http_port,
+                 'pagerduty': 'bench-service-key',
+                 'slack': 'http://127.0.0.1:%d/slack?channel=#bench' % args.http_port}
+    with lock:
+        seeded = seed.seed(conn, args.definitions, args.methods, args.seeded_alarms,
+                           actions_per_definition=args.actions_per_definition,
+                           tenants=args.tenants,
+                           addresses={t: a for t, a in addresses.items() if t in args.types},
+                           periodic_ratio=args.periodic_ratio)
+
+    sinks, http_received, smtp_received = start_sinks(args)
+    results = []
+    try:
+        shape = storm.StormShape(alarms=args.alarms, metrics=args.metrics, hot_ratio=args.hot_ratio,
+                                 disabled_ratio=args.disabled_ratio, expired_ratio=args.expired_ratio,
+                                 rate=args.rate)
+        alarms = storm.generate(seeded, shape, ALARM_TTL)
+        alarm_topic = config['kafka']['alarm_topic']
+        if shape.rate:
+            publisher = threading.Thread(target=publish_storm, args=(kafka, alarm_topic, alarms, shape.rate))
+            publisher.daemon = True
+            publisher.start()
+        else:
+            publish_storm(kafka, alarm_topic, list(alarms), 0)
+
+        engine = NotificationEngine(config)
+        point_pagerduty_at_sink(args)
+        result = measure('notification', engine, lambda: engine._consumer.committed)
+        latencies = [now - json.loads(value)['raw_alarm']['timestamp'] / 1000.0 for now, value in sent]
+        result.update({'notifications_sent': len(sent),
+                       'latency_p50': percentile(latencies, 50),
+                       'latency_p99': percentile(latencies, 99)})
+        results.append(result)
+
+        kafka.topic(config['kafka']['notification_retry_topic']).close()
+        engine = RetryEngine(config)
+        point_pagerduty_at_sink(args)
+        results.append(measure('retry', engine, lambda: engine._consumer.committed))
+
+        periodic_topic = kafka.topic(config['kafka']['periodic'][PERIOD])
+        backdate(periodic_topic, PERIOD)
+        engine = PeriodicEngine(config, PERIOD)
+        point_pagerduty_at_sink(args)
+        engine._consumer.snapshot()
+        results.append(measure('periodic', engine, lambda: engine._consumer.committed))
+    finally:
+        for sink in sinks:
+            sink.terminate()
+
+    return {'storm': vars(shape),
+            'seed': {'definitions': args.definitions, 'methods': args.methods, 'alarms': args.seeded_alarms},
+            'engines': results,
+            'sinks': {'http': http_received.value, 'smtp': smtp_received.value}}
+
+
+def print_report(report):
+    print('Storm: {}'.format(', '.join('{}={}'.format(k, v) for k, v in sorted(report['storm'].items()))))
+    print('Sinks received: http={http} smtp={smtp}'.format(**report['sinks']))
+    for result in report['engines']:
+        print('')
+        for key in ('engine', 'messages', 'seconds', 'throughput', 'cpu_ms_per_message', 'db_queries_per_message',
+                    'notifications_sent', 'latency_p50', 'latency_p99'):
+            if key in result:
+                value = result[key]
+                print('  {:<24} {}'.format(key, '{:.4f}'.format(value) if isinstance(value, float) else value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the notification engines against local sinks')
+    parser.add_argument('--alarms', type=int, default=10000, help='Alarm transitions in the storm')
+    parser.add_argument('--metrics', type=int, default=3, help='Metrics per alarm')
+    parser.add_argument('--hot-ratio', type=float, default=0.5,
+                        help='Share of transitions on the hottest 1%% of alarm definitions')
+    parser.add_argument('--disabled-ratio', type=float, default=0.0, help='Share of actions-disabled alarms')
+    parser.add_argument('--expired-ratio', type=float, default=0.0, help='Share of alarms older than the ttl')
+    parser.add_argument('--rate', type=float, default=0, help='Transitions per second, 0 for a single burst')
+    parser.add_argument('--definitions', type=int, default=1000, help='Seeded alarm definitions')
+    parser.add_argument('--methods', type=int, default=200, help='Seeded notification methods')
+    parser.add_argument('--seeded-alarms', type=int, default=10000, help='Seeded alarms')
+    parser.add_argument('--actions-per-definition', type=int, default=1,
+                        help='Notification methods per alarm definition and state')
+    parser.add_argument('--tenants', type=int, default=10, help='Seeded tenants')
+    parser.add_argument('--periodic-ratio', type=float, default=0.0,
+                        help='Share of notification methods with a 60 second period')
+    parser.add_argument('--types', default='webhook,email',
+                        help='Comma separated notification types out of email,webhook,pagerduty,slack')
+    parser.add_argument('--failure-every', type=int, default=0,
+                        help='Answer every n-th HTTP request with a 500 to exercise the retry engine')
+    parser.add_argument('--retry-attempts', type=int, default=3, help='retry.max_attempts')
+    parser.add_argument('--priority', action='store_true', help='Dispatch through severity priority lanes')
+    parser.add_argument('--dispatchers', type=int, default=1, help='Sending threads with --priority or --staged')
+    parser.add_argument('--staged', action='store_true', help='Run the notification engine as staged pipeline')
+    parser.add_argument('--alarm-workers', type=int, default=1, help='Alarm parsing threads with --staged')
+    parser.add_argument('--in-flight-bytes', type=int, default=None,
+                        help='memory.in_flight_bytes, approximate memory of unfinished alarms per engine')
+    parser.add_argument('--http-delay', type=float, default=0, help='Seconds the webhook sink takes per request')
+    parser.add_argument('--http-port', type=int, default=18080)
+    parser.add_argument('--smtp-port', type=int, default=18025)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON for comparing releases')
+    args = parser.parse_args(argv)
+    args.types = args.types.split(',')
+
+    logging.basicConfig(level=logging.WARNING)
+    # without a local monasca-agent every statsd packet is refused
+    logging.getLogger('monascastatsd').setLevel(logging.CRITICAL)
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
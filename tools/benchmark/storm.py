@@ -0,0 +1,101 @@
+# Copyright 2017 SAP SE
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Synthetic alarm-transitioned storms built on top of a seeded configuration DB
+"""
+
+import json
+import random
+import time
+
+SEVERITIES = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+OLD_STATES = {'ALARM': 'OK', 'OK': 'ALARM', 'UNDETERMINED': 'ALARM'}
+
+
+class StormShape(object):
+    """Parameters of a storm
+
+         alarms - number of alarm transitions
+         metrics - metrics (and dimension sets) per alarm
+         hot_ratio - share of transitions hitting the hottest 1% of alarm definitions, as during a
+                     correlated outage
+         disabled_ratio - share of transitions with actionsEnabled=false
+         expired_ratio - share of transitions older than the alarm ttl
+         rate - transitions per second, 0 to publish the whole storm before the engines start
+    """
+
+    def __init__(self, alarms=10000, metrics=3, hot_ratio=0.5, disabled_ratio=0.0, expired_ratio=0.0, rate=0):
+        self.alarms = alarms
+        self.metrics = metrics
+        self.hot_ratio = hot_ratio
+        self.disabled_ratio = disabled_ratio
+        self.expired_ratio = expired_ratio
+        self.rate = rate
+
+
+def alarm_transition(alarm_id, definition_id, tenant_id, state, shape, rng, timestamp):
+    metrics = [{'id': None,
+                'name': 'cpu.utilization_perc',
+                'dimensions': {'hostname': 'host-%d' % i,
+                               'service': 'compute',
+                               'region': 'bench'}} for i in range(shape.metrics)]
+    return {'alarm-transitioned': {
+        'tenantId': tenant_id,
+        'alarmId': alarm_id,
+        'alarmDefinitionId': definition_id,
+        'alarmName': 'bench alarm %s' % definition_id[:8],
+        'alarmDescription': 'CPU on {{hostname}} is at {{cpu_utilization_perc}}%',
+        'oldState': OLD_STATES[state],
+        'newState': state,
+        'actionsEnabled': rng.random() >= shape.disabled_ratio,
+        'stateChangeReason': 'Thresholds were exceeded for the sub-alarms',
+        'severity': rng.choice(SEVERITIES),
+        'link': 'https://bench.example.com/alarms/%s' % alarm_id,
+        'lifecycleState': 'OPEN',
+        'timestamp': int(timestamp * 1000),
+        'metrics': metrics,
+        'subAlarms': [{'subAlarmExpression': {'function': 'AVG',
+                                              'metricDefinition': {'name': 'cpu.utilization_perc',
+                                                                   'dimensions': {'service': 'compute'}},
+                                              'operator': 'GT',
+                                              'threshold': 90.0,
+                                              'period': 60,
+                                              'periods': 1},
+                       'subAlarmState': state,
+                       'currentValues': [rng.uniform(90, 100)]}]}}
+
+
+def generate(seeded, shape, alarm_ttl, random_seed=0):
+    """Yield (alarm id, json payload) for `shape.alarms` transitions of the seeded alarms
+
+       Timestamps are taken when each payload is generated, so generating lazily while publishing
+       keeps end-to-end latencies honest for paced storms.
+    """
+    rng = random.Random(random_seed)
+    by_definition = {}
+    for alarm_id, definition_id, state in seeded.alarms:
+        by_definition.setdefault(definition_id, []).append((alarm_id, state))
+    definitions = sorted(by_definition)
+    hot = definitions[:max(1, len(definitions) // 100)]
+
+    for _ in range(shape.alarms):
+        definition_id = rng.choice(hot if rng.random() < shape.hot_ratio else definitions)
+        alarm_id, state = rng.choice(by_definition[definition_id])
+        timestamp = time.time()
+        if rng.random() < shape.expired_ratio:
+            timestamp -= alarm_ttl * 2
+        payload = alarm_transition(alarm_id, definition_id, seeded.alarm_definitions[definition_id], state,
+                                   shape, rng, timestamp)
+        yield alarm_id, json.dumps(payload)